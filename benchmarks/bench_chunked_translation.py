@@ -0,0 +1,51 @@
+#! /usr/bin/env python3
+# Compares serial selection of a large synthetic module with chunked selection across processes
+import argparse
+import json
+import time
+from os import path
+from sys import path as sys_path
+from tempfile import TemporaryDirectory
+
+sys_path.insert(0, path.join(path.dirname(path.abspath(__file__)), "..", "src"))
+sys_path.insert(0, path.dirname(path.abspath(__file__)))
+
+from staticanalyser.translator.descriptor import Descriptor
+from corpus import generate_large_module
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--functions", type=int, default=2000)
+    parser.add_argument("--jobs", type=int, default=4)
+    parser.add_argument("--output", default="bench_chunked_translation.json")
+    args = parser.parse_args()
+
+    descriptor: Descriptor = Descriptor.get_descriptor("python3")
+    results: dict = {"functions": args.functions, "jobs": args.jobs}
+    with TemporaryDirectory() as tmp:
+        source_file: str = path.join(tmp, "generated.py")
+        with open(source_file, "w") as f:
+            f.write(generate_large_module(args.functions))
+        with open(source_file, "r") as f:
+            text: str = descriptor.preprocess(f.read())
+        results["lines"] = text.count("\n")
+
+        descriptor.configure({"chunk_jobs": 1})
+        start: float = time.perf_counter()
+        serial: dict = descriptor.select(text, "python3.generated")
+        results["serial_seconds"] = time.perf_counter() - start
+
+        descriptor.configure({"chunk_jobs": args.jobs, "chunk_lines": 1})
+        start = time.perf_counter()
+        chunked: dict = descriptor.select_chunked(text, "python3.generated")
+        results["chunked_seconds"] = time.perf_counter() - start
+
+    results["identical"] = {k: [str(e) for e in v] for k, v in serial.items()} == \
+        {k: [str(e) for e in v] for k, v in chunked.items()}
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#! /usr/bin/env python3
+# Compares the throughput of the regex and ast python3 frontends translating the same generated corpus, and how many
+# entities and resolved references each of them finds in it
+import argparse
+import json
+import re
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+from os import path
+from sys import path as sys_path
+from tempfile import TemporaryDirectory
+
+sys_path.insert(0, path.join(path.dirname(path.abspath(__file__)), "..", "src"))
+sys_path.insert(0, path.dirname(path.abspath(__file__)))
+
+from staticanalyser.translator.descriptor import Descriptor
+from staticanalyser.shared.model import ModelOperations
+from corpus import CorpusSpec, generate_corpus
+
+FRONTENDS: list = ["regex", "ast"]
+
+
+def run_frontend(frontend: str, files: list, source_dir: str, model_dir: str) -> dict:
+    descriptor: Descriptor = Descriptor.get_frontend(frontend)("python3")
+    descriptor.configure()
+    start: float = time.perf_counter()
+    with redirect_stdout(StringIO()):
+        for f in files:
+            descriptor.parse(f, "py", model_dir, [source_dir], True)
+    seconds: float = time.perf_counter() - start
+    entities: int = 0
+    references: int = 0
+    for model_file in ModelOperations.get_model_files(model_dir):
+        with open(str(model_file), "r") as fp:
+            text: str = fp.read()
+        entities += len(re.findall(r'"global_id": ', text))
+        references += len(re.findall(r'"ref": "python3\.', text))
+    return {
+        "seconds": seconds,
+        "phase_seconds": descriptor.get_phase_times(),
+        "entities": entities,
+        "resolved_references": references
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modules", type=int, default=40)
+    parser.add_argument("--functions", type=int, default=8, help="Functions per module")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_frontends.json")
+    args = parser.parse_args()
+
+    results: dict = {}
+    with TemporaryDirectory() as tmp:
+        spec: CorpusSpec = CorpusSpec(args.modules, functions=args.functions, seed=args.seed)
+        files: list = generate_corpus(tmp, spec)
+        lines: int = 0
+        for f in files:
+            with open(f, "r") as fp:
+                lines += fp.read().count("\n")
+        results["corpus"] = dict(spec.to_dict(), files=len(files), lines=lines)
+        for frontend in FRONTENDS:
+            results[frontend] = run_frontend(frontend, files, tmp, path.join(tmp, "models_{}".format(frontend)))
+            results[frontend]["lines_per_second"] = lines / results[frontend]["seconds"]
+    results["speedup"] = results["regex"]["seconds"] / results["ast"]["seconds"]
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#! /usr/bin/env python3
+# Measures the memory the models of a generated corpus take once loaded by a navigator, with and without interning
+# their strings, and how long finding the references to global ids takes in each
+import argparse
+import json
+import re
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from io import StringIO
+from os import path
+from sys import path as sys_path
+from tempfile import TemporaryDirectory
+
+sys_path.insert(0, path.join(path.dirname(path.abspath(__file__)), "..", "src"))
+sys_path.insert(0, path.dirname(path.abspath(__file__)))
+
+from staticanalyser.navigator.navigate import Navigator
+from staticanalyser.shared.model import ModelOperations
+from staticanalyser.translator.descriptor import Descriptor
+from corpus import CorpusSpec, generate_corpus
+
+
+def measure(model_files: list, intern: bool, global_ids: list) -> dict:
+    tracemalloc.start()
+    start: float = time.perf_counter()
+    n: Navigator = Navigator({"intern": intern})
+    for f in model_files:
+        n.load_file(f, False)
+    load_seconds: float = time.perf_counter() - start
+    loaded_bytes: int = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    start = time.perf_counter()
+    references: int = sum(len(n.find_references_to_global_id(g)) for g in global_ids)
+    return {
+        "loaded_bytes": loaded_bytes,
+        "load_seconds": load_seconds,
+        "find_references_seconds": time.perf_counter() - start,
+        "references": references,
+        "symbols": len(n.get_symbol_table()) if n.get_symbol_table() is not None else 0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modules", type=int, default=200)
+    parser.add_argument("--functions", type=int, default=8, help="Functions per module")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=50, help="Global ids to find the references to")
+    parser.add_argument("--output", default="bench_interning.json")
+    args = parser.parse_args()
+
+    results: dict = {}
+    with TemporaryDirectory() as tmp:
+        spec: CorpusSpec = CorpusSpec(args.modules, functions=args.functions, seed=args.seed)
+        files: list = generate_corpus(tmp, spec)
+        model_dir: str = path.join(tmp, "models")
+        descriptor: Descriptor = Descriptor.get_descriptor("python3")
+        descriptor.configure()
+        with redirect_stdout(StringIO()):
+            for f in files:
+                descriptor.parse(f, "py", model_dir, [tmp], True)
+        model_files: list = ModelOperations.get_model_files(model_dir)
+        references: set = set()
+        for model_file in model_files:
+            with open(str(model_file), "r") as fp:
+                references |= set(re.findall(r'"ref": "([^"]+)"', fp.read()))
+        global_ids: list = sorted(references)[:args.queries] + ["python3.never.referenced"]
+        results["corpus"] = dict(spec.to_dict(), files=len(files), models=len(model_files))
+        results["plain"] = measure(model_files, False, global_ids)
+        results["interned"] = measure(model_files, True, global_ids)
+    results["bytes_saved"] = results["plain"]["loaded_bytes"] - results["interned"]["loaded_bytes"]
+    results["bytes_saved_ratio"] = results["bytes_saved"] / results["plain"]["loaded_bytes"]
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
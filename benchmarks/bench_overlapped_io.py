@@ -0,0 +1,80 @@
+#! /usr/bin/env python3
+# Translates a generated corpus in one worker on a throttled filesystem, reading, translating and writing each file in
+# turn and then with sources read ahead and models written in the background. The throttle adds a fixed latency and a
+# bandwidth limit to every source read and model write, as a network filesystem would
+import argparse
+import json
+import queue
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+from os import path
+from sys import path as sys_path
+from tempfile import TemporaryDirectory
+
+sys_path.insert(0, path.join(path.dirname(path.abspath(__file__)), "..", "src"))
+sys_path.insert(0, path.dirname(path.abspath(__file__)))
+
+import staticanalyser.shared.source as source
+import staticanalyser.translator.descriptor as descriptor
+import staticanalyser.translator.pipeline as pipeline
+from staticanalyser.shared.model import ModelOperations
+from staticanalyser.translator.translate import parse
+from corpus import CorpusSpec, generate_corpus
+
+
+def throttle(latency: float, bandwidth: float):
+    """Slows down the source reads and model writes of translation by latency seconds plus their size over bandwidth
+    bytes a second"""
+    read_source, write_model_file = source.read_source, descriptor.write_model_file
+
+    def slow_read_source(file: str):
+        res: tuple = read_source(file)
+        time.sleep(latency + len(res[0]) / bandwidth)
+        return res
+
+    def slow_write_model_file(file_path: str, json_output: str, sa_model: dict):
+        time.sleep(latency + len(json_output) / bandwidth)
+        write_model_file(file_path, json_output, sa_model)
+
+    source.read_source = slow_read_source
+    descriptor.write_model_file = pipeline.write_model_file = slow_write_model_file
+
+
+def measure(files: list, model_dir: str, source_dir: str, prefetch: int) -> dict:
+    file_queue: queue.Queue = queue.Queue()
+    for f in files:
+        file_queue.put(f)
+    start: float = time.perf_counter()
+    with redirect_stdout(StringIO()):
+        parse(file_queue, model_dir, [source_dir], True, {"cache_dir": None}, None, prefetch)
+    return {"seconds": time.perf_counter() - start, "models": len(ModelOperations.get_model_files(model_dir))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modules", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds added to every read and write")
+    parser.add_argument("--bandwidth", type=float, default=2e6, help="Bytes a second read or written")
+    parser.add_argument("--prefetch", type=int, default=4)
+    parser.add_argument("--output", default="bench_overlapped_io.json")
+    args = parser.parse_args()
+
+    throttle(args.latency, args.bandwidth)
+    results: dict = {"latency": args.latency, "bandwidth": args.bandwidth, "prefetch": args.prefetch}
+    with TemporaryDirectory() as tmp:
+        spec: CorpusSpec = CorpusSpec(args.modules, seed=args.seed)
+        files: list = generate_corpus(tmp, spec)
+        results["corpus"] = dict(spec.to_dict(), files=len(files))
+        # a first run warms up the descriptor and the page cache for both
+        measure(files[:1], path.join(tmp, "warmup"), tmp, 0)
+        results["in_turn"] = measure(files, path.join(tmp, "in_turn"), tmp, 0)
+        results["overlapped"] = measure(files, path.join(tmp, "overlapped"), tmp, args.prefetch)
+    results["speedup"] = results["in_turn"]["seconds"] / results["overlapped"]["seconds"]
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
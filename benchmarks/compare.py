@@ -0,0 +1,48 @@
+#! /usr/bin/env python3
+# Compares two result files written by run.py and reports every timing that got slower by more than a threshold
+import argparse
+import json
+import sys
+
+
+def _timings(scale: dict) -> dict:
+    res: dict = {}
+    for k, v in scale.items():
+        if k.endswith("_seconds") and type(v) is dict:
+            for phase, seconds in v.items():
+                res["{}.{}".format(k, phase)] = seconds
+        elif k.endswith("_seconds"):
+            res[k] = v
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=1.2, help="Slowdown ratio that counts as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline, "r") as f:
+        baseline: dict = json.load(f)
+    with open(args.candidate, "r") as f:
+        candidate: dict = json.load(f)
+
+    regressions: int = 0
+    for old, new in zip(baseline.get("scales"), candidate.get("scales")):
+        if old.get("corpus") != new.get("corpus"):
+            print("Corpus differs for scale {}, skipping".format(new.get("corpus")))
+            continue
+        old_timings: dict = _timings(old)
+        for k, seconds in _timings(new).items():
+            if k in old_timings and old_timings[k] > 0:
+                ratio: float = seconds / old_timings[k]
+                flag: str = "REGRESSION" if ratio > args.threshold else ""
+                regressions += 1 if flag else 0
+                print("{:>6} modules {:<40} {:>9.3f}s -> {:>9.3f}s  x{:.2f} {}".format(
+                    new.get("corpus").get("modules"), k, old_timings[k], seconds, ratio, flag))
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# Deterministic generator of synthetic python source trees for the benchmarks. The same parameters and seed always
+# produce the same files, so timings from different runs are measured against the same corpus
+import random
+from os import path
+from pathlib import Path
+from typing import List
+
+DANGER_SOURCE: str = "python3.json.loads"
+SINK_FUNCTION: str = "python3.builtins.exec"
+PACKAGE_NAME: str = "corpus"
+
+
+class CorpusSpec(object):
+    modules: int = None
+    depth: int = None
+    imports: int = None
+    calls: int = None
+    functions: int = None
+    classes: int = None
+    seed: int = None
+
+    def __init__(self, modules: int = 20, depth: int = 2, imports: int = 3, calls: int = 3, functions: int = 8,
+                 classes: int = 1, seed: int = 0):
+        self.modules = modules
+        self.depth = depth
+        self.imports = imports
+        self.calls = calls
+        self.functions = functions
+        self.classes = classes
+        self.seed = seed
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+
+def _module_name(index: int, depth: int) -> List[str]:
+    """Spreads modules over nested packages, module i lives depth packages down"""
+    parts: List[str] = [PACKAGE_NAME]
+    for level in range(depth):
+        parts.append("pkg_{}".format((index >> level) % 4))
+    parts.append("mod_{}".format(index))
+    return parts
+
+
+def _function_name(module: int, function: int) -> str:
+    return "func_{}_{}".format(module, function)
+
+
+def _generate_module(spec: CorpusSpec, index: int, rnd: random.Random) -> str:
+    imported: List[int] = sorted(rnd.sample(range(index), min(spec.imports, index))) if index else []
+    lines: List[str] = ["from json import loads", ""]
+    callees: List[str] = [_function_name(index, f) for f in range(spec.functions)]
+    for module in imported:
+        names: List[str] = [_function_name(module, f) for f in range(spec.functions)]
+        lines.append("from {} import {}".format(".".join(_module_name(module, spec.depth)), ", ".join(names)))
+        callees += names
+    lines.append("")
+
+    for c in range(spec.classes):
+        lines += ["class Class_{}_{}(object):".format(index, c), "    def method_{}(self, value):".format(c)]
+        lines.append("        result = {}(value)".format(rnd.choice(callees)))
+        lines += ["        return result", ""]
+
+    for f in range(spec.functions):
+        lines.append("def {}(value, count=1):".format(_function_name(index, f)))
+        variable: str = "value"
+        if rnd.random() < 0.3:
+            lines.append("    data = loads(value)")
+            variable = "data"
+        for call in range(spec.calls):
+            # only call functions defined earlier so the call graph has no cycles
+            candidates: List[str] = callees[:f] + callees[spec.functions:]
+            if candidates:
+                lines.append("    result_{} = {}({})".format(call, rnd.choice(candidates), variable))
+        if rnd.random() < 0.2:
+            lines.append("    exec({})".format(variable))
+        lines += ["    for item in range(count):", "        print(item)", "    return value", ""]
+    return "\n".join(lines)
+
+
+def generate_corpus(root: str, spec: CorpusSpec) -> List[str]:
+    """Writes the corpus described by spec under root and returns the generated files"""
+    rnd: random.Random = random.Random(spec.seed)
+    files: List[str] = []
+    for index in range(spec.modules):
+        parts: List[str] = _module_name(index, spec.depth)
+        module_file: str = path.join(root, *parts) + ".py"
+        Path(path.dirname(module_file)).mkdir(parents=True, exist_ok=True)
+        with open(module_file, "w") as f:
+            f.write(_generate_module(spec, index, rnd))
+        files.append(module_file)
+    return files
+
+
+def generate_large_module(functions: int) -> str:
+    """A single flat module with many top level definitions, for chunked translation"""
+    lines: List[str] = ["import json", "from os import path", ""]
+    for i in range(functions):
+        if i % 10 == 0:
+            lines += ["class Generated{}(object):".format(i), "    def method_{}(self, value):".format(i),
+                      "        return json.loads(value)", ""]
+        lines += [
+            "def function_{}(value, other=1):".format(i),
+            "    result = function_{}(value)".format(max(i - 1, 0)),
+            "    for item in range(other):",
+            "        print(item)",
+            "    while other:",
+            "        other = path.join(result, value)",
+            "    return result",
+            ""
+        ]
+    return "\n".join(lines)
@@ -0,0 +1,128 @@
+#! /usr/bin/env python3
+# Times every stage of the analyser against generated corpora at several scales and writes the timings as JSON.
+# Compare two result files with compare.py to find the subsystem a regression is in.
+#
+#   python benchmarks/run.py --scales 10 50 200 --output results.json
+import argparse
+import json
+import os
+import platform
+import time
+from contextlib import contextmanager
+from os import path
+from sys import path as sys_path
+from tempfile import TemporaryDirectory
+
+sys_path.insert(0, path.join(path.dirname(path.abspath(__file__)), "..", "src"))
+sys_path.insert(0, path.dirname(path.abspath(__file__)))
+
+from staticanalyser.translator.translate import translate
+from staticanalyser.translator.descriptor import Descriptor, Selector
+from staticanalyser.navigator.navigate import Navigator, navigate
+from staticanalyser.hunter import hunt
+from staticanalyser.shared.model import ModelOperations
+from corpus import CorpusSpec, generate_corpus, DANGER_SOURCE, SINK_FUNCTION
+
+
+@contextmanager
+def quiet():
+    """The translator reports progress on stdout, including from its worker processes, so silence the descriptor"""
+    devnull: int = os.open(os.devnull, os.O_WRONLY)
+    saved: int = os.dup(1)
+    os.dup2(devnull, 1)
+    try:
+        yield
+    finally:
+        os.dup2(saved, 1)
+        os.close(saved)
+        os.close(devnull)
+
+
+@contextmanager
+def working_dir(new_dir: str):
+    old_dir: str = os.getcwd()
+    os.chdir(new_dir)
+    try:
+        yield
+    finally:
+        os.chdir(old_dir)
+
+
+def _timed(func, *args, **kwargs) -> tuple:
+    start: float = time.perf_counter()
+    res = func(*args, **kwargs)
+    return time.perf_counter() - start, res
+
+
+def _count_leaves(tree: list) -> int:
+    return sum(_count_leaves(children) if children else 1 for _, children in tree)
+
+
+def run_scale(spec: CorpusSpec, jobs: int, recursion_depth: int) -> dict:
+    result: dict = {"corpus": spec.to_dict()}
+    with TemporaryDirectory() as tmp, working_dir(tmp):
+        files: list = generate_corpus(tmp, spec)
+        lines: int = 0
+        for f in files:
+            with open(f, "r") as fp:
+                lines += fp.read().count("\n")
+        result["files"] = len(files)
+        result["lines"] = lines
+
+        with quiet():
+            result["translate_seconds"], _ = _timed(translate, [path.join(tmp, "corpus")], {
+                "jobs": jobs, "source_paths": [tmp], "force": True, "lazy": True, "cache": False
+            })
+
+            descriptor: Descriptor = Descriptor.get_descriptor("python3")
+            descriptor.configure()
+            descriptor.reset_phase_times()
+            Selector.take_prefilter_stats()
+            for f in files:
+                descriptor.parse(f, "py", path.join(tmp, "phases"), [tmp], True)
+        result["parse_phase_seconds"] = descriptor.get_phase_times()
+        result["selector_prefilter"] = descriptor.get_prefilter_stats()
+
+        model_files: list = ModelOperations.get_model_files(".model")
+        n: Navigator = Navigator()
+        result["load_file_seconds"], _ = _timed(lambda: [n.load_file(f, False) for f in model_files])
+        result["load_file_with_dependencies_seconds"], _ = _timed(
+            lambda: [Navigator().load_file(f, True) for f in model_files])
+
+        result["navigate_seconds"], tree = _timed(navigate, DANGER_SOURCE, recursion_depth, model_files)
+        result["navigate_findings"] = _count_leaves(tree)
+        result["hunt_seconds"], findings = _timed(hunt, recursion_depth, [SINK_FUNCTION], [DANGER_SOURCE], [],
+                                                  model_files)
+        result["hunt_findings"] = sum(_count_leaves(res) for _, res in findings)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the static analyser on generated corpora")
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 40, 160], help="Module counts to run at")
+    parser.add_argument("--depth", type=int, default=2, help="Package nesting depth")
+    parser.add_argument("--imports", type=int, default=3, help="Modules imported by each module")
+    parser.add_argument("--calls", type=int, default=3, help="Calls made by each function")
+    parser.add_argument("--functions", type=int, default=8, help="Functions per module")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jobs", type=int, default=4, help="Translation processes")
+    parser.add_argument("--recursion-depth", type=int, default=10)
+    parser.add_argument("--output", default="bench_results.json")
+    args = parser.parse_args()
+
+    results: dict = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scales": []
+    }
+    for modules in args.scales:
+        spec: CorpusSpec = CorpusSpec(modules, args.depth, args.imports, args.calls, args.functions, seed=args.seed)
+        results["scales"].append(run_scale(spec, args.jobs, args.recursion_depth))
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,19 @@
 #!/usr/bin/env python3
 import click
-from staticanalyser.translator.translate import translate
-from staticanalyser.navigator.navigate import navigate
-from staticanalyser.hunter import hunt
+from staticanalyser.translator.translate import translate, translate_global, merge, parse_shard
+from staticanalyser.navigator.navigate import navigate, iter_navigate, TRUNCATED
+from staticanalyser.hunter import hunt, iter_hunt
+from staticanalyser.shared.model import ModelOperations
+from staticanalyser.shared.graph import CallGraph
+from staticanalyser.shared.database import ModelDatabase
+from staticanalyser.shared.pack import ModelPack
+from staticanalyser.shared.platform_constants import MODEL_STORE_NAME, MODEL_DATABASE_NAME, CALL_GRAPH_NAME, \
+    MODEL_PACK_NAME, LANGS_DIR
+from staticanalyser.regexbuilder.lint import lint_language
 import sys
+import json
 import logging
-from pathlib import Path, PosixPath
+from pathlib import PosixPath
 from os import path
 
 logging.basicConfig(
@@ -21,13 +29,58 @@ def cli():
     pass
 
 
-def get_files(src: path) -> list:
-    res: list = [src]
-    if path.isdir(src):
-        res = []
-        for file in Path(src).iterdir():
-            res += get_files(file)
-    return res
+def get_query_options(use_store: bool, jobs: int = 1, use_graph: bool = False, lazy: bool = True,
+                      load_depth: int = None, load_budget: int = None, use_database: bool = True,
+                      use_pack: bool = True, max_models: int = None, deadline: float = None,
+                      max_nodes: int = None) -> dict:
+    store_path: str = path.join(".model", MODEL_STORE_NAME)
+    database_path: str = path.join(".model", MODEL_DATABASE_NAME)
+    graph_path: str = path.join(".model", CALL_GRAPH_NAME)
+    pack_path: str = path.join(".model", MODEL_PACK_NAME)
+    return {
+        "store": store_path if use_store and path.isfile(store_path) else None,
+        "database": database_path if use_database and path.isfile(database_path) else None,
+        "graph": graph_path if use_graph and path.isfile(graph_path) else None,
+        "pack": pack_path if use_pack and path.isfile(pack_path) else None,
+        "jobs": jobs,
+        "lazy": lazy,
+        "translator": translate_global if lazy else None,
+        "load_depth": load_depth,
+        "load_budget": load_budget,
+        "max_models": max_models,
+        "deadline": deadline,
+        "max_nodes": max_nodes
+    }
+
+
+def _shard_option(ctx, param, value: str):
+    try:
+        return parse_shard(value) if value else None
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+def get_query_model_files(options: dict) -> list:
+    """The models in .model, listed from its model pack when one is used rather than by walking the tree"""
+    if options.get("pack"):
+        pack: ModelPack = ModelPack(options.get("pack"))
+        try:
+            return pack.get_model_files()
+        finally:
+            pack.close()
+    return ModelOperations.get_model_files(".model")
+
+
+def write_jsonl(findings) -> None:
+    # findings come with their locations, found by the navigator that searched them
+    for source, trail, sink, locations in findings:
+        click.echo(json.dumps({
+            "source": source,
+            "path": trail,
+            "sink": sink,
+            "truncated": sink == TRUNCATED,
+            "locations": locations
+        }))
 
 
 @cli.command("translate")
@@ -40,7 +93,26 @@ def get_files(src: path) -> list:
 @click.option("-f", "--force", "force", is_flag=True, help="Force translation of files, even if models exist")
 @click.option("-l/-L", "--lazy/--not-lazy", "lazy", default=True,
               help="Lazy translation. Translate global sources on demand. Disabling lazy is not recommended")
-def translate_cmd(file: list, jobs: int, source_paths: list, force, lazy, output_dir):
+@click.option("--store/--no-store", "store", default=True,
+              help="Write a memory mapped model store that queries can share after translation")
+@click.option("--database/--no-database", "database", default=False,
+              help="Also add the models to a SQLite model database, which translation workers update as they go")
+@click.option("--cache/--no-cache", "cache", default=True,
+              help="Reuse the selection of unchanged functions and classes from the selection cache of the user")
+@click.option("--chunk-jobs", "chunk_jobs", default=1, type=click.INT, metavar="[N]",
+              help="Split large files at top level definitions and select the chunks with N processes")
+@click.option("--chunk-lines", "chunk_lines", default=5000, type=click.INT, metavar="[N]",
+              help="Only split files with at least N lines after preprocessing")
+@click.option("--selector-timeout", "selector_timeout", default=60.0, type=click.FLOAT, metavar="[SECONDS]",
+              help="Stop a selector that runs for longer than SECONDS on a file, 0 to never stop selectors")
+@click.option("--shard", "shard", default=None, callback=_shard_option, metavar="[K/N]",
+              help="Only translate the files of shard K of N, into .model-shard-K-of-N unless an output dir is given")
+@click.option("--pack", "pack", is_flag=True,
+              help="Also write the models to a single model pack file, which is kept up to date once it exists")
+@click.option("--prefetch", "prefetch", default=4, type=click.INT, metavar="[N]",
+              help="Read N files ahead and write models in the background in each process, 0 to do both in turn")
+def translate_cmd(file: list, jobs: int, source_paths: list, force, lazy, output_dir, store, database, cache,
+                  chunk_jobs, chunk_lines, selector_timeout, shard, pack, prefetch):
     """Translate files and directory contents ready for static analysis"""
     # setup_logger()
     options: dict = {
@@ -48,20 +120,91 @@ def translate_cmd(file: list, jobs: int, source_paths: list, force, lazy, output
         "source_paths": list(source_paths),
         "force": force,
         "lazy": lazy,
-        "output_dir": output_dir
+        "output_dir": output_dir,
+        "store": store,
+        "database": database,
+        "cache": cache,
+        "chunk_jobs": chunk_jobs,
+        "chunk_lines": chunk_lines,
+        "selector_timeout": selector_timeout,
+        "shard": shard,
+        "pack": pack,
+        "prefetch": prefetch
     }
     translate(file, options)
 
 
+@cli.command("pack")
+@click.argument("model_dir", nargs=1, type=click.Path(exists=True, file_okay=False), default=".model",
+                metavar="[model dir]")
+def pack_cmd(model_dir: str):
+    """Write the models of a model dir to a single model pack file in it, which queries read in place of the tree"""
+    model_files: list = ModelOperations.get_model_files(model_dir)
+    ModelPack.write(path.join(model_dir, MODEL_PACK_NAME), model_files)
+    print("Packed {} models into {}".format(len(model_files), path.join(model_dir, MODEL_PACK_NAME)))
+
+
+@cli.command("merge")
+@click.argument("shard_dirs", nargs=-1, type=click.Path(exists=True, file_okay=False), required=True,
+                metavar="[shard dir ...]")
+@click.option("-o", "--output-dir", "output_dir", type=click.Path(file_okay=False),
+              help="Model dir to merge into, default is .model in the current dir")
+@click.option("--store/--no-store", "store", default=True, help="Write the model store of the merged models")
+@click.option("--database/--no-database", "database", default=False,
+              help="Write a model database of the merged models even when no shard has one")
+@click.option("--pack", "pack", is_flag=True, help="Also write the merged models to a model pack")
+def merge_cmd(shard_dirs: list, output_dir: str, store: bool, database: bool, pack: bool):
+    """Combine the model dirs written by translate --shard into one model dir"""
+    try:
+        res: int = merge(list(shard_dirs), {"output_dir": output_dir, "store": store, "database": database,
+                                            "pack": pack})
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+    if res:
+        print("Some shards are missing from the merge", file=sys.stderr)
+    sys.exit(res)
+
+
 @cli.command("find")
 @click.argument("global_id", nargs=1, type=click.STRING, required=True, metavar="[global id]")
 @click.option("-r", "--recursion-depth", "recursion_depth", type=click.INT,
               help="Recursion depth for finding variable usage", default=10)
-def navigate_cmd(global_id: str, recursion_depth: int):
-    files_to_load = get_files(".model/")
-    path: PosixPath
-    logging.debug("trying to load: {}".format("\n\t".join([str(path) for path in files_to_load])))
-    print(navigate(global_id, recursion_depth, files_to_load))
+@click.option("-F", "--format", "output_format", type=click.Choice(["text", "jsonl"]), default="text",
+              help="Output format, jsonl writes one finding per line as it is found")
+@click.option("--store/--no-store", "use_store", default=True,
+              help="Use the index of entities and references written by translate to skip the local models that "
+                   "cannot reference the global id, the models are still read from their files")
+@click.option("--database/--no-database", "use_database", default=True,
+              help="Use the model database written by translate --database in place of the model store")
+@click.option("--lazy/--not-lazy", "lazy", default=True,
+              help="Translate global sources that have no model yet when they are needed")
+@click.option("--load-depth", "load_depth", default=None, type=click.INT, metavar="[N]",
+              help="Only load the models of dependencies up to N references away, all of them by default")
+@click.option("--load-budget", "load_budget", default=None, type=click.INT, metavar="[N]",
+              help="Load at most N dependency models each time dependencies are loaded, no limit by default")
+@click.option("--pack/--no-pack", "use_pack", default=True,
+              help="Read the models from the model pack written by translate --pack or pack")
+@click.option("--max-models", "max_models", default=None, type=click.INT, metavar="[N]",
+              help="Keep at most N models loaded, unloading the least recently used ones, no limit by default. "
+                   "The file, filter and references of an unloaded model are kept to search it")
+@click.option("--deadline", "deadline", default=None, type=click.FLOAT, metavar="[SECONDS]",
+              help="Stop searching after SECONDS and output what was found, marking the unfinished branches with ...")
+@click.option("--max-nodes", "max_nodes", default=None, type=click.INT, metavar="[N]",
+              help="Stop searching from a source after N nodes, marking the unfinished branches with ...")
+def navigate_cmd(global_id: str, recursion_depth: int, output_format: str, use_store: bool, use_database: bool,
+                 lazy: bool, load_depth: int, load_budget: int, use_pack: bool, max_models: int, deadline: float,
+                 max_nodes: int):
+    options: dict = get_query_options(use_store, lazy=lazy, load_depth=load_depth, load_budget=load_budget,
+                                      use_database=use_database, use_pack=use_pack, max_models=max_models,
+                                      deadline=deadline, max_nodes=max_nodes)
+    files_to_load = get_query_model_files(options)
+    model_file: PosixPath
+    logging.debug("trying to load: {}".format("\n\t".join([str(model_file) for model_file in files_to_load])))
+    if output_format == "jsonl":
+        write_jsonl(iter_navigate(global_id, recursion_depth, files_to_load, options, locations=True))
+    else:
+        print(navigate(global_id, recursion_depth, files_to_load, options))
 
 
 @cli.command("hunt")
@@ -75,9 +218,113 @@ def navigate_cmd(global_id: str, recursion_depth: int):
               help="Specify the global id of a function that cleans data")
 @click.option("-l", "--language", "language", type=click.STRING, help="Language to use for standard searching",
               default="")
-def hunt_cmd(recursion_depth: int, sink_functions: list, dangers: list, clean_funcs: list, language: str):
-    files_to_load = get_files(".model/")
-    print(hunt(recursion_depth, list(sink_functions), list(dangers), list(clean_funcs), files_to_load, language))
+@click.option("-j", "--jobs", default=1, type=click.INT, help="Use N processes to hunt danger sources in parallel",
+              metavar="[N]")
+@click.option("-F", "--format", "output_format", type=click.Choice(["text", "jsonl"]), default="text",
+              help="Output format, jsonl writes one finding per line as it is found")
+@click.option("--store/--no-store", "use_store", default=True,
+              help="Use the index of entities and references written by translate to skip the local models that "
+                   "cannot reference the global id, the models are still read from their files")
+@click.option("--database/--no-database", "use_database", default=True,
+              help="Use the model database written by translate --database in place of the model store")
+@click.option("--graph/--no-graph", "use_graph", default=True,
+              help="Use the call graph written by graph to skip danger sources that cannot reach a sink function")
+@click.option("--lazy/--not-lazy", "lazy", default=True,
+              help="Translate global sources that have no model yet when they are needed")
+@click.option("--load-depth", "load_depth", default=None, type=click.INT, metavar="[N]",
+              help="Only load the models of dependencies up to N references away, all of them by default")
+@click.option("--load-budget", "load_budget", default=None, type=click.INT, metavar="[N]",
+              help="Load at most N dependency models each time dependencies are loaded, no limit by default")
+@click.option("--pack/--no-pack", "use_pack", default=True,
+              help="Read the models from the model pack written by translate --pack or pack")
+@click.option("--max-models", "max_models", default=None, type=click.INT, metavar="[N]",
+              help="Keep at most N models loaded, unloading the least recently used ones, no limit by default. "
+                   "The file, filter and references of an unloaded model are kept to search it")
+@click.option("--deadline", "deadline", default=None, type=click.FLOAT, metavar="[SECONDS]",
+              help="Stop searching after SECONDS and output what was found, marking the unfinished branches with ...")
+@click.option("--max-nodes", "max_nodes", default=None, type=click.INT, metavar="[N]",
+              help="Stop searching from a source after N nodes, marking the unfinished branches with ...")
+def hunt_cmd(recursion_depth: int, sink_functions: list, dangers: list, clean_funcs: list, language: str,
+             jobs: int, output_format: str, use_store: bool, use_database: bool, use_graph: bool, lazy: bool,
+             load_depth: int, load_budget: int, use_pack: bool, max_models: int, deadline: float, max_nodes: int):
+    options: dict = get_query_options(use_store, jobs, use_graph, lazy, load_depth, load_budget, use_database,
+                                      use_pack, max_models, deadline, max_nodes)
+    files_to_load = get_query_model_files(options)
+    if output_format == "jsonl":
+        write_jsonl(iter_hunt(recursion_depth, list(sink_functions), list(dangers), list(clean_funcs), files_to_load,
+                              language, options, locations=True))
+    else:
+        print(hunt(recursion_depth, list(sink_functions), list(dangers), list(clean_funcs), files_to_load, language,
+                   options))
+
+
+@cli.command("graph")
+@click.option("-d", "--reach-depth", "reach_depth", default=0, type=click.INT, metavar="[N]",
+              help="Precompute what every global id reaches in at most N calls, hunts with -r N use it directly")
+@click.option("-e", "--export", "export_format", type=click.Choice(["edges", "graphml"]), default=None,
+              help="Also export the graph as a tab separated edge list or as GraphML")
+@click.option("-o", "--output", "output", type=click.Path(dir_okay=False, writable=True), default=None,
+              help="File to export to, default is stdout")
+@click.option("--lazy/--not-lazy", "lazy", default=True,
+              help="Translate global sources that have no model yet when they are needed")
+def graph_cmd(reach_depth: int, export_format: str, output: str, lazy: bool):
+    """Build the call graph of the translated models for hunt and for export"""
+    graph_path: str = path.join(".model", CALL_GRAPH_NAME)
+    CallGraph.write(graph_path, ModelOperations.get_model_files(".model"), reach_depth,
+                    translate_global if lazy else ModelOperations.get_model_file)
+    if export_format:
+        graph: CallGraph = CallGraph(graph_path)
+        out = open(output, "w") if output else sys.stdout
+        try:
+            if export_format == "graphml":
+                graph.export_graphml(out)
+            else:
+                graph.export_edges(out)
+        finally:
+            if output:
+                out.close()
+            graph.close()
+
+
+@cli.command("query")
+@click.argument("lookup", nargs=1, type=click.Choice(["entity", "callers", "callees", "parameters", "functions"]),
+                required=True)
+@click.argument("global_id", nargs=1, type=click.STRING, required=True, metavar="[global id]")
+def query_cmd(lookup: str, global_id: str):
+    """Look global ids up in the model database written by translate --database, without loading the models.
+    functions takes the global id of a module"""
+    database_path: str = path.join(".model", MODEL_DATABASE_NAME)
+    if not path.isfile(database_path):
+        print("No model database, translate with --database first", file=sys.stderr)
+        sys.exit(1)
+    database: ModelDatabase = ModelDatabase(database_path)
+    try:
+        if lookup == "entity":
+            res = database.get_entity(global_id)
+        elif lookup == "callers":
+            res = database.get_referencing_entities(global_id)
+        elif lookup == "callees":
+            res = database.get_references(global_id)
+        elif lookup == "parameters":
+            res = [{"name": n, "type": t, "default_value": d} for n, t, d in database.get_parameters(global_id)]
+        else:
+            res = database.get_module_functions(global_id)
+    finally:
+        database.close()
+    print(json.dumps(res, indent=4))
+    sys.exit(0 if res else 1)
+
+
+@cli.command("lint-lang")
+@click.argument("language", nargs=1, type=click.STRING, required=True, metavar="[language or toml file]")
+def lint_lang_cmd(language: str):
+    """Check the patterns of a language bundle for catastrophic backtracking"""
+    language_file: str = language if path.isfile(language) else path.join(LANGS_DIR, "{}.toml".format(language))
+    warnings: list = lint_language(language_file)
+    for w in warnings:
+        print(w)
+    print("{} warnings".format(len(warnings)))
+    sys.exit(1 if warnings else 0)
 
 
 if __name__ == "__main__":
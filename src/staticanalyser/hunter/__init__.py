@@ -1,9 +1,18 @@
-from typing import List, Tuple
+from typing import List, Tuple, Iterator
+import multiprocessing as mp
 import logging
+import time
+from os import path, name
 import staticanalyser.shared.config as config
+from staticanalyser.shared.graph import CallGraph
+from staticanalyser.shared.model import ModelOperations
+from staticanalyser.shared.platform_constants import MODEL_DIR, MODEL_MANIFEST_NAME
+from staticanalyser.translator.translate import locate_global_source
 
+from staticanalyser.navigator.navigate import navigate, iter_navigate, ModelCache, TRUNCATED
 
-from staticanalyser.navigator.navigate import navigate
+# the models a worker process has read, shared by the searches of every danger source it hunts
+_worker_models: ModelCache = None
 
 
 def _prune_tree(global_id: str, tree: List[Tuple]):
@@ -35,18 +44,137 @@ def _strip_safe_branches(sink_functions: list, tree: List[Tuple]):
             _strip_safe_branches(sink_functions, branch[1])
 
 
-def hunt(recursion_depth: int, sink_functions: list, dangers: list, clean_funcs: list,
-         file_list: list, language: str = ""):
+def _add_language_defaults(sink_functions: list, dangers: list, language: str):
     if language != "":
         if config.get_sink_funcs_for_lang(language):
             sink_functions += config.get_sink_funcs_for_lang(language)
         if config.get_danger_funcs_for_lang(language):
             dangers += config.get_danger_funcs_for_lang(language)
-    findings = []
-    for danger in dangers:
-        res = navigate(danger, recursion_depth, file_list)
-        for func in clean_funcs:
-            _prune_tree(func, res)
-        _strip_safe_branches(sink_functions, res)
-        findings.append((danger, res))
-    return findings
+
+
+def _get_watched_paths(lazy: bool) -> list:
+    """The paths that change when a global id gains a model, the manifests of the model dirs and, with lazy
+    translation, the global source dirs a new module is found in"""
+    res: list = [path.join(d, MODEL_MANIFEST_NAME) for d in (path.abspath(".model"), MODEL_DIR) if path.isdir(d)]
+    if lazy:
+        for language in config.get_languages():
+            res += [d for d in config.get_language_source_dirs(language).get(name) or [] if path.isdir(d)]
+    return res
+
+
+def _get_reaching_dangers(recursion_depth: int, sink_functions: list, dangers: list, file_list: list,
+                          options: dict) -> list:
+    """The dangers that can reach a sink function according to the call graph, all of them without a current graph.
+    A path leaves a danger through a function referencing it and takes at most recursion_depth calls to a sink"""
+    graph_path: str = (options or {}).get("graph")
+    if not graph_path:
+        return dangers
+    graph: CallGraph = CallGraph(graph_path)
+    try:
+        # with lazy translation a global id the graph could not resolve gains a model as soon as its source is found
+        lazy: bool = options.get("lazy") is True
+        if not graph.is_current(file_list, lambda global_id: ModelOperations.get_model_file(global_id) is not None or (
+                lazy and locate_global_source(global_id)[0] is not None), _get_watched_paths(lazy)):
+            logging.warning("Call graph {} is out of date, hunting every danger source".format(graph_path))
+            return dangers
+        res: list = [d for d in dangers if graph.reachable(graph.get_callers(d), sink_functions, recursion_depth)]
+    finally:
+        graph.close()
+    logging.info("Call graph ruled out {} of {} danger sources".format(len(dangers) - len(res), len(dangers)))
+    return res
+
+
+def _hunt_danger(task: tuple, models: ModelCache) -> Tuple[str, List[Tuple]]:
+    danger, recursion_depth, sink_functions, clean_funcs, file_list, options = task
+    res = navigate(danger, recursion_depth, file_list, options, models)
+    for func in clean_funcs:
+        _prune_tree(func, res)
+    # a branch the search was stopped in may still reach a sink
+    _strip_safe_branches(sink_functions + [TRUNCATED], res)
+    return danger, res
+
+
+def _iter_danger_findings(danger: str, recursion_depth: int, sink_functions: list, clean_funcs: list,
+                          file_list: list, options: dict, locations: bool = False,
+                          models: ModelCache = None) -> Iterator[Tuple]:
+    reported: set = set()
+    for found in iter_navigate(danger, recursion_depth, file_list, options, locations, models):
+        path: List[str] = found[1]
+        for index, global_id in enumerate(path):
+            if global_id in clean_funcs:
+                break
+            if global_id in sink_functions or global_id == TRUNCATED:
+                finding: tuple = tuple(path[:index + 1])
+                if finding not in reported:
+                    reported.add(finding)
+                    if locations:
+                        yield danger, list(finding), global_id, found[3][:index + 1]
+                    else:
+                        yield danger, list(finding), global_id
+
+
+def _collect_danger_findings(task: tuple, models: ModelCache) -> List[Tuple]:
+    return list(_iter_danger_findings(*task, models))
+
+
+def _share_deadline(options: dict) -> dict:
+    """The deadline option counts from the start of the hunt, not from the search of each danger source"""
+    if options and options.get("deadline") is not None and options.get("stop_at") is None:
+        return dict(options, stop_at=time.time() + options.get("deadline"))
+    return options
+
+
+def _start_worker():
+    global _worker_models
+    _worker_models = ModelCache()
+
+
+def _run_in_worker(job: tuple):
+    func, task = job
+    return func(task, _worker_models)
+
+
+def _map_dangers(func, tasks: list, jobs: int) -> Iterator:
+    """Maps func over one task per danger source and the models read so far, in a pool of worker processes when more
+    than one job is allowed. Each process reads the models once for all the dangers it hunts. Results always come back
+    in the order of the dangers so the output does not depend on scheduling"""
+    if jobs > 1 and len(tasks) > 1:
+        logging.info("Hunting {} danger sources with {} processes".format(len(tasks), min(jobs, len(tasks))))
+        with mp.get_context("spawn").Pool(min(jobs, len(tasks)), initializer=_start_worker) as pool:
+            yield from pool.imap(_run_in_worker, [(func, task) for task in tasks], chunksize=1)
+    else:
+        models: ModelCache = ModelCache()
+        for task in tasks:
+            yield func(task, models)
+
+
+def hunt(recursion_depth: int, sink_functions: list, dangers: list, clean_funcs: list,
+         file_list: list, language: str = "", options: dict = None):
+    _add_language_defaults(sink_functions, dangers, language)
+    options = _share_deadline(options)
+    reaching: list = _get_reaching_dangers(recursion_depth, sink_functions, dangers, file_list, options)
+    tasks: list = [(danger, recursion_depth, sink_functions, clean_funcs, file_list, options) for danger in reaching]
+    found: dict = dict(_map_dangers(_hunt_danger, tasks, (options or {}).get("jobs") or 1))
+    return [(danger, found.get(danger, [])) for danger in dangers]
+
+
+def iter_hunt(recursion_depth: int, sink_functions: list, dangers: list, clean_funcs: list,
+              file_list: list, language: str = "", options: dict = None, locations: bool = False) -> Iterator[Tuple]:
+    """Generator variant of hunt, yields a (danger, path, sink) finding for every path from a danger source to a sink
+    function that does not pass through a clean function. Together the paths cover the same branches hunt keeps, and
+    the paths the search was stopped on end in TRUNCATED in place of a sink. With locations, each finding also has
+    the locations of its calls as iter_navigate finds them"""
+    _add_language_defaults(sink_functions, dangers, language)
+    options = _share_deadline(options)
+    dangers = _get_reaching_dangers(recursion_depth, sink_functions, dangers, file_list, options)
+    jobs: int = (options or {}).get("jobs") or 1
+    if jobs > 1:
+        tasks: list = [(danger, recursion_depth, sink_functions, clean_funcs, file_list, options, locations) for
+                       danger in dangers]
+        for findings in _map_dangers(_collect_danger_findings, tasks, jobs):
+            yield from findings
+    else:
+        models: ModelCache = ModelCache()
+        for danger in dangers:
+            yield from _iter_danger_findings(danger, recursion_depth, sink_functions, clean_funcs, file_list, options,
+                                             locations, models)
@@ -1,7 +1,17 @@
-from typing import Dict, Union, Tuple
+from typing import Dict, List, Union, Tuple, Iterator
+from collections import deque
 from os import path
 from staticanalyser.shared.model import *
+from staticanalyser.shared.store import ModelStore
+from staticanalyser.shared.database import ModelDatabase
+from staticanalyser.shared.bloom import BloomFilter, ModelFilter
+from staticanalyser.shared.pack import ModelPack
+from staticanalyser.shared.symbols import SymbolTable, NO_SYMBOL, MAX_SYMBOL_LENGTH
 import logging
+import time
+
+# the branch ending a list of branches the search was stopped in, it is not a global id
+TRUNCATED: str = "..."
 
 
 class Navigator:
@@ -10,9 +20,64 @@ class Navigator:
         List[FunctionModel],
         List[ClassModel]
     ]]] = None
+    _store: Union[ModelStore, ModelDatabase] = None
+    _source_files: Dict[str, str] = None
+    _options: dict = None
+    _entities: Dict[str, NamedModelGeneric] = None
+    _missing_entities: set = None
+    _resolved_ids: Dict[str, Tuple[str, str]] = None
+    _expanded_models: set = None
+    _load_stats: dict = None
+    _filters: Dict[str, BloomFilter] = None
+    _pack: ModelPack = None
+    _symbols: SymbolTable = None
+    _model_files: Dict[str, str] = None
+    _file_models: Dict[str, str] = None
+    _model_entities: Dict[str, List[str]] = None
+    _entity_models: Dict[str, str] = None
+    _pinned: set = None
+    _indexed_models: set = None
+    _unloaded_references: Dict[str, frozenset] = None
+    _models: "ModelCache" = None
 
-    def __init__(self):
+    def __init__(self, options: dict = None, models: "ModelCache" = None):
+        # least recently used first, models past the max_models option are unloaded from the front
         self._loaded_models = {}
+        self._source_files = {}
+        self._entities = {}
+        self._missing_entities = set()
+        self._resolved_ids = {}
+        self._expanded_models = set()
+        self._load_stats = {"loaded": 0, "unresolved": 0, "skipped_depth": 0, "skipped_budget": 0,
+                            "filtered": 0, "seconds": 0.0, "hits": 0,
+                            "misses": 0, "evictions": 0, "reloads": 0}
+        self._filters = {}
+        # every model loaded so far in the order it was first loaded, to reload the unloaded ones from
+        self._model_files = {}
+        self._file_models = {}
+        self._model_entities = {}
+        self._entity_models = {}
+        self._pinned = set()
+        # the models the index has as they are now, a model written after it is searched instead
+        self._indexed_models = set()
+        # the global ids each unloaded model references, a search for another id does not load it again
+        self._unloaded_references = {}
+        options = options or {}
+        self._options = options
+        # models are read from the cache once they are decoded, unless max_models bounds the models kept
+        self._models = models if options.get("max_models") is None else None
+        # the strings of loaded models are interned unless the intern option is False, those of cached models in the
+        # table of the cache
+        if options.get("intern", True):
+            self._symbols = self._models.get_symbol_table() if self._models else SymbolTable()
+        # both indexes answer the same queries, the database also answers them for models the store predates
+        if options.get("database"):
+            self._store = ModelDatabase(options.get("database"))
+        elif options.get("store"):
+            self._store = ModelStore(options.get("store"))
+        # models in the pack are read from it, the others from their files
+        if options.get("pack"):
+            self._pack = ModelPack(options.get("pack"))
 
     def entity_model_is_loaded(self, global_id: str) -> Tuple[bool, str]:
         gid_split: list = global_id.split(".")
@@ -23,34 +88,31 @@ class Navigator:
                 return True, model_id
         return False, ""
 
-    def _search_model_for_gid(self, global_id: str, target: Union[dict, list]) -> (bool, NamedModelGeneric):
-        if type(target) is list:
-            for e in target:
-                res = self._search_model_for_gid(global_id, e)
-                if res[0]:
-                    return res
-        elif type(target) is dict:
-            for k in target.keys():
-                res = self._search_model_for_gid(global_id, target[k])
-                if res[0]:
-                    return res
-        elif type(target) is str:
-            return False, None
-        else:
-            if target:
-                if "_global_identifier" in target.__dict__.keys():
-                    if target.__dict__.get("_global_identifier") == global_id:
-                        return True, target
-                for k in target.__dict__.keys():
-                    res = self._search_model_for_gid(global_id, target.__dict__[k])
-                    if res[0]:
-                        return res
-        return False, None
-
-    def find_references_to_global_id(self, global_id: str) -> List[FunctionModel]:
+    def find_references_to_global_id(self, global_id: str, pin: bool = False) -> List[FunctionModel]:
+        """The functions of the models loaded so far that reference a global id, unloaded models are loaded again to
+        search them. When pin is set the models with references are kept loaded"""
         entities: List[FunctionModel] = []
-        for model in self._loaded_models.values():
-            funcs: list = model.get("functions")
+        if self._symbols is not None and len(global_id) <= MAX_SYMBOL_LENGTH:
+            symbol: int = self._symbols.get_symbol(global_id)
+            if symbol == NO_SYMBOL:
+                # no loaded model has the string, so none references it
+                return entities
+            # the interned copy is the one the references hold, they compare by identity
+            global_id = self._symbols.get_string(symbol)
+        referencing: set = set(self._store.get_referencing_model_ids(global_id)) if self._store else set()
+        for base_id in list(self._model_files):
+            if base_id not in referencing and base_id in self._indexed_models:
+                # the index knows the model and has no reference to the global id in it
+                continue
+            if base_id in self._filters and global_id not in self._filters[base_id] or (
+                    base_id not in self._loaded_models and base_id in self._unloaded_references and
+                    global_id not in self._unloaded_references[base_id]):
+                self._load_stats["filtered"] += 1
+                continue
+            model: dict = self._get_model(base_id)
+            if model is None:
+                continue
+            funcs: list = list(model.get("functions"))
             for klazz in model.get("classes"):
                 for func in klazz.__dict__.get("_functions"):
                     funcs.append(func)
@@ -58,21 +120,95 @@ class Navigator:
                 for l in func.__dict__.get("_statements"):
                     if type(l) == FunctionModel:
                         funcs.append(l)
-            funcs = list(set(funcs))
+            # de-duplicate in order so results are the same in every process
+            funcs = list(dict.fromkeys(funcs))
             for func in funcs:
                 if global_id in self._find_all_references(func):
                     entities.append(func)
+                    if pin:
+                        self._pinned.add(base_id)
         return entities
 
     def lookup_entity(self, global_id: str, fail_out: bool = False) -> (bool, NamedModelGeneric):
-        entity_loaded = self.entity_model_is_loaded(global_id)
-        if entity_loaded[0]:
-            return self._search_model_for_gid(global_id, self._loaded_models[entity_loaded[1]])
+        entity: NamedModelGeneric = self._entities.get(global_id)
+        if entity is not None:
+            self._load_stats["hits"] += 1
+            self._touch(self._entity_models[global_id])
+            return True, entity
+        if global_id in self._missing_entities:
+            return False, None
         if not fail_out:
             self.load_entity(global_id)
             return self.lookup_entity(global_id, True)
+        # remembered until another model is loaded, which may define it
+        self._missing_entities.add(global_id)
+        return False, None
+
+    def _add_model(self, base_id: str, model: dict, file_name: str, model_file: str = None):
+        if base_id in self._model_files:
+            self._load_stats["reloads"] += 1
         else:
-            return False, None
+            self._model_files[base_id] = model_file
+            if model_file:
+                self._file_models[path.abspath(str(model_file))] = base_id
+            bloom: BloomFilter = self._read_filter(model_file) if model_file else None
+            if bloom is not None:
+                self._filters[base_id] = bloom
+            if model_file and self._store and self._store.has_model(base_id) and self._store.is_current(model_file):
+                self._indexed_models.add(base_id)
+        self._loaded_models[base_id] = model
+        self._source_files[base_id] = file_name
+        # the first model with an id wins, in the order a search of the model would meet them
+        owned: List[str] = []
+        for e in ModelOperations.walk(model):
+            global_id: str = e.__dict__.get("_global_identifier")
+            if global_id and self._entities.setdefault(global_id, e) is e:
+                self._entity_models[global_id] = base_id
+                owned.append(global_id)
+        self._model_entities[base_id] = owned
+        self._missing_entities.clear()
+        self._evict()
+
+    def _touch(self, base_id: str):
+        # dicts keep their insertion order, a model inserted again becomes the most recently used
+        self._loaded_models[base_id] = self._loaded_models.pop(base_id)
+
+    def _evict(self):
+        """Unloads the least recently used models while more than max_models are loaded, leaving out the pinned models
+        and the one loaded last. An unloaded model is loaded again from its file the next time it is looked up.
+        Unloading frees the model and its entities only: its file, filter, source file and the global ids it references
+        are kept to search and reload it, as are the strings interned from it, so those grow with every model loaded"""
+        max_models: int = self._options.get("max_models")
+        if max_models is None or len(self._loaded_models) <= max_models:
+            return
+        for base_id in list(self._loaded_models)[:-1]:
+            if len(self._loaded_models) <= max_models:
+                break
+            if base_id in self._pinned or not self._model_files.get(base_id):
+                continue
+            if base_id not in self._unloaded_references:
+                self._unloaded_references[base_id] = frozenset(self._find_all_references(self._loaded_models[base_id]))
+            del self._loaded_models[base_id]
+            for global_id in self._model_entities.pop(base_id):
+                del self._entities[global_id]
+                del self._entity_models[global_id]
+            self._load_stats["evictions"] += 1
+
+    def _get_model(self, base_id: str) -> dict:
+        """A model loaded so far, loaded again if it was unloaded since"""
+        if base_id not in self._loaded_models and self._model_files.get(base_id):
+            model_file: str = self._model_files[base_id]
+            self._add_model(base_id, *self._read_model(model_file)[1:], model_file)
+        return self._loaded_models.get(base_id)
+
+    def pin(self, global_id: str):
+        """Keeps the model of a global id loaded whatever the max_models option is, it need not be loaded yet"""
+        base_id: str = self._resolve_model(global_id)[0]
+        if base_id:
+            self._pinned.add(base_id)
+
+    def unpin(self, global_id: str):
+        self._pinned.discard(self._resolve_model(global_id)[0])
 
     def _find_all_references(self, model: Union[dict, list, NamedModelGeneric]) -> Union[
         List[str],
@@ -87,7 +223,7 @@ class Navigator:
             for k in model.keys():
                 res = self._find_all_references(model[k])
                 ret += res
-        elif type(model) is str or model is None:
+        elif not issubclass(type(model), ModelGeneric):
             return []
         else:
             if "_ref" in model.__dict__.keys():
@@ -119,134 +255,402 @@ class Navigator:
 
     def find_references_in_model(self, global_id: str):
         search_model = ModelOperations.get_base_global_id(global_id)
-        return list(set(self._find_all_references(self._loaded_models[search_model])))
+        return list(set(self._find_all_references(self._get_model(search_model))))
 
-    def load_file(self, model_file, load_dependencies):
+    def _in_pack(self, model_file) -> bool:
+        return self._pack is not None and self._pack.is_current(model_file)
+
+    def _read_filter(self, model_file) -> BloomFilter:
+        if self._models and self._models.has_filter(model_file):
+            return self._models.get_filter(model_file)
+        bloom: BloomFilter = self._pack.get_filter(model_file) if self._in_pack(model_file) else \
+            ModelFilter.read(model_file)
+        if self._models:
+            self._models.add_filter(model_file, bloom)
+        return bloom
+
+    def _read_model(self, model_file) -> Tuple[str, dict, str]:
+        if self._models and self._models.has_model(model_file):
+            return self._models.get_model(model_file)
         model = {"classes": [], "functions": [], "dependencies": []}
-        model_data = {}
-        with open(model_file, "r") as fp:
-            model_data: dict = json.load(fp)
-        base_id: str = model_data.get("model_id")
-        if base_id not in self._loaded_models.keys():
-            for klazz in model_data.get("classes"):
-                c = ModelOperations.load_model_from_dict(klazz)
-                model["classes"].append(c)
-            for func in model_data.get("functions"):
-                f = ModelOperations.load_model_from_dict(func)
-                model["functions"].append(f)
-            for dependency in model_data.get("dependencies"):
-                d = ModelOperations.load_model_from_dict(dependency)
-                model["dependencies"].append(d)
-            self._loaded_models[base_id] = model
-            if load_dependencies:
-                dependencies: List[str] = self._find_all_references(model)
-                for dependency in dependencies:
-                    self.load_entity(dependency, True)
+        model_data: dict = self._pack.read_model_file(model_file) if self._in_pack(model_file) else \
+            ModelOperations.read_model_file(model_file)
+        if self._symbols is not None:
+            self._symbols.intern_model(model_data)
+        for klazz in model_data.get("classes"):
+            c = ModelOperations.load_model_from_dict(klazz)
+            model["classes"].append(c)
+        for func in model_data.get("functions"):
+            f = ModelOperations.load_model_from_dict(func)
+            model["functions"].append(f)
+        for dependency in model_data.get("dependencies"):
+            d = ModelOperations.load_model_from_dict(dependency)
+            model["dependencies"].append(d)
+        res: Tuple[str, dict, str] = (model_data.get("model_id"), model, model_data.get("file_name"))
+        if self._models:
+            self._models.add_model(model_file, res)
+        return res
+
+    def load_file(self, model_file, load_dependencies):
+        base_id: str = self._file_models.get(path.abspath(str(model_file)))
+        if base_id in self._loaded_models:
+            self._load_stats["hits"] += 1
+            self._touch(base_id)
+        elif base_id is not None:
+            self._get_model(base_id)
+        else:
+            base_id, model, file_name = self._read_model(model_file)
+            if base_id not in self._loaded_models.keys():
+                self._add_model(base_id, model, file_name, model_file)
+            # another file with the same model id is not read again either
+            self._file_models.setdefault(path.abspath(str(model_file)), base_id)
+        if load_dependencies:
+            self._load_dependencies(base_id)
+
+    def _locate_model(self, global_id: str) -> Tuple[str, path]:
+        if self._store:
+            model_id, model_file = self._store.get_model(global_id)
+            if model_id:
+                return model_id, model_file
+        if self._pack:
+            model_id, model_file = self._pack.get_model(global_id)
+            if model_id:
+                return model_id, model_file
+        model_file: str = ModelOperations.get_model_file(global_id)
+        # the translator option translates the source of a global id with no model on demand, returning its model file
+        translator = self._options.get("translator")
+        if not model_file and translator:
+            model_file = translator(global_id, self._options)
+        return ModelOperations.get_base_global_id(global_id), model_file
+
+    def filter_model_files(self, global_id: str, file_list: list) -> list:
+        """Narrows a list of model files to those that can reference a global id, from the model store when there is
+        one and otherwise from the filters written next to the models or kept in the model pack. Files written after
+        the store are kept"""
+        res: list = []
+        if self._store:
+            candidates: set = set(self._store.get_referencing_model_files(global_id))
+            res = [f for f in file_list if path.abspath(str(f)) in candidates or not self._store.is_current(f)]
+        else:
+            for f in file_list:
+                bloom: BloomFilter = self._read_filter(f)
+                if bloom is None or global_id in bloom:
+                    res.append(f)
+        self._load_stats["filtered"] += len(file_list) - len(res)
+        return res
 
     def load_entity(self, global_id: str, load_dependencies: bool = False):
-        if global_id.split(".")[0] == "builtin":
-            return
-        model: dict = {"classes": [], "functions": [], "dependencies": []}
-        if ModelOperations.get_base_global_id(global_id) not in self._loaded_models.keys():
-            model_file = ModelOperations.get_model_file(global_id)
-            if model_file:
-                with open(model_file, "r") as fp:
-                    model_data: dict = json.load(fp)
-                for klazz in model_data.get("classes"):
-                    c = ModelOperations.load_model_from_dict(klazz)
-                    model["classes"].append(c)
-                for func in model_data.get("functions"):
-                    f = ModelOperations.load_model_from_dict(func)
-                    model["functions"].append(f)
-                for dependency in model_data.get("dependencies"):
-                    d = ModelOperations.load_model_from_dict(dependency)
-                    model["dependencies"].append(d)
-                self._loaded_models[ModelOperations.get_base_global_id(global_id)] = model
-            if load_dependencies:
-                dependencies: List[str] = self._find_all_references(model)
-                for dependency in dependencies:
-                    self.load_entity(dependency, True)
-
-    def _find_usage_assignment(self, st: StatementModel, variable: str) -> str:
-        rhs = st.get_rhs()
-        if type(rhs) == ReferenceModel:
-            rhs: ReferenceModel
-            if rhs.get_ref() == variable:
-                return st.get_lhs()
-        return None
+        self._load([(global_id, 0)], load_dependencies)
+
+    def _load_dependencies(self, base_id: str):
+        if base_id not in self._expanded_models:
+            self._expanded_models.add(base_id)
+            self._load([(r, 1) for r in self._find_all_references(self._loaded_models[base_id])], True)
+
+    def _resolve_model(self, global_id: str) -> Tuple[str, str]:
+        if global_id not in self._resolved_ids:
+            base_id, model_file = self._locate_model(global_id)
+            self._resolved_ids[global_id] = (base_id, model_file) if model_file else (None, None)
+            if not model_file:
+                self._load_stats["unresolved"] += 1
+        return self._resolved_ids[global_id]
+
+    def _load(self, requests: List[Tuple[str, int]], load_dependencies: bool):
+        """Loads the models of global ids and, when asked, the models they reference, depth first in reference order.
+        Each id is located once per navigator, and ids without a model are not looked for again. Dependencies stop at
+        the load_depth option and after load_budget models, when those are set"""
+        start: float = time.perf_counter()
+        max_depth: int = self._options.get("load_depth")
+        budget: int = self._options.get("load_budget")
+        loaded: int = 0
+        pending: list = requests[::-1]
+        while pending:
+            global_id, depth = pending.pop()
+            if global_id.split(".")[0] == "builtin":
+                continue
+            base_id, model_file = self._resolve_model(global_id)
+            if not model_file:
+                continue
+            if base_id not in self._loaded_models.keys():
+                if depth > 0 and budget is not None and loaded >= budget:
+                    self._load_stats["skipped_budget"] += 1
+                    continue
+                if base_id not in self._model_files:
+                    self._load_stats["loaded"] += 1
+                self._load_stats["misses"] += 1
+                self._add_model(base_id, *self._read_model(model_file)[1:], model_file)
+                loaded += 1
+            else:
+                self._load_stats["hits"] += 1
+                self._touch(base_id)
+            if load_dependencies and base_id not in self._expanded_models:
+                if max_depth is not None and depth >= max_depth:
+                    self._load_stats["skipped_depth"] += 1
+                    continue
+                self._expanded_models.add(base_id)
+                references: list = self._find_all_references(self._loaded_models[base_id])
+                pending += [(r, depth + 1) for r in references[::-1]]
+        self._load_stats["seconds"] += time.perf_counter() - start
 
-    def _find_usage_parameter(self, st: StatementModel, variable: str) -> Tuple[FunctionModel, str]:
-        logging.debug("Finding use of {} for {}".format(variable, st))
-        rhs = st.get_rhs()
-        if type(rhs) == ReferenceModel:
-            rhs: ReferenceModel
-            for index, parm in enumerate(rhs.get_parameters()):
-                parm: VariableModel
-                if parm.get_default() == variable:
-                    func: Tuple[bool, FunctionModel] = self.lookup_entity(rhs.get_ref())
-                    if func[0]:
-                        return func[1], func[1].get_parameters()[
-                            index if func[1].get_parameters()[0].get_name() != "self" else index + 1
-                        ].get_name()
-                    else:
-                        return rhs.get_ref(), variable
-        return None, ""
-
-    def find_usages(self, func: FunctionModel, variable: str) -> List[Tuple[FunctionModel,str]]:
+    def get_load_stats(self) -> dict:
+        """How many models were loaded, how many ids had no model, how many dependency models the load_depth and the
+        load_budget options each left out, how many models their filters or the references kept of unloaded models
+        ruled out of searches and how long loading took. Hits count the lookups of models already loaded, misses those
+        that read a model, and evictions and reloads the models max_models unloaded and those read again after it"""
+        return dict(self._load_stats)
+
+    def _resolve_parameter(self, rhs: ReferenceModel, index: int, variable: str) -> Tuple[FunctionModel, str]:
+        func: Tuple[bool, FunctionModel] = self.lookup_entity(rhs.get_ref())
+        if func[0]:
+            names: List[str] = [p.get_name() for p in func[1].get_parameters()]
+            # keyword arguments are passed by name, the rest by position
+            passed: str = rhs.get_parameters()[index].get_name()
+            if passed in names:
+                return func[1], passed
+            position: int = index if not names or names[0] != "self" else index + 1
+            if position < len(names):
+                return func[1], names[position]
+        return rhs.get_ref(), variable
+
+    def find_usages(self, func: ControlFlowGeneric, variable: str, _visiting: set = None) -> List[
+            Tuple[FunctionModel, str]]:
+        """The functions and parameters a variable flows into, directly or through the variables assigned from it,
+        walking the def-use chains of the function and the blocks nested in it"""
+        visiting: set = _visiting or set()
+        if (id(func), variable) in visiting:
+            # a variable assigned back to itself adds no new uses
+            return []
+        visiting.add((id(func), variable))
         ret: List[Tuple[FunctionModel, str]] = []
-        for statement in func.get_as_statements():
-            if type(statement) is StatementModel:
-                new_var = self._find_usage_assignment(statement, variable)
-                if new_var:
-                    ret += self.find_usages(func, new_var)
-                func_res = self._find_usage_parameter(statement, variable)
+        for use in func.get_def_use().get(variable) or []:
+            if use[0] == "assign":
+                ret += self.find_usages(func, use[1], visiting)
+            elif use[0] == "parameter":
+                func_res: Tuple[FunctionModel, str] = self._resolve_parameter(use[1], use[2], variable)
                 if func_res[0]:
                     ret.append(func_res)
-            if issubclass(type(statement), ControlFlowGeneric):
-                ret += self.find_usages(statement, variable)
+            else:
+                ret += self.find_usages(use[1], variable, visiting)
+        visiting.remove((id(func), variable))
         return ret
 
+    def find_callers(self, global_id: str) -> List[str]:
+        """The sorted global ids of the functions that reference a global id, including the functions enclosing the
+        reference, from the index when there is one and otherwise from the loaded models"""
+        if self._store:
+            return sorted(self._store.get_referencing_functions(global_id))
+        return sorted(set(f.get_global_identifier() for f in self.find_references_to_global_id(global_id)))
+
+    def find_module_functions(self, model_id: str) -> List[str]:
+        """The global ids of the functions defined in a model, including methods and nested functions"""
+        if self._store and self._store.has_model(model_id) and \
+                self._store.is_current(self._store.get_model(model_id)[1]):
+            return self._store.get_module_functions(model_id)
+        self.load_entity(model_id)
+        return [e.get_global_identifier() for e in ModelOperations.walk(self._get_model(model_id) or {}) if
+                type(e) is FunctionModel]
+
+    def find_reference_location(self, caller: str, callee: str) -> dict:
+        """The source file, lines and columns where the entity caller references callee"""
+        found, entity = self.lookup_entity(caller)
+        if not found:
+            return None
+        for e in ModelOperations.walk(entity):
+            if type(e) is ReferenceModel and e.get_ref() == callee and e.get_location():
+                return dict(e.get_location(), file=self._source_files.get(self.entity_model_is_loaded(caller)[1]))
+        return None
+
     def get_loaded_models(self):
         return self._loaded_models
 
+    def get_symbol_table(self) -> SymbolTable:
+        return self._symbols
+
     def __str__(self):
         return str(self._loaded_models)
 
 
-def navigate(global_id: str, recursion_depth: int, file_list: list):
-    n = Navigator()
+class ModelCache(object):
+    """The models decoded from their files, shared by the navigators of searches a process runs one after another over
+    the same model files so each file is read once. Each search still has a navigator of its own, which only reads the
+    models it shares. A cache is shared by navigators with the same options, and is not used with max_models"""
+    _models: Dict[str, Tuple[str, dict, str]] = None
+    _filters: Dict[str, BloomFilter] = None
+    _symbols: SymbolTable = None
+
+    def __init__(self):
+        self._models = {}
+        self._filters = {}
+        self._symbols = SymbolTable()
+
+    def has_model(self, model_file) -> bool:
+        return path.abspath(str(model_file)) in self._models
+
+    def get_model(self, model_file) -> Tuple[str, dict, str]:
+        return self._models.get(path.abspath(str(model_file)))
+
+    def add_model(self, model_file, model: Tuple[str, dict, str]):
+        self._models[path.abspath(str(model_file))] = model
+
+    def has_filter(self, model_file) -> bool:
+        return path.abspath(str(model_file)) in self._filters
+
+    def get_filter(self, model_file) -> BloomFilter:
+        # None when the model has no filter
+        return self._filters.get(path.abspath(str(model_file)))
+
+    def add_filter(self, model_file, bloom: BloomFilter):
+        self._filters[path.abspath(str(model_file))] = bloom
+
+    def get_symbol_table(self) -> SymbolTable:
+        return self._symbols
+
+
+class SearchBudget(object):
+    """The limits a search stops at, from the deadline option in seconds from when the search starts, the stop_at
+    option as a time.time() to share one deadline between searches, and the max_nodes option"""
+    _stop_at: float = None
+    _max_nodes: int = None
+    _nodes: int = 0
+    _spent: bool = False
+
+    def __init__(self, options: dict = None):
+        options = options or {}
+        self._stop_at = options.get("stop_at")
+        if self._stop_at is None and options.get("deadline") is not None:
+            self._stop_at = time.time() + options.get("deadline")
+        self._max_nodes = options.get("max_nodes")
+
+    def is_spent(self) -> bool:
+        if not self._spent and self._stop_at is not None and time.time() >= self._stop_at:
+            logging.warning("Search deadline reached, the results are partial")
+            self._spent = True
+        return self._spent
+
+    def take_node(self) -> bool:
+        """Counts a node added to the results, False when the budget has none left"""
+        if not self.is_spent() and self._max_nodes is not None and self._nodes >= self._max_nodes:
+            logging.warning("Search stopped after {} nodes, the results are partial".format(self._nodes))
+            self._spent = True
+        if self._spent:
+            return False
+        self._nodes += 1
+        return True
+
+
+def _prepare_navigator(global_id: str, file_list: list, options: dict, budget: SearchBudget,
+                       models: ModelCache = None) -> Tuple[Navigator, List[FunctionModel], bool]:
+    """The navigator of a search and the functions referencing its global id. Past the deadline no more local models
+    are loaded, and the references found are not all of them"""
+    n = Navigator(options, models)
+    if budget.is_spent():
+        return n, [], False
+    # the sink and the functions referencing it are where every path starts, they are never unloaded
+    n.pin(global_id)
     n.load_entity(global_id, load_dependencies=True)
     logging.info("Tried to load model containing {}".format(global_id))
-    for f in file_list:
+    complete: bool = True
+    # only the local models that can reference the global id are read, with their dependencies. A model reached through
+    # the dependencies of a local model ruled out is not searched
+    for f in n.filter_model_files(global_id, file_list):
+        if budget.is_spent():
+            complete = False
+            break
         n.load_file(f, True)
-    logging.info("Loaded {} local models".format(len(n.get_loaded_models())))
-    refs = n.find_references_to_global_id(global_id)
+    logging.info("Loaded {} models".format(len(n.get_loaded_models())))
+    logging.info("Model loading: {}".format(n.get_load_stats()))
+    return n, n.find_references_to_global_id(global_id, pin=True), complete
+
+
+def navigate(global_id: str, recursion_depth: int, file_list: list, options: dict = None, models: ModelCache = None):
+    """The tree of the functions a global id flows into from each function referencing it, as (global id, children)
+    branches. When the deadline or max_nodes options stop the search, a (TRUNCATED, []) branch follows the branches
+    found in a list that has more to search. Searches given the same models read the model files once between them"""
     ret: List[Tuple[str, List]] = []
-    for index, ref in enumerate(refs):
-        ref: FunctionModel
-        ret.append((ref.get_global_identifier(), _navigate(n, ref, global_id, recursion_depth)))
+    for _ in _search(global_id, recursion_depth, file_list, options, ret, models):
+        pass
     return ret
 
 
-def _navigate(n: Navigator, function: FunctionModel, global_id: str, recursion_depth: int) -> List[Tuple[str, List]]:
-    ret: List[Tuple[str, List]] = []
-    for usage in n.find_usages(function, global_id):
-        if recursion_depth > 1:
+def iter_navigate(global_id: str, recursion_depth: int, file_list: list, options: dict = None,
+                  locations: bool = False, models: ModelCache = None) -> Iterator[Tuple]:
+    """Generator variant of navigate, yields a (source, path, sink) finding for every leaf of the tree navigate
+    would build, where path runs from the referencing function to the sink inclusive. Shorter paths come first, and a
+    path the search was stopped on ends in TRUNCATED. No tree is built, only the paths still to search are kept. With
+    locations, each finding also has the locations of its calls from get_path_locations"""
+    for n, trail in _search(global_id, recursion_depth, file_list, options, models=models):
+        if locations:
+            yield global_id, trail, trail[-1], get_path_locations(n, global_id, trail)
+        else:
+            yield global_id, trail, trail[-1]
+
+
+def get_path_locations(n: Navigator, source: str, trail: List[str]) -> List[dict]:
+    """Where each call of a path is made, from the navigator that found it. The first location is where trail[0]
+    references the source, location i is where trail[i - 1] calls trail[i], and calls to TRUNCATED have none"""
+    calls: list = list(zip(trail[:1] + trail[:-1], [source] + trail[1:]))
+    return [n.find_reference_location(caller, callee) if TRUNCATED not in (caller, callee) else None
+            for caller, callee in calls]
+
+
+def _add_branch(branches: list, global_id: str) -> list:
+    """Appends a (global id, children) branch to a list of branches and returns its children, None without a tree"""
+    if branches is None:
+        return None
+    children: list = []
+    branches.append((global_id, children))
+    return children
+
+
+def _get_path(node: tuple) -> List[str]:
+    # a node is a global id and the node before it on the path, so the paths still to search share their prefixes
+    res: List[str] = []
+    while node is not None:
+        res.append(node[0])
+        node = node[1]
+    return res[::-1]
+
+
+def _search(global_id: str, recursion_depth: int, file_list: list, options: dict,
+            tree: List[Tuple[str, List]] = None, models: ModelCache = None) -> Iterator[Tuple[Navigator, List[str]]]:
+    """Builds the tree of navigate in tree breadth first, when one is given, and yields the path to each leaf once it
+    is one with the navigator of the search"""
+    budget: SearchBudget = SearchBudget(options)
+    n, refs, complete = _prepare_navigator(global_id, file_list, options, budget, models)
+    # the children of a branch, the function and variable it continues with, or None at a leaf, its depth left and its
+    # node
+    pending: deque = deque()
+    for ref in refs:
+        if not budget.take_node():
+            complete = False
+            break
+        node: tuple = (ref.get_global_identifier(), None)
+        pending.append((_add_branch(tree, node[0]), ref, global_id, recursion_depth, node))
+    if not complete:
+        _add_branch(tree, TRUNCATED)
+        yield n, [TRUNCATED]
+    while pending:
+        children, function, variable, depth, node = pending.popleft()
+        if function is None or depth <= 1:
+            yield n, _get_path(node)
+            continue
+        if budget.is_spent():
+            _add_branch(children, TRUNCATED)
+            yield n, _get_path((TRUNCATED, node))
+            continue
+        usages: List[Tuple[FunctionModel, str]] = n.find_usages(function, variable)
+        if not usages:
+            yield n, _get_path(node)
+        for usage in usages:
+            if not budget.take_node():
+                _add_branch(children, TRUNCATED)
+                yield n, _get_path((TRUNCATED, node))
+                break
             if issubclass(type(usage[0]), NamedModelGeneric):
                 usage: Tuple[FunctionModel, str]
-                ret.append(
-                    (
-                        usage[0].get_global_identifier(),
-                        _navigate(n, usage[0], usage[1], recursion_depth-1)
-                    )
-                )
+                child: tuple = (usage[0].get_global_identifier(), node)
+                pending.append((_add_branch(children, child[0]), usage[0], usage[1], depth - 1, child))
             else:
                 usage: Tuple[str, str]
-                ret.append(
-                    (
-                        usage[0],
-                        []
-                    )
-                )
-    return ret
-
+                child = (usage[0], node)
+                pending.append((_add_branch(children, child[0]), None, None, depth - 1, child))
@@ -0,0 +1,211 @@
+# Offline checks for the patterns of a language bundle. Looks for the shapes that make a backtracking regex engine
+# take exponential or high polynomial time, so a slow selector can be fixed before it stalls a translation
+from typing import List, Set, Union
+
+import toml
+
+from staticanalyser.regexbuilder import RegexBuilder
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+_ALL_CHARACTERS: str = "all"
+_CATEGORY_CHARACTERS: dict = {
+    sre_constants.CATEGORY_DIGIT: set("0123456789"),
+    sre_constants.CATEGORY_SPACE: set(" \t\n\r\f\v"),
+    sre_constants.CATEGORY_WORD: set("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_"),
+}
+_REPEATS: tuple = tuple(getattr(sre_constants, op) for op in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+                        if hasattr(sre_constants, op))
+
+
+class LintWarning(object):
+    source: str = None
+    format_string: str = None
+    kind: str = None
+    detail: str = None
+
+    def __init__(self, source: str, format_string: str, kind: str, detail: str):
+        self.source = source
+        self.format_string = format_string
+        self.kind = kind
+        self.detail = detail
+
+    def __str__(self):
+        return "{} ({}): {}: {}".format(self.source, self.format_string, self.kind, self.detail)
+
+
+def _first_characters(pattern) -> Union[Set[str], str]:
+    """Approximates the characters a (sub)pattern can start with"""
+    res: set = set()
+    for op, av in pattern:
+        if op is sre_constants.LITERAL:
+            return res | {chr(av)}
+        elif op in (sre_constants.ANY, sre_constants.NOT_LITERAL):
+            return _ALL_CHARACTERS
+        elif op is sre_constants.IN:
+            for in_op, in_av in av:
+                if in_op is sre_constants.NEGATE:
+                    return _ALL_CHARACTERS
+                elif in_op is sre_constants.LITERAL:
+                    res.add(chr(in_av))
+                elif in_op is sre_constants.RANGE:
+                    if in_av[1] - in_av[0] > 256:
+                        return _ALL_CHARACTERS
+                    res |= {chr(c) for c in range(in_av[0], in_av[1] + 1)}
+                elif in_op is sre_constants.CATEGORY and in_av in _CATEGORY_CHARACTERS:
+                    res |= _CATEGORY_CHARACTERS[in_av]
+                else:
+                    return _ALL_CHARACTERS
+            return res
+        elif op is sre_constants.SUBPATTERN:
+            sub = _first_characters(av[-1])
+            if sub is _ALL_CHARACTERS:
+                return sub
+            res |= sub
+            if not _can_be_empty(av[-1]):
+                return res
+        elif op is sre_constants.BRANCH:
+            for branch in av[1]:
+                sub = _first_characters(branch)
+                if sub is _ALL_CHARACTERS:
+                    return sub
+                res |= sub
+            return res
+        elif op in _REPEATS:
+            sub = _first_characters(av[2])
+            if sub is _ALL_CHARACTERS:
+                return sub
+            res |= sub
+            if av[0] > 0:
+                return res
+        elif op in (sre_constants.AT, sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            continue
+        else:
+            return _ALL_CHARACTERS
+    return res
+
+
+def _overlap(a: Union[Set[str], str], b: Union[Set[str], str]) -> bool:
+    if a is _ALL_CHARACTERS:
+        return b is _ALL_CHARACTERS or len(b) > 0
+    if b is _ALL_CHARACTERS:
+        return len(a) > 0
+    return len(a & b) > 0
+
+
+def _can_be_empty(pattern) -> bool:
+    low, _ = pattern.getwidth()
+    return low == 0
+
+
+def _is_unbounded(av: tuple) -> bool:
+    return av[1] == sre_constants.MAXREPEAT
+
+
+def _contains(pattern, predicate) -> bool:
+    for op, av in pattern:
+        if predicate(op, av):
+            return True
+        for sub in _children(op, av):
+            if _contains(sub, predicate):
+                return True
+    return False
+
+
+def _children(op, av) -> list:
+    if op in _REPEATS:
+        return [av[2]]
+    elif op is sre_constants.SUBPATTERN:
+        return [av[-1]]
+    elif op is sre_constants.BRANCH:
+        return list(av[1])
+    elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+        return [av[1]]
+    elif op is getattr(sre_constants, "ATOMIC_GROUP", None):
+        return [av]
+    elif op is sre_constants.GROUPREF_EXISTS:
+        return [p for p in av[1:] if p is not None]
+    return []
+
+
+def _check(pattern, in_repeat: bool, res: List[tuple]):
+    previous: tuple = None
+    for op, av in pattern:
+        if op in _REPEATS and _is_unbounded(av):
+            body = av[2]
+            if not in_repeat and _contains(body, lambda o, a: o in _REPEATS and _is_unbounded(a)):
+                res.append(("nested quantifier", "an unbounded repeat contains an unbounded repeat"))
+            if _can_be_empty(body):
+                res.append(("empty repeat", "an unbounded repeat of a pattern that can match the empty string"))
+            if _contains(body, lambda o, a: o is sre_constants.GROUPREF):
+                res.append(("backreference in repeat", "an unbounded repeat contains a backreference"))
+            if _contains(body, lambda o, a: o is sre_constants.BRANCH and _overlapping_branches(a[1])):
+                res.append(("overlapping alternation", "alternatives inside a repeat can start with the same "
+                                                       "character"))
+            if previous is not None and _overlap(_first_characters(previous[2]), _first_characters(body)):
+                res.append(("adjacent quantifiers", "two consecutive unbounded repeats can match the same "
+                                                    "characters"))
+            previous = av
+            _check(body, True, res)
+            continue
+        if not (op is sre_constants.AT or (op in _REPEATS and not _is_unbounded(av))):
+            previous = None
+        for sub in _children(op, av):
+            _check(sub, in_repeat or op in _REPEATS, res)
+
+
+def _overlapping_branches(branches: list) -> bool:
+    firsts: list = [_first_characters(b) for b in branches]
+    for i in range(len(firsts)):
+        for j in range(i + 1, len(firsts)):
+            if _overlap(firsts[i], firsts[j]):
+                return True
+    return False
+
+
+def lint_pattern(regex: str) -> List[tuple]:
+    """Returns (kind, detail) for every risky construct in a regex, each kind reported once"""
+    try:
+        pattern = sre_parse.parse(regex)
+    except sre_constants.error as e:
+        return [("invalid", str(e))]
+    res: list = []
+    _check(pattern, False, res)
+    return list(dict.fromkeys(res))
+
+
+def _get_builder(language_config: dict) -> RegexBuilder:
+    r: RegexBuilder = RegexBuilder()
+    snippets: dict = language_config.get("snippets") or {}
+    format_strings: dict = language_config.get("format_strings") or {}
+    for s in snippets.keys():
+        r.register_snippet(s, snippets[s]["regex"])
+    for f in format_strings.keys():
+        r.register_format_string(f, format_strings[f]["regex"], format_strings[f].get("dependencies") or [])
+    return r
+
+
+def lint_language(language_file: str) -> List[LintWarning]:
+    """Lints the regex of every directive and selector variation in a language bundle"""
+    with open(language_file, "r") as f:
+        language_config: dict = toml.loads(f.read())
+    r: RegexBuilder = _get_builder(language_config)
+    res: list = []
+    for group in ("directives", "selectors"):
+        entries: dict = language_config.get(group) or {}
+        for name in entries.keys():
+            for v in entries[name].get("variations") or []:
+                format_string: str = v.get("regex_format_string")
+                try:
+                    regex: str = r.build(format_string)
+                except KeyError:
+                    res.append(LintWarning("{}.{}".format(group, name), format_string, "invalid",
+                                           "unknown format string"))
+                    continue
+                for kind, detail in lint_pattern(regex):
+                    res.append(LintWarning("{}.{}".format(group, name), format_string, kind, detail))
+    return res
@@ -0,0 +1,69 @@
+# Literal substrings a regex cannot match without. Checking them with str.find is much cheaper than running the regex
+# engine over a text that cannot contain a match, which is most texts for the loop, condition and reference selectors
+from typing import List
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:
+    import sre_parse
+    import sre_constants
+
+_REPEATS: tuple = tuple(getattr(sre_constants, op) for op in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT")
+                        if hasattr(sre_constants, op))
+_ATOMIC_GROUP = getattr(sre_constants, "ATOMIC_GROUP", None)
+_IGNORECASE: int = sre_constants.SRE_FLAG_IGNORECASE
+
+
+def _requirements(pattern) -> List[frozenset]:
+    """Clauses a match of a (sub)pattern needs, each a set of literals at least one of which is in the match"""
+    res: list = []
+    run: list = []
+    for op, av in pattern:
+        if op is sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        if run:
+            res.append(frozenset(["".join(run)]))
+            run = []
+        if op is sre_constants.SUBPATTERN:
+            if not av[1] & _IGNORECASE:
+                res += _requirements(av[-1])
+        elif op in _REPEATS:
+            if av[0] > 0:
+                res += _requirements(av[2])
+        elif op is _ATOMIC_GROUP:
+            res += _requirements(av)
+        elif op is sre_constants.BRANCH:
+            alternatives: set = set()
+            for branch in av[1]:
+                clauses: list = _requirements(branch)
+                if not clauses:
+                    break
+                # the clause with the longest literals is the least likely to be in a text by chance
+                alternatives |= max(clauses, key=lambda c: min(len(s) for s in c))
+            else:
+                res.append(frozenset(alternatives))
+    if run:
+        res.append(frozenset(["".join(run)]))
+    return res
+
+
+def required_literals(regex: str, flags: int = 0) -> List[frozenset]:
+    """Returns the clauses a text needs to contain a match of regex: for every clause the text contains at least one
+    of its literals. Returns no clauses for a regex that is invalid or ignores case"""
+    try:
+        pattern = sre_parse.parse(regex, flags)
+    except sre_constants.error:
+        return []
+    if pattern.state.flags & _IGNORECASE:
+        return []
+    return list(dict.fromkeys(c for c in _requirements(pattern) if "" not in c))
+
+
+def may_match(clauses: List[frozenset], text: str, start: int = 0, end: int = None) -> bool:
+    """False when text[start:end] is missing every literal of one of the clauses, so cannot contain a match"""
+    end = len(text) if end is None else end
+    for clause in clauses:
+        if all(text.find(literal, start, end) == -1 for literal in clause):
+            return False
+    return True
@@ -0,0 +1,128 @@
+# Bloom filters of the global ids a model defines and references, written next to every model when it is translated.
+# A query reads a few hundred bytes per model to rule out the models that cannot mention a global id, instead of
+# loading every model to find the few that do
+import math
+import struct
+from hashlib import blake2b
+from os import path, replace, remove, stat, getpid
+import threading
+import logging
+
+FILTER_MAGIC: bytes = b"SABLOOM1"
+FILTER_EXTENSION: str = "bloom"
+# magic, size and mtime of the model the filter was built from, hash count, bit count
+_HEADER: struct.Struct = struct.Struct("=8sQQII")
+_HASH: struct.Struct = struct.Struct("=QQ")
+_FALSE_POSITIVE_RATE: float = 0.01
+_MIN_BITS: int = 64
+
+
+class BloomFilter(object):
+    """A set of strings that can answer a membership test with a false positive, but never with a false negative"""
+    _bits: bytearray = None
+    _bit_count: int = None
+    _hash_count: int = None
+
+    @staticmethod
+    def for_items(items: set, false_positive_rate: float = _FALSE_POSITIVE_RATE):
+        n: int = max(len(items), 1)
+        bit_count: int = max(_MIN_BITS, int(math.ceil(-n * math.log(false_positive_rate) / math.log(2) ** 2)))
+        res: BloomFilter = BloomFilter(bit_count, max(1, int(round(bit_count / n * math.log(2)))))
+        for item in items:
+            res.add(item)
+        return res
+
+    def __init__(self, bit_count: int, hash_count: int, bits: bytes = None):
+        self._bit_count = bit_count
+        self._hash_count = hash_count
+        self._bits = bytearray(bits) if bits is not None else bytearray((bit_count + 7) // 8)
+
+    def _positions(self, item: str):
+        # the hashes must be the same in every process, so the salted builtin hash is not used
+        h1, h2 = _HASH.unpack(blake2b(item.encode("utf-8"), digest_size=16).digest())
+        for i in range(self._hash_count):
+            yield (h1 + i * h2) % self._bit_count
+
+    def add(self, item: str):
+        for p in self._positions(item):
+            self._bits[p >> 3] |= 1 << (p & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+    def get_bit_count(self) -> int:
+        return self._bit_count
+
+    def get_hash_count(self) -> int:
+        return self._hash_count
+
+    def to_bytes(self) -> bytes:
+        return bytes(self._bits)
+
+
+def get_model_ids(data) -> set:
+    """The global ids a model defines and references, and its model id"""
+    res: set = set()
+    pending: list = [data]
+    while pending:
+        data = pending.pop()
+        if type(data) is dict:
+            for k in ("global_id", "model_id"):
+                if type(data.get(k)) is str:
+                    res.add(data.get(k))
+            if data.get("model_type") == "reference" and type(data.get("ref")) is str:
+                res.add(data.get("ref"))
+            pending += [v for v in data.values() if type(v) in (dict, list)]
+        elif type(data) is list:
+            pending += [v for v in data if type(v) in (dict, list)]
+    return res
+
+
+class ModelFilter(object):
+    """The sidecar filter of a model file. A filter is only used while the model is the one it was built from"""
+
+    @staticmethod
+    def get_filter_path(model_file: str) -> str:
+        return "{}.{}".format(path.splitext(str(model_file))[0], FILTER_EXTENSION)
+
+    @staticmethod
+    def write(model_file: str, model_data: dict):
+        bloom: BloomFilter = BloomFilter.for_items(get_model_ids(model_data))
+        model_stat = stat(str(model_file))
+        filter_path: str = ModelFilter.get_filter_path(model_file)
+        tmp_path: str = "{}.{}.{}.tmp".format(filter_path, getpid(), threading.get_ident())
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(_HEADER.pack(FILTER_MAGIC, model_stat.st_size, model_stat.st_mtime_ns,
+                                     bloom.get_hash_count(), bloom.get_bit_count()))
+                f.write(bloom.to_bytes())
+            replace(tmp_path, filter_path)
+        finally:
+            if path.exists(tmp_path):
+                remove(tmp_path)
+
+    @staticmethod
+    def read(model_file: str) -> BloomFilter:
+        """The filter of a model, None when it is missing, unreadable or older than the model"""
+        try:
+            model_stat = stat(str(model_file))
+            with open(ModelFilter.get_filter_path(model_file), "rb") as f:
+                header: bytes = f.read(_HEADER.size)
+                bits: bytes = f.read()
+        except OSError:
+            return None
+        if len(header) < _HEADER.size:
+            return None
+        magic, size, mtime_ns, hash_count, bit_count = _HEADER.unpack(header)
+        if magic != FILTER_MAGIC or len(bits) != (bit_count + 7) // 8 or hash_count < 1:
+            return None
+        if (size, mtime_ns) != (model_stat.st_size, model_stat.st_mtime_ns):
+            logging.debug("Ignoring the filter of {}, the model changed since it was built".format(model_file))
+            return None
+        return BloomFilter(bit_count, hash_count, bits)
+
+    @staticmethod
+    def might_contain(model_file: str, global_id: str) -> bool:
+        """False only when the model certainly neither defines nor references a global id"""
+        bloom: BloomFilter = ModelFilter.read(model_file)
+        return bloom is None or global_id in bloom
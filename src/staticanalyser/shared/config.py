@@ -9,6 +9,8 @@ _CONFIG_ITEMS = {
     "filetypes": {},
     "source_dirs": {},
     "builtins": {},
+    "package_modules": {},
+    "frontends": {},
     "sink_funcs": {},
     "danger_funcs": {}
 }
@@ -28,6 +30,8 @@ for file in langs_dir.iterdir():
                     _CONFIG_ITEMS.get("filetypes").get(extension).append(lang_info.get("name"))
             _CONFIG_ITEMS.get("source_dirs")[lang_info.get("name")] = lang_info.get("global_sources")
             _CONFIG_ITEMS.get("builtins")[lang_info.get("name")] = lang_info.get("builtins")
+            _CONFIG_ITEMS.get("package_modules")[lang_info.get("name")] = lang_info.get("package_module")
+            _CONFIG_ITEMS.get("frontends")[lang_info.get("name")] = lang_info.get("frontend")
             _CONFIG_ITEMS.get("sink_funcs")[lang_info.get("name")] = lang_info.get("sink_functions")
             _CONFIG_ITEMS.get("danger_funcs")[lang_info.get("name")] = lang_info.get("danger_functions")
 
@@ -86,6 +90,22 @@ def get_language_builtins(lang: str) -> dict:
     return get_builtins().get(lang) or {}
 
 
+def get_package_modules() -> dict:
+    return _get_config_item()
+
+
+def get_language_package_module(lang: str) -> str:
+    return get_package_modules().get(lang)
+
+
+def get_frontends() -> dict:
+    return _get_config_item()
+
+
+def get_language_frontend(lang: str) -> str:
+    return get_frontends().get(lang)
+
+
 def get_danger_funcs() -> dict:
     return _get_config_item()
 
@@ -0,0 +1,274 @@
+# A SQLite database of the entities, references and parameters in a translated model tree. Unlike the model store it
+# is updated in place, so translation workers add the models they write as they go, and queries run as indexed SQL
+# without reading the models
+import sqlite3
+from os import path, stat
+from typing import List, Tuple
+import logging
+
+from staticanalyser.shared.model import ModelOperations
+from staticanalyser.shared.store import NodeKind
+
+_SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS models (
+    id INTEGER PRIMARY KEY,
+    model_id TEXT NOT NULL UNIQUE,
+    model_file TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entities (
+    id INTEGER PRIMARY KEY,
+    global_id TEXT NOT NULL,
+    name TEXT,
+    kind INTEGER NOT NULL,
+    model INTEGER NOT NULL,
+    parent INTEGER
+);
+CREATE TABLE IF NOT EXISTS refs (
+    entity INTEGER NOT NULL,
+    ref TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    entity INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT,
+    type TEXT,
+    default_value TEXT
+);
+CREATE INDEX IF NOT EXISTS entities_global_id ON entities (global_id);
+CREATE INDEX IF NOT EXISTS entities_model ON entities (model);
+CREATE INDEX IF NOT EXISTS refs_ref ON refs (ref);
+CREATE INDEX IF NOT EXISTS refs_entity ON refs (entity);
+CREATE INDEX IF NOT EXISTS parameters_entity ON parameters (entity);
+"""
+# seconds a writer waits for the writers in other processes
+_BUSY_TIMEOUT: float = 60.0
+_KIND_NAMES: dict = {NodeKind.FUNCTION: "function", NodeKind.CLASS: "class"}
+
+
+class ModelDatabase(object):
+    """Answers the queries of the model store from a SQLite database, and also the entity, parameter and module
+    lookups the store has no index for. Models are added in transactions, a model added again replaces its rows"""
+    _path: str = None
+    _dir: str = None
+    _connection: sqlite3.Connection = None
+    _writing: bool = False
+
+    @staticmethod
+    def write(database_path: str, model_files: list) -> None:
+        database: ModelDatabase = ModelDatabase(database_path)
+        try:
+            database.add_model_files(model_files)
+            database.prune()
+        finally:
+            database.close()
+        logging.info("Written model database {} for {} models".format(database_path, len(model_files)))
+
+    def __init__(self, database_path: str):
+        self._path = path.abspath(database_path)
+        self._dir = path.dirname(self._path)
+        self._connection = sqlite3.connect(self._path, timeout=_BUSY_TIMEOUT)
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        # a database that is only queried is not written to, so it can be read from a read-only dir
+        if not self._connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'models'"
+                                        ).fetchone():
+            self._begin_writing()
+            with self._connection:
+                self._connection.executescript(_SCHEMA)
+
+    def _begin_writing(self):
+        # readers carry on while a worker commits a batch, the journal mode is kept in the file once it is set
+        if not self._writing:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._writing = True
+
+    def __reduce__(self):
+        return ModelDatabase, (self._path,)
+
+    def close(self):
+        self._connection.close()
+
+    def get_path(self) -> str:
+        return self._path
+
+    def add_model_files(self, model_files: list) -> int:
+        """Adds the models that changed since they were last added in one transaction, returns how many were added"""
+        added: int = 0
+        self._begin_writing()
+        with self._connection:
+            for model_file in model_files:
+                try:
+                    if self._add_model_file(path.abspath(str(model_file))):
+                        added += 1
+                except (OSError, ValueError):
+                    logging.warning("Could not read {} for the model database".format(model_file))
+        return added
+
+    def _add_model_file(self, model_file: str) -> bool:
+        file_stat = stat(model_file)
+        relative_file: str = path.relpath(model_file, self._dir)
+        row: tuple = self._connection.execute("SELECT size, mtime_ns FROM models WHERE model_file = ?",
+                                              (relative_file,)).fetchone()
+        if row == (file_stat.st_size, file_stat.st_mtime_ns):
+            return False
+        model_data: dict = ModelOperations.read_model_file(model_file)
+        self._remove_model("model_id = ? OR model_file = ?", (model_data.get("model_id"), relative_file))
+        model: int = self._connection.execute(
+            "INSERT INTO models (model_id, model_file, size, mtime_ns) VALUES (?, ?, ?, ?)",
+            (model_data.get("model_id"), relative_file, file_stat.st_size, file_stat.st_mtime_ns)).lastrowid
+        for group in ("classes", "functions"):
+            self._add_entity(model_data.get(group) or [], model, None)
+        return True
+
+    def _add_entity(self, data, model: int, parent: int):
+        if type(data) is list:
+            for e in data:
+                self._add_entity(e, model, parent)
+        elif type(data) is dict:
+            kind: int = NodeKind.from_model_type(data.get("model_type"))
+            if kind and data.get("global_id"):
+                parent = self._connection.execute(
+                    "INSERT INTO entities (global_id, name, kind, model, parent) VALUES (?, ?, ?, ?, ?)",
+                    (data.get("global_id"), data.get("name"), kind, model, parent)).lastrowid
+                self._connection.executemany(
+                    "INSERT INTO parameters (entity, position, name, type, default_value) VALUES (?, ?, ?, ?, ?)",
+                    [(parent, i, p.get("name"), p.get("type"), p.get("default_value")) for i, p in
+                     enumerate(data.get("parameters") or [])])
+            elif data.get("model_type") == "reference" and type(data.get("ref")) is str and parent is not None:
+                self._connection.execute("INSERT INTO refs (entity, ref) VALUES (?, ?)", (parent, data.get("ref")))
+            for v in data.values():
+                if type(v) in (dict, list):
+                    self._add_entity(v, model, parent)
+
+    def _remove_model(self, condition: str, parameters: tuple):
+        models: str = "SELECT id FROM models WHERE {}".format(condition)
+        entities: str = "SELECT id FROM entities WHERE model IN ({})".format(models)
+        self._connection.execute("DELETE FROM refs WHERE entity IN ({})".format(entities), parameters)
+        self._connection.execute("DELETE FROM parameters WHERE entity IN ({})".format(entities), parameters)
+        self._connection.execute("DELETE FROM entities WHERE model IN ({})".format(models), parameters)
+        self._connection.execute("DELETE FROM models WHERE {}".format(condition), parameters)
+
+    def merge(self, database_path: str) -> int:
+        """Copies the models of another database of the same model tree layout that this one does not have, with
+        their entities, references and parameters, and returns how many were copied. Models are matched by model id
+        and model file, a model both have is kept as it is here"""
+        self._begin_writing()
+        self._connection.execute("ATTACH DATABASE ? AS other", (path.abspath(database_path),))
+        try:
+            with self._connection:
+                model_offset: int = self._connection.execute("SELECT IFNULL(MAX(id), 0) FROM models").fetchone()[0]
+                entity_offset: int = self._connection.execute(
+                    "SELECT IFNULL(MAX(id), 0) FROM entities").fetchone()[0]
+                copied: int = self._connection.execute(
+                    "INSERT INTO main.models (id, model_id, model_file, size, mtime_ns) "
+                    "SELECT id + ?, model_id, model_file, size, mtime_ns FROM other.models "
+                    "WHERE model_id NOT IN (SELECT model_id FROM main.models) "
+                    "AND model_file NOT IN (SELECT model_file FROM main.models)", (model_offset,)).rowcount
+                # rows are renumbered past the ids already here, only the rows of the copied models are taken
+                self._connection.execute(
+                    "INSERT INTO main.entities (id, global_id, name, kind, model, parent) "
+                    "SELECT id + ?, global_id, name, kind, model + ?, parent + ? FROM other.entities "
+                    "WHERE model + ? IN (SELECT id FROM main.models WHERE id > ?)",
+                    (entity_offset, model_offset, entity_offset, model_offset, model_offset))
+                for table, columns in (("refs", "ref"), ("parameters", "position, name, type, default_value")):
+                    self._connection.execute(
+                        "INSERT INTO main.{0} (entity, {1}) SELECT entity + ?, {1} FROM other.{0} "
+                        "WHERE entity + ? IN (SELECT id FROM main.entities WHERE id > ?) ORDER BY rowid".format(
+                            table, columns), (entity_offset, entity_offset, entity_offset))
+        finally:
+            self._connection.execute("DETACH DATABASE other")
+        return copied
+
+    def prune(self) -> int:
+        """Removes the models whose files are gone, returns how many were removed"""
+        gone: list = [(model_file,) for model_file, in self._connection.execute("SELECT model_file FROM models") if
+                      not path.isfile(path.join(self._dir, model_file))]
+        self._begin_writing()
+        with self._connection:
+            for parameters in gone:
+                self._remove_model("model_file = ?", parameters)
+        return len(gone)
+
+    def is_current(self, model_file: str) -> bool:
+        """Whether a model file is as it was when it was last added, the models written since are not in it"""
+        try:
+            file_stat = stat(model_file)
+        except OSError:
+            return False
+        row: tuple = self._connection.execute("SELECT size, mtime_ns FROM models WHERE model_file = ?",
+                                              (path.relpath(path.abspath(str(model_file)), self._dir),)).fetchone()
+        return row == (file_stat.st_size, file_stat.st_mtime_ns)
+
+    def has_model(self, model_id: str) -> bool:
+        return self._connection.execute("SELECT 1 FROM models WHERE model_id = ?", (model_id,)).fetchone() is not None
+
+    def get_model(self, global_id: str) -> Tuple[str, str]:
+        """Returns the model id and model file that defines a global id, or the model the global id names"""
+        parts: List[str] = global_id.split(".")
+        for end in range(len(parts), 0, -1):
+            prefix: str = ".".join(parts[:end])
+            row: tuple = self._connection.execute(
+                "SELECT m.model_id, m.model_file FROM entities e JOIN models m ON m.id = e.model "
+                "WHERE e.global_id = ? ORDER BY e.id LIMIT 1", (prefix,)).fetchone() or \
+                self._connection.execute("SELECT model_id, model_file FROM models WHERE model_id = ?",
+                                         (prefix,)).fetchone()
+            if row:
+                return row[0], path.join(self._dir, row[1])
+        return None, None
+
+    def get_entity(self, global_id: str) -> dict:
+        """The kind, model and enclosing entity of a global id, None when no model defines it"""
+        row: tuple = self._connection.execute(
+            "SELECT e.global_id, e.name, e.kind, m.model_id, m.model_file, p.global_id FROM entities e "
+            "JOIN models m ON m.id = e.model LEFT JOIN entities p ON p.id = e.parent "
+            "WHERE e.global_id = ? ORDER BY e.id LIMIT 1", (global_id,)).fetchone()
+        if not row:
+            return None
+        return {
+            "global_id": row[0],
+            "name": row[1],
+            "kind": _KIND_NAMES.get(row[2]),
+            "model_id": row[3],
+            "model_file": path.join(self._dir, row[4]),
+            "parent": row[5]
+        }
+
+    def get_parameters(self, global_id: str) -> List[Tuple[str, str, str]]:
+        """The name, type and default value of each parameter of a function, in order"""
+        return self._connection.execute(
+            "SELECT name, type, default_value FROM parameters WHERE entity = "
+            "(SELECT id FROM entities WHERE global_id = ? ORDER BY id LIMIT 1) ORDER BY position",
+            (global_id,)).fetchall()
+
+    def get_module_functions(self, model_id: str) -> List[str]:
+        """The functions defined in a model, including methods and nested functions, in the order they are defined"""
+        return [r[0] for r in self._connection.execute(
+            "SELECT e.global_id FROM entities e JOIN models m ON m.id = e.model WHERE m.model_id = ? AND e.kind = ? "
+            "ORDER BY e.id", (model_id, NodeKind.FUNCTION))]
+
+    def get_references(self, global_id: str) -> List[str]:
+        """The global ids directly referenced from the body of an entity"""
+        return [r[0] for r in self._connection.execute(
+            "SELECT ref FROM refs WHERE entity = (SELECT id FROM entities WHERE global_id = ? ORDER BY id LIMIT 1) "
+            "ORDER BY rowid", (global_id,))]
+
+    def _referencing(self, global_id: str, columns: str) -> list:
+        # entities enclosing a reference reference it too, matching Navigator._find_all_references
+        return self._connection.execute(
+            "WITH RECURSIVE referencing (id) AS (SELECT entity FROM refs WHERE ref = ? "
+            "UNION SELECT e.parent FROM entities e JOIN referencing r ON e.id = r.id WHERE e.parent IS NOT NULL) "
+            "SELECT {} FROM entities e JOIN referencing r ON e.id = r.id JOIN models m ON m.id = e.model "
+            "ORDER BY e.id".format(columns), (global_id,)).fetchall()
+
+    def get_referencing_entities(self, global_id: str) -> List[str]:
+        return [r[0] for r in self._referencing(global_id, "e.global_id")]
+
+    def get_referencing_functions(self, global_id: str) -> List[str]:
+        return [r[0] for r in self._referencing(global_id, "e.global_id, e.kind") if r[1] == NodeKind.FUNCTION]
+
+    def get_referencing_model_ids(self, global_id: str) -> List[str]:
+        return list(dict.fromkeys(r[0] for r in self._referencing(global_id, "m.model_id")))
+
+    def get_referencing_model_files(self, global_id: str) -> List[str]:
+        return list(dict.fromkeys(path.join(self._dir, r[0]) for r in self._referencing(global_id, "m.model_file")))
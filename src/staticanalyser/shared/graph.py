@@ -0,0 +1,297 @@
+# A call graph over every global id in a translated model tree, stored as compressed sparse rows in one memory-mapped
+# file. Entities point at the global ids referenced anywhere in their bodies, so reachability questions become walks
+# over flat arrays instead of over model objects. Reachability within a fixed number of calls can be precomputed, which
+# answers queries for exactly that number of calls with a lookup
+import json
+import mmap
+import struct
+from array import array
+from os import path, replace, getpid, stat, fstat
+from typing import List, Iterator, Callable, Tuple, TextIO
+from xml.sax.saxutils import escape
+import logging
+
+from staticanalyser.shared.model import ModelOperations
+from staticanalyser.shared.store import compress_rows
+
+GRAPH_MAGIC: bytes = b"SAGRAPH1"
+# magic, version, node count, edge count, reach depth, reach count, then the offsets of the sections
+_HEADER: struct.Struct = struct.Struct("=8sIIIII10Q")
+_GRAPH_VERSION: int = 1
+_ENTITY_TYPES: tuple = ("function", "class")
+
+
+def _file_record(model_file: str) -> list:
+    file_stat = stat(model_file)
+    return [path.abspath(model_file), file_stat.st_size, file_stat.st_mtime_ns]
+
+
+class _GraphBuilder(object):
+    _edges: dict = None
+    _files: list = None
+
+    def __init__(self):
+        self._edges = {}
+        self._files = []
+
+    def add_model(self, model_file: str, model_data: dict):
+        self._files.append(_file_record(model_file))
+        for group in ("classes", "functions"):
+            self._add_entity(model_data.get(group) or [], [])
+
+    def _add_entity(self, data, enclosing: list):
+        if type(data) is list:
+            for e in data:
+                self._add_entity(e, enclosing)
+        elif type(data) is dict:
+            if data.get("model_type") in _ENTITY_TYPES and data.get("global_id"):
+                self._edges.setdefault(data.get("global_id"), {})
+                enclosing = enclosing + [data.get("global_id")]
+            elif data.get("model_type") == "reference" and type(data.get("ref")) is str:
+                # a reference is in the body of every entity enclosing it, as Navigator._find_all_references sees it
+                for entity in enclosing:
+                    self._edges[entity][data.get("ref")] = None
+            for v in data.values():
+                if type(v) in (dict, list):
+                    self._add_entity(v, enclosing)
+
+    def get_unresolved(self) -> List[str]:
+        """Referenced global ids that are not entities of any model added so far"""
+        return sorted({t for targets in self._edges.values() for t in targets if t not in self._edges})
+
+    def write(self, graph_path: str, reach_depth: int):
+        names: list = sorted(set(self._edges.keys()) | set(self.get_unresolved()), key=lambda s: s.encode("utf-8"))
+        index: dict = {s: i for i, s in enumerate(names)}
+        string_offsets: array = array("Q", [0])
+        string_data: bytearray = bytearray()
+        for s in names:
+            string_data += s.encode("utf-8")
+            string_offsets.append(len(string_data))
+        entities: bytes = bytes(1 if s in self._edges else 0 for s in names)
+        pairs: list = [(index[s], index[t]) for s in sorted(self._edges.keys()) for t in self._edges[s].keys()]
+        forward_offsets, forward_targets = compress_rows(pairs, len(names))
+        reverse_offsets, reverse_targets = compress_rows([(t, s) for s, t in pairs], len(names))
+        reach_pairs: list = []
+        if reach_depth > 0:
+            for node in range(len(names)):
+                reach_pairs += [(node, r) for r in sorted(_walk(forward_offsets, forward_targets, [node],
+                                                                reach_depth)) if r != node]
+        reach_offsets, reach_targets = compress_rows(reach_pairs, len(names) if reach_depth > 0 else 0)
+        files: bytes = json.dumps(self._files).encode("utf-8")
+
+        sections: list = [string_offsets, bytes(string_data), entities, forward_offsets, forward_targets,
+                          reverse_offsets, reverse_targets, reach_offsets, reach_targets, files]
+        offsets: list = []
+        body: bytearray = bytearray()
+        for section in sections:
+            body += b"\0" * (-(_HEADER.size + len(body)) % 8)
+            offsets.append(_HEADER.size + len(body))
+            body += section.tobytes() if type(section) is array else section
+        # the end of the file list is the end of the file, so only the sizes of the other sections are implied
+        header: bytes = _HEADER.pack(GRAPH_MAGIC, _GRAPH_VERSION, len(names), len(pairs), reach_depth,
+                                     len(reach_pairs), *offsets)
+        tmp_path: str = "{}.{}.tmp".format(graph_path, getpid())
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.write(body)
+        replace(tmp_path, graph_path)
+
+
+def _walk(offsets, targets, sources: List[int], depth: int) -> set:
+    """Nodes reachable from sources in at most depth steps, or any number of steps if depth is not positive"""
+    seen: set = set(sources)
+    frontier: list = list(seen)
+    steps: int = 0
+    while frontier and (depth <= 0 or steps < depth):
+        steps += 1
+        following: list = []
+        for node in frontier:
+            for e in range(offsets[node], offsets[node + 1]):
+                if targets[e] not in seen:
+                    seen.add(targets[e])
+                    following.append(targets[e])
+        frontier = following
+    return seen
+
+
+class CallGraph(object):
+    _path: str = None
+    _file = None
+    _buffer: mmap.mmap = None
+    _views: list = None
+    _reach_depth: int = None
+
+    @staticmethod
+    def write(graph_path: str, model_files: list, reach_depth: int = 0,
+              resolve: Callable[[str], str] = ModelOperations.get_model_file) -> None:
+        """Builds the graph of the model files and of every model they reference, directly or not, that resolve finds,
+        by default in the local or global model directories, which are the models the navigator would load"""
+        builder: _GraphBuilder = _GraphBuilder()
+        pending: list = [path.abspath(str(f)) for f in model_files]
+        added: set = set()
+        while pending:
+            for model_file in pending:
+                added.add(model_file)
+                try:
+                    builder.add_model(model_file, ModelOperations.read_model_file(model_file))
+                except (OSError, ValueError):
+                    logging.warning("Could not read {} for the call graph".format(model_file))
+            pending = []
+            for global_id in builder.get_unresolved():
+                model_file: str = resolve(global_id)
+                if model_file and path.abspath(model_file) not in added and path.abspath(model_file) not in pending:
+                    pending.append(path.abspath(model_file))
+        builder.write(graph_path, reach_depth)
+        logging.info("Written call graph {} for {} models".format(graph_path, len(added)))
+
+    def __init__(self, graph_path: str):
+        self._path = path.abspath(graph_path)
+        self._file = open(self._path, "rb")
+        self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        header: tuple = _HEADER.unpack_from(self._buffer, 0)
+        if header[0] != GRAPH_MAGIC or header[1] != _GRAPH_VERSION:
+            self.close()
+            raise ValueError("{} is not a call graph".format(graph_path))
+        node_count, edge_count, self._reach_depth, reach_count = header[2:6]
+        offsets: tuple = header[6:]
+        view: memoryview = memoryview(self._buffer)
+        reach_rows: int = node_count + 1 if self._reach_depth > 0 else 1
+        self._string_offsets = view[offsets[0]:offsets[0] + 8 * (node_count + 1)].cast("Q")
+        self._string_data = view[offsets[1]:offsets[1] + self._string_offsets[node_count]]
+        self._entities = view[offsets[2]:offsets[2] + node_count]
+        self._forward_offsets = view[offsets[3]:offsets[3] + 8 * (node_count + 1)].cast("Q")
+        self._forward_targets = view[offsets[4]:offsets[4] + 4 * edge_count].cast("I")
+        self._reverse_offsets = view[offsets[5]:offsets[5] + 8 * (node_count + 1)].cast("Q")
+        self._reverse_targets = view[offsets[6]:offsets[6] + 4 * edge_count].cast("I")
+        self._reach_offsets = view[offsets[7]:offsets[7] + 8 * reach_rows].cast("Q")
+        self._reach_targets = view[offsets[8]:offsets[8] + 4 * reach_count].cast("I")
+        self._files = json.loads(str(view[offsets[9]:], "utf-8"))
+        self._views = [view, self._string_offsets, self._string_data, self._entities, self._forward_offsets,
+                       self._forward_targets, self._reverse_offsets, self._reverse_targets, self._reach_offsets,
+                       self._reach_targets]
+
+    def __reduce__(self):
+        return CallGraph, (self._path,)
+
+    def close(self):
+        for view in self._views or []:
+            view.release()
+        self._views = None
+        if self._buffer:
+            self._buffer.close()
+        self._file.close()
+
+    def __len__(self):
+        return len(self._entities)
+
+    def get_name(self, node: int) -> str:
+        return str(self._string_data[self._string_offsets[node]:self._string_offsets[node + 1]], "utf-8")
+
+    def get_node(self, global_id: str) -> int:
+        target: bytes = global_id.encode("utf-8")
+        low, high = 0, len(self)
+        while low < high:
+            mid: int = (low + high) // 2
+            if self._string_data[self._string_offsets[mid]:self._string_offsets[mid + 1]].tobytes() < target:
+                low = mid + 1
+            else:
+                high = mid
+        return low if low < len(self) and self.get_name(low) == global_id else -1
+
+    def is_entity(self, node: int) -> bool:
+        return self._entities[node] == 1
+
+    def get_callees(self, global_id: str) -> List[str]:
+        node: int = self.get_node(global_id)
+        return [] if node == -1 else [self.get_name(self._forward_targets[e]) for e in
+                                      range(self._forward_offsets[node], self._forward_offsets[node + 1])]
+
+    def get_callers(self, global_id: str) -> List[str]:
+        node: int = self.get_node(global_id)
+        return [] if node == -1 else [self.get_name(self._reverse_targets[e]) for e in
+                                      range(self._reverse_offsets[node], self._reverse_offsets[node + 1])]
+
+    def _reached(self, node: int) -> array:
+        return self._reach_targets[self._reach_offsets[node]:self._reach_offsets[node + 1]]
+
+    def reachable(self, sources: List[str], targets: List[str], depth: int = 0) -> bool:
+        """Whether any of targets can be reached from any of sources in at most depth calls, or in any number of
+        calls if depth is not positive"""
+        source_nodes: list = [n for n in (self.get_node(s) for s in sources) if n != -1]
+        target_nodes: set = {n for n in (self.get_node(t) for t in targets) if n != -1}
+        if not source_nodes or not target_nodes:
+            return False
+        if 0 < depth == self._reach_depth:
+            for node in source_nodes:
+                reached: array = self._reached(node)
+                if node in target_nodes or any(_contains(reached, t) for t in target_nodes):
+                    return True
+            return False
+        return len(_walk(self._forward_offsets, self._forward_targets, source_nodes, depth) & target_nodes) > 0
+
+    def is_current(self, model_files: list, resolves: Callable[[str], bool] = None, watched: list = None) -> bool:
+        """Whether the graph still describes model_files: none of the models it was built from changed, it covers
+        all of model_files and, if resolves is given, none of the global ids it could not find a model for resolve.
+        Those ids are only resolved again when watched is not given or one of its paths, which change whenever
+        resolves can find something new, is missing or changed after the graph was written"""
+        for model_file, size, mtime in self._files:
+            try:
+                if _file_record(model_file) != [model_file, size, mtime]:
+                    return False
+            except OSError:
+                return False
+        built_from: set = {f[0] for f in self._files}
+        if any(path.abspath(str(f)) not in built_from for f in model_files):
+            return False
+        if resolves and self._changed_since_written(watched):
+            for node in range(len(self)):
+                if not self.is_entity(node) and resolves(self.get_name(node)):
+                    return False
+        return True
+
+    def _changed_since_written(self, watched: list) -> bool:
+        if watched is None:
+            return True
+        written: int = fstat(self._file.fileno()).st_mtime_ns
+        for watched_path in watched:
+            try:
+                # a path changed in the same tick as the graph may have changed after it
+                if stat(watched_path).st_mtime_ns >= written:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def iter_edges(self) -> Iterator[Tuple[str, str]]:
+        for node in range(len(self)):
+            for e in range(self._forward_offsets[node], self._forward_offsets[node + 1]):
+                yield self.get_name(node), self.get_name(self._forward_targets[e])
+
+    def export_edges(self, out: TextIO):
+        for caller, callee in self.iter_edges():
+            out.write("{}\t{}\n".format(caller, callee))
+
+    def export_graphml(self, out: TextIO):
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        out.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+        out.write('  <key id="global_id" for="node" attr.name="global_id" attr.type="string"/>\n')
+        out.write('  <key id="entity" for="node" attr.name="entity" attr.type="boolean"/>\n')
+        out.write('  <graph id="calls" edgedefault="directed">\n')
+        for node in range(len(self)):
+            out.write('    <node id="n{}"><data key="global_id">{}</data><data key="entity">{}</data></node>\n'.format(
+                node, escape(self.get_name(node)), "true" if self.is_entity(node) else "false"))
+        for node in range(len(self)):
+            for e in range(self._forward_offsets[node], self._forward_offsets[node + 1]):
+                out.write('    <edge source="n{}" target="n{}"/>\n'.format(node, self._forward_targets[e]))
+        out.write('  </graph>\n</graphml>\n')
+
+
+def _contains(sorted_nodes, node: int) -> bool:
+    low, high = 0, len(sorted_nodes)
+    while low < high:
+        mid: int = (low + high) // 2
+        if sorted_nodes[mid] < node:
+            low = mid + 1
+        else:
+            high = mid
+    return low < len(sorted_nodes) and sorted_nodes[low] == node
@@ -0,0 +1,93 @@
+# Locks for model dirs that several threads, processes or CI jobs on one host write to. Models are published with an
+# atomic rename so readers never need a lock, the locks only stop writers from translating the same file twice
+import threading
+from os import path, remove, stat, fstat
+from pathlib import Path
+from typing import Dict, List
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+LOCK_EXTENSION: str = "lock"
+
+# the thread lock of each model path being locked and how many locks use it, dropped once none does
+_THREAD_LOCKS: Dict[str, List] = {}
+_THREAD_LOCKS_LOCK: threading.Lock = threading.Lock()
+
+
+def _open_locked(lock_path: str):
+    """Opens and locks the lock file at lock_path. A holder removes the file on release, so a lock taken on a file that
+    was removed in the meantime is taken again on the file that is there now"""
+    while True:
+        lock_file = open(lock_path, "a")
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            if path.samestat(fstat(lock_file.fileno()), stat(lock_path)):
+                return lock_file
+        except FileNotFoundError:
+            pass
+        except BaseException:
+            lock_file.close()
+            raise
+        lock_file.close()
+
+
+class ModelLock(object):
+    """Exclusive lock on one model path, held between the threads of a process and, where file locks are available,
+    between processes through a lock file next to the model. Waiting for the lock coalesces concurrent translations
+    of a file into the first one. Nothing is left behind once the lock is released"""
+    _key: str = None
+    _thread_lock: threading.Lock = None
+    _lock_path: str = None
+    _lock_file = None
+    _handed_off: bool = False
+
+    def __init__(self, model_path: str):
+        self._key = path.abspath(model_path)
+        self._lock_path = "{}.{}".format(self._key, LOCK_EXTENSION)
+
+    def __enter__(self):
+        with _THREAD_LOCKS_LOCK:
+            entry: list = _THREAD_LOCKS.setdefault(self._key, [threading.Lock(), 0])
+            entry[1] += 1
+            self._thread_lock = entry[0]
+        self._thread_lock.acquire()
+        try:
+            if fcntl:
+                Path(path.dirname(self._lock_path)).mkdir(parents=True, exist_ok=True)
+                self._lock_file = _open_locked(self._lock_path)
+        except BaseException:
+            self._release_thread_lock()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if not self._handed_off:
+            self.release()
+
+    def hand_off(self):
+        """Keeps the lock held past the end of the with block, whoever it is handed to releases it"""
+        self._handed_off = True
+        return self
+
+    def release(self):
+        if self._lock_file:
+            # removed while still locked, whoever waits on the removed file locks the next one instead
+            try:
+                remove(self._lock_path)
+            except OSError:
+                pass
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+        self._release_thread_lock()
+
+    def _release_thread_lock(self):
+        self._thread_lock.release()
+        with _THREAD_LOCKS_LOCK:
+            entry: list = _THREAD_LOCKS[self._key]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _THREAD_LOCKS[self._key]
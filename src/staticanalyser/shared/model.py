@@ -2,13 +2,16 @@
 import copy
 from enum import Enum
 import json
+import time
 from hashlib import md5
-from typing import List, Union
+from typing import List, Union, Iterator
 
 from staticanalyser.shared.platform_constants import SCHEMA_LOCATION, MODEL_DIR
+from staticanalyser.shared.progress import progress
 import staticanalyser.shared.config as config
 import logging
 from os import path
+from pathlib import Path
 
 with open(SCHEMA_LOCATION, "r") as s:
     SCHEMA: dict = json.load(s)
@@ -34,6 +37,38 @@ class ModelOperations(object):
         except NotImplementedError:
             return body
 
+    @staticmethod
+    def walk(entity: Union[list, dict, "ModelGeneric"], seen: set = None) -> Iterator["ModelGeneric"]:
+        """Every model in a selection, each once"""
+        seen = set() if seen is None else seen
+        if type(entity) is list:
+            for e in entity:
+                yield from ModelOperations.walk(e, seen)
+        elif type(entity) is dict:
+            for e in entity.values():
+                yield from ModelOperations.walk(e, seen)
+        elif issubclass(type(entity), ModelGeneric) and id(entity) not in seen:
+            seen.add(id(entity))
+            yield entity
+            for v in entity.__dict__.values():
+                if type(v) in (list, dict) or issubclass(type(v), ModelGeneric):
+                    yield from ModelOperations.walk(v, seen)
+
+    @staticmethod
+    def shift_spans(entity: Union[list, dict, "ModelGeneric"], delta: int):
+        """Moves the spans of a selection made at another offset of the preprocessed text"""
+        if delta:
+            for e in ModelOperations.walk(entity):
+                if e.get_span():
+                    e.set_span(e.get_span()[0] + delta, e.get_span()[1] + delta)
+
+    @staticmethod
+    def locate(entity: Union[list, dict, "ModelGeneric"], source_map) -> None:
+        """Sets the source location of every model in a selection from its span"""
+        for e in ModelOperations.walk(entity):
+            if e.get_span():
+                e.set_location(source_map.get_location(*e.get_span()))
+
     @staticmethod
     def load_model_from_dict(data: dict):
         entity_type: str = data.get("model_type")
@@ -54,16 +89,44 @@ class ModelOperations(object):
             for lang in _ft[k]:
                 if lang == id_parts[0]:
                     possible_filetypes.append(k)
-        for part in id_parts:
+        package_module: str = config.get_language_package_module(id_parts[0])
+        for index, part in enumerate(id_parts):
             current_search_path = path.join(current_search_path, part)
-            for ft in possible_filetypes:
-                test_path = "{}.{}.json".format(current_search_path, ft)
+            test_paths: List[str] = ["{}.{}.json".format(current_search_path, ft) for ft in possible_filetypes]
+            if package_module and index > 0:
+                # a package is modelled by the module file standing for its directory
+                test_paths += [path.join(current_search_path, "{}.{}.json".format(package_module, ft)) for ft in
+                               possible_filetypes]
+            for test_path in test_paths:
                 if path.isfile(test_path):
                     if return_gid:
-                        return ".".join(id_parts[:id_parts.index(part) + 1])
+                        return ".".join(id_parts[:index + 1])
                     return test_path
         return None
 
+    @staticmethod
+    def read_model_file(model_file: path, attempts: int = 5) -> dict:
+        """Reads a model, retrying while it is cut short. Models are published by renaming a complete file, but a
+        model from an older writer or another tool can be caught part way through being written"""
+        for attempt in range(attempts):
+            try:
+                with open(str(model_file), "r") as fp:
+                    return json.load(fp)
+            except ValueError:
+                if attempt == attempts - 1:
+                    raise
+                logging.warning("Model {} is incomplete, reading it again".format(model_file))
+                time.sleep(0.05 * 2 ** attempt)
+
+    @staticmethod
+    def get_model_files(model_dir: path) -> list:
+        res: list = []
+        if path.isdir(model_dir):
+            for lang_dir in sorted(Path(model_dir).iterdir()):
+                if lang_dir.is_dir():
+                    res += sorted(lang_dir.glob("**/*.json"))
+        return res
+
     @staticmethod
     def get_model_file(global_id: str) -> path:
         res = ModelOperations._find_file_in_dir(global_id, path.abspath(".model"))
@@ -80,9 +143,31 @@ class ModelOperations(object):
 
 
 class ModelGeneric(object):
+    _span: tuple = None
+    _location: dict = None
+
     def flatten(self) -> dict:
         raise NotImplementedError()
 
+    def _with_location(self, flattened: dict) -> dict:
+        if self._location:
+            flattened["location"] = self._location
+        return flattened
+
+    def set_span(self, start: int, end: int):
+        """The range of the preprocessed file the entity was selected from"""
+        self._span = (start, end)
+
+    def get_span(self) -> tuple:
+        return self._span
+
+    def set_location(self, location: dict):
+        self._location = location
+
+    def get_location(self) -> dict:
+        """The lines and columns of the entity in its source file"""
+        return self._location
+
     def __str__(self):
         return str(self.flatten())
 
@@ -118,12 +203,12 @@ class ReferenceModel(ModelGeneric):
                     parms.append(p.flatten())
                 else:
                     parms.append(p)
-        return {
+        return self._with_location({
             "model_type": ModelMap.REFERENCE.value,
             "ref": self._ref,
             "target": self._target,
             "parameters": parms
-        }
+        })
 
     def get_ref(self):
         return self._ref
@@ -142,6 +227,7 @@ class ReferenceModel(ModelGeneric):
             self._parameters = sub_selection.get("parameter_call")
 
     def load_from_dict(self, data: dict):
+        self._location = data.get("location")
         self._ref = data.get("ref")
         self._target = data.get("target")
         self._parameters = []
@@ -153,6 +239,7 @@ class ReferenceModel(ModelGeneric):
 
 class ControlFlowGeneric(ModelGeneric):
     _control_flow: dict = None
+    _def_use: dict = None
 
     def flatten_dict(self, *targets) -> dict:
         res: dict = {}
@@ -181,6 +268,29 @@ class ControlFlowGeneric(ModelGeneric):
     def get_as_strings(self):
         raise NotImplementedError()
 
+    def get_def_use(self) -> dict:
+        """Maps every variable used in the block to its uses, in statement order. A use is ("assign", variable) when
+        the variable is called and the result assigned, ("parameter", reference, index) when it is passed to a call
+        and ("block", block) when a block nested in this one uses it. Built once, on first use"""
+        if self._def_use is None:
+            def_use: dict = {}
+            for st in self.get_as_statements() or []:
+                if type(st) is StatementModel and type(st.get_rhs()) is ReferenceModel:
+                    rhs: ReferenceModel = st.get_rhs()
+                    if st.get_lhs():
+                        def_use.setdefault(rhs.get_ref(), []).append(("assign", st.get_lhs()))
+                    passed: set = set()
+                    for index, parm in enumerate(rhs.get_parameters() or []):
+                        # a call only counts once for a variable, at the first position it is passed in
+                        if type(parm) is VariableModel and parm.get_default() not in passed:
+                            passed.add(parm.get_default())
+                            def_use.setdefault(parm.get_default(), []).append(("parameter", rhs, index))
+                if issubclass(type(st), ControlFlowGeneric):
+                    for variable in st.get_def_use().keys():
+                        def_use.setdefault(variable, []).append(("block", st))
+            self._def_use = def_use
+        return self._def_use
+
 
 class NamedModelGeneric(ModelGeneric):
     _global_identifier: str = None
@@ -197,13 +307,15 @@ class NamedModelGeneric(ModelGeneric):
             self._global_identifier = "{}.{}".format(prefix, self._name)
             if data.get("body"):
                 self._body = data.get("body")
-                self._hash = md5(self._body.encode("utf-8")).hexdigest()
             self._lang = language
 
     def get_global_identifier(self) -> str:
         return self._global_identifier
 
     def get_hash(self):
+        # the body may still be a span of the source, so it is only copied out when the hash is needed
+        if self._hash is None and self._body:
+            self._hash = md5(str(self._body).encode("utf-8")).hexdigest()
         return self._hash
 
     def append_to_prefix(self, name: str):
@@ -239,18 +351,19 @@ class ClassModel(NamedModelGeneric):
         flattened_functions: list = [f.flatten() for f in self._functions]
         flattened_parent_classes: list = [c.flatten() for c in self._parent_classes]
         flattened_attributes: list = [a.flatten() for a in self._attributes]
-        return {
+        return self._with_location({
             "model_type": ModelMap.CLASS.value,
             "name": self._name,
             "global_id": self._global_identifier,
-            "hash": self._hash,
+            "hash": self.get_hash(),
             "parent_classes": flattened_parent_classes,  # Umm, this should be parent classes?
             "methods": flattened_functions,
             "attributes": flattened_attributes,
             "body": self._body
-        }
+        })
 
     def load_from_dict(self, data: dict):
+        self._location = data.get("location")
         self._name = data.get("name")
         self._global_identifier = data.get("global_id")
         self._hash = data.get("hash")
@@ -327,13 +440,14 @@ class StatementModel(ModelGeneric):
         rhs = self._rhs
         if not type(rhs) == str:
             rhs = rhs.flatten()
-        return {
+        return self._with_location({
             "model_type": ModelMap.STATEMENT.value,
             "lhs": self._lhs,
             "rhs": rhs
-        }
+        })
 
     def load_from_dict(self, data: dict):
+        self._location = data.get("location")
         self._lhs = data.get("lhs")
         rhs_data: dict = data.get("rhs")
         rhs: Union[ModelGeneric, str] = None
@@ -359,12 +473,12 @@ class ForLoopModel(ControlFlowGeneric):
             self._control_flow = {}
 
     def flatten(self) -> dict:
-        return {
+        return self._with_location({
             "model_type": ModelMap.FOR_LOOP.value,
             "loop": self._loop,
             "body": self._body,
             "body_parsed": [s.flatten() for s in self._body_parsed]
-        }
+        })
 
     def add_subselection(self, sub_selection: dict):
         self._body_parsed = sub_selection.get("statement") or []
@@ -381,13 +495,14 @@ class ForLoopModel(ControlFlowGeneric):
 
     def get_as_strings(self) -> list:
         res: list = [self._loop]
-        res += [l.strip() for l in self._body.split("\n")]
+        res += [l.strip() for l in str(self._body).split("\n")]
         return res
 
     def get_as_statements(self) -> list:
         return self._body_parsed
 
     def load_from_dict(self, data: dict):
+        self._location = data.get("location")
         self._loop = data.get("loop")
         self._body = data.get("body")
         self._body_parsed = []
@@ -414,6 +529,7 @@ class WhileLoopModel(ControlFlowGeneric):
             self._control_flow = {}
 
     def load_from_dict(self, data: dict):
+        self._location = data.get("location")
         self._loop = data.get("loop")
         self._condition = data.get("condition")
         self._body = data.get("body")
@@ -426,13 +542,13 @@ class WhileLoopModel(ControlFlowGeneric):
 
     def flatten(self) -> dict:
         self._control_flow = self.flatten_dict("for", "while", "if")
-        return {
+        return self._with_location({
             "model_type": ModelMap.WHILE_LOOP.value,
             "loop": self._loop,
             "condition": self._condition,
             "body": self._body,
             "body_parsed": [s.flatten() for s in self._body_parsed]
-        }
+        })
 
     def add_subselection(self, sub_selection: dict):
         self._body_parsed = sub_selection.get("statement") or []
@@ -446,7 +562,7 @@ class WhileLoopModel(ControlFlowGeneric):
 
     def get_as_strings(self) -> list:
         res: list = [self._loop]
-        res += [l.strip() for l in self._body.split("\n")]
+        res += [l.strip() for l in str(self._body).split("\n")]
         return res
 
     def get_as_statements(self) -> list:
@@ -466,6 +582,7 @@ class ConditionModel(ControlFlowGeneric):
             }
 
     def load_from_dict(self, data: dict):
+        self._location = data.get("location")
         self._condition = data.get("condition")
         self._control_flow = {
             "true": ConditionModel._load_block(data.get("blocks"), "true_block"),
@@ -474,7 +591,7 @@ class ConditionModel(ControlFlowGeneric):
 
     def flatten(self) -> dict:
         # self._control_flow = self.flatten_dict("true", "false")
-        return {
+        return self._with_location({
             "model_type": ModelMap.CONDITION.value,
             "condition": self._condition,
             "blocks": {
@@ -482,7 +599,7 @@ class ConditionModel(ControlFlowGeneric):
                 "false_block": [s.flatten() for s in self._control_flow.get("false_block")] if self._control_flow.get(
                     "false_block") else []
             }
-        }
+        })
 
     def add_subselection(self, sub_selection: dict):
         self._control_flow["true_block"] = ModelOperations.prune_body(
@@ -514,16 +631,14 @@ class ConditionModel(ControlFlowGeneric):
 
     def get_as_strings(self) -> list:
         res: list = ["if {}:".format(self._condition)]  # .get_string()
-        res += [l.strip() for l in self._control_flow["true"].split("\n")]
+        res += [l.strip() for l in str(self._control_flow["true"]).split("\n")]
         if self._control_flow["false"] is not "":
             res.append("else:")
-            res += [l.strip() for l in self._control_flow["false"].split("\n")]
+            res += [l.strip() for l in str(self._control_flow["false"]).split("\n")]
         return res
 
     def get_as_statements(self) -> list:
-        res: list = self._control_flow.get("true_block")
-        res += self._control_flow.get("false_block") or []
-        return res
+        return (self._control_flow.get("true_block") or []) + (self._control_flow.get("false_block") or [])
 
 
 class FunctionModel(NamedModelGeneric, ControlFlowGeneric):
@@ -553,22 +668,23 @@ class FunctionModel(NamedModelGeneric, ControlFlowGeneric):
         return self._statements
 
     def flatten(self):
-        return {
+        return self._with_location({
             "model_type": ModelMap.FUNCTION.value,
             "name": self._name,
             "global_id": self.get_global_identifier(),
-            "hash": self._hash,
+            "hash": self.get_hash(),
             "parameters": [p.flatten() for p in self._parameters],
             "body": self._body,
             "body_parsed": [s.flatten() for s in self._statements]
-        }
+        })
 
     def get_as_strings(self) -> list:
         res: list = [self._declaration]
-        res += [l.strip() for l in self._body.split('\n')]
+        res += [l.strip() for l in str(self._body).split('\n')]
         return res
 
     def load_from_dict(self, data: dict):
+        self._location = data.get("location")
         self._name = data.get("name")
         self._hash = data.get("hash")
         self._body = data.get("body")
@@ -605,14 +721,15 @@ class VariableModel(NamedModelGeneric):
             self._type = data.get("type") or ""
 
     def flatten(self):
-        return {
+        return self._with_location({
             "model_type": ModelMap.VARIABLE.value,
             "name": self._name,
             "type": self._type,
             "default_value": self._default
-        }
+        })
 
     def load_from_dict(self, data: dict):
+        self._location = data.get("location")
         self._name = data.get("name")
         self._type = data.get("type")
         self._default = data.get("default_value")
@@ -632,18 +749,18 @@ class DependencyModel(ModelGeneric):
         if not hollow:
             self._source = data.get("source")
             self._provides = data.get("provides")
-            print(data.get("provides"))
+            progress(data.get("provides"))
 
     def add_subselection(self, sub_selection: dict):
         if sub_selection.get("provided_dependencies") != []:
             self._provides = sub_selection.get("provided_dependencies")
 
     def flatten(self) -> dict:
-        return {
+        return self._with_location({
             "model_type": ModelMap.DEPENDENCY.value,
             "source": self._source,
             "provides": [p.flatten() for p in self._provides if type(p) != str]
-        }
+        })
 
     def get_provided_imports(self):
         return self._provides
@@ -652,6 +769,7 @@ class DependencyModel(ModelGeneric):
         return self._source
 
     def load_from_dict(self, data: dict):
+        self._location = data.get("location")
         self._source = data.get("source")
         self._provides = [BasicString("", "", {"value": p}) for p in data.get("provides")]
 
@@ -0,0 +1,214 @@
+# A single file holding every model of a translated model tree, to copy and open in place of the tree. The models are
+# written one after the other followed by an index, which is memory-mapped to find a model by its model id, by a
+# global id it defines or by the path it has in the tree, and read without touching the other models. Like the sidecar
+# filters, a packed model records the size and mtime of the file it was read from so a retranslated file is preferred
+import json
+import mmap
+import struct
+from array import array
+from os import path, replace, getpid, stat
+from typing import List, Tuple
+import logging
+
+from staticanalyser.shared.bloom import BloomFilter, get_model_ids
+from staticanalyser.shared.model import ModelOperations
+
+PACK_MAGIC: bytes = b"SAPACK01"
+# magic, version, model count, string count, then the offsets of the index sections
+_HEADER: struct.Struct = struct.Struct("=8sIII6Q")
+_PACK_VERSION: int = 2
+_NO_MODEL: int = -1
+
+
+class ModelPack(object):
+    """A read-only pack of models. A model in the pack is named by the path its model file has relative to the dir
+    of the pack, so the paths of a tree and of the pack made from it are the same"""
+    _path: str = None
+    _dir: str = None
+    _file = None
+    _buffer: mmap.mmap = None
+    _string_offsets: memoryview = None
+    _string_data: memoryview = None
+    _string_models: memoryview = None
+    _names: memoryview = None
+    _models: memoryview = None
+    _filters: memoryview = None
+    _views: list = None
+
+    @staticmethod
+    def write(pack_path: str, model_files: list) -> None:
+        pack_dir: str = path.dirname(path.abspath(pack_path))
+        strings: dict = {}
+        models: array = array("Q")
+        filters: array = array("I")
+        model_names: list = []
+        tmp_path: str = "{}.{}.tmp".format(pack_path, getpid())
+        with open(tmp_path, "wb") as f:
+            f.write(b"\0" * _HEADER.size)
+            for model_file in model_files:
+                try:
+                    model_stat = stat(str(model_file))
+                    model_data: dict = ModelOperations.read_model_file(model_file)
+                except (OSError, ValueError):
+                    logging.warning("Could not read {} for the model pack".format(model_file))
+                    continue
+                model: int = len(model_names)
+                model_file = path.relpath(path.abspath(str(model_file)), pack_dir).replace(path.sep, "/")
+                model_names.append((model_data.get("model_id"), model_file))
+                ids: set = get_model_ids(model_data)
+                for key in [model_file, model_data.get("model_id")] + sorted(_defined_ids(model_data)):
+                    # the first model defining an id wins, as in the model store
+                    if type(key) is str:
+                        strings.setdefault(key, model)
+                record: bytes = json.dumps(model_data, separators=(",", ":")).encode("utf-8")
+                bloom: BloomFilter = BloomFilter.for_items(ids)
+                models.extend((f.tell(), len(record)))
+                f.write(record)
+                models.extend((f.tell(), len(bloom.to_bytes())))
+                f.write(bloom.to_bytes())
+                models.extend((model_stat.st_size, model_stat.st_mtime_ns))
+                filters.extend((bloom.get_hash_count(), bloom.get_bit_count()))
+
+            keys: list = sorted(strings.keys(), key=lambda s: s.encode("utf-8"))
+            string_index: dict = {s: i for i, s in enumerate(keys)}
+            string_offsets: array = array("Q", [0])
+            string_data: bytearray = bytearray()
+            for s in keys:
+                string_data += s.encode("utf-8")
+                string_offsets.append(len(string_data))
+            string_models: array = array("i", [strings[s] for s in keys])
+            names: array = array("I")
+            for model_id, model_file in model_names:
+                names.extend((string_index[model_id], string_index[model_file]))
+
+            offsets: list = []
+            for section in [string_offsets, bytes(string_data), string_models, names, models, filters]:
+                f.write(b"\0" * (-f.tell() % 8))
+                offsets.append(f.tell())
+                f.write(section.tobytes() if type(section) is array else section)
+            f.seek(0)
+            f.write(_HEADER.pack(PACK_MAGIC, _PACK_VERSION, len(model_names), len(keys), *offsets))
+        replace(tmp_path, pack_path)
+        logging.info("Written model pack {} for {} models".format(pack_path, len(model_names)))
+
+    def __init__(self, pack_path: str):
+        self._path = path.abspath(pack_path)
+        self._dir = path.dirname(self._path)
+        self._file = open(self._path, "rb")
+        self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        header: tuple = _HEADER.unpack_from(self._buffer, 0)
+        if header[0] != PACK_MAGIC or header[1] != _PACK_VERSION:
+            self.close()
+            raise ValueError("{} is not a model pack".format(pack_path))
+        model_count, string_count = header[2:4]
+        offsets: tuple = header[4:]
+        view: memoryview = memoryview(self._buffer)
+        self._string_offsets = view[offsets[0]:offsets[0] + 8 * (string_count + 1)].cast("Q")
+        self._string_data = view[offsets[1]:offsets[1] + self._string_offsets[string_count]]
+        self._string_models = view[offsets[2]:offsets[2] + 4 * string_count].cast("i")
+        self._names = view[offsets[3]:offsets[3] + 8 * model_count].cast("I")
+        self._models = view[offsets[4]:offsets[4] + 48 * model_count].cast("Q")
+        self._filters = view[offsets[5]:offsets[5] + 8 * model_count].cast("I")
+        self._views = [view, self._string_offsets, self._string_data, self._string_models, self._names, self._models,
+                       self._filters]
+
+    def __reduce__(self):
+        return ModelPack, (self._path,)
+
+    def close(self):
+        for view in self._views or []:
+            view.release()
+        self._views = None
+        if self._buffer:
+            self._buffer.close()
+        self._file.close()
+
+    def get_path(self) -> str:
+        return self._path
+
+    def __len__(self) -> int:
+        return len(self._names) // 2
+
+    def _get_string(self, index: int) -> str:
+        return str(self._string_data[self._string_offsets[index]:self._string_offsets[index + 1]], "utf-8")
+
+    def _find(self, value: str) -> int:
+        """The model a model id, global id or model file belongs to"""
+        target: bytes = value.encode("utf-8")
+        low, high = 0, len(self._string_models)
+        while low < high:
+            mid: int = (low + high) // 2
+            if self._string_data[self._string_offsets[mid]:self._string_offsets[mid + 1]].tobytes() < target:
+                low = mid + 1
+            else:
+                high = mid
+        if low < len(self._string_models) and self._get_string(low) == value:
+            return self._string_models[low]
+        return _NO_MODEL
+
+    def _get_model_file(self, model: int) -> str:
+        return path.join(self._dir, *self._get_string(self._names[2 * model + 1]).split("/"))
+
+    def _find_model_file(self, model_file: str) -> int:
+        relative_file: str = path.relpath(path.abspath(str(model_file)), self._dir)
+        if relative_file.startswith(".."):
+            return _NO_MODEL
+        return self._find(relative_file.replace(path.sep, "/"))
+
+    def get_model_files(self) -> List[str]:
+        """The paths the models of the pack had in the tree it was made from, in the order they were packed"""
+        return [self._get_model_file(model) for model in range(len(self))]
+
+    def has_model_file(self, model_file: str) -> bool:
+        return self._find_model_file(model_file) != _NO_MODEL
+
+    def is_current(self, model_file: str) -> bool:
+        """Whether the model file is in the pack and, if it is still in the tree, is the file that was packed"""
+        model: int = self._find_model_file(model_file)
+        if model == _NO_MODEL:
+            return False
+        try:
+            model_stat = stat(str(model_file))
+        except FileNotFoundError:
+            return True
+        if (model_stat.st_size, model_stat.st_mtime_ns) != tuple(self._models[6 * model + 4:6 * model + 6]):
+            logging.debug("Reading {} from the tree, it changed since {} was written".format(model_file, self._path))
+            return False
+        return True
+
+    def read_model_file(self, model_file: str) -> dict:
+        model: int = self._find_model_file(model_file)
+        if model == _NO_MODEL:
+            raise FileNotFoundError("{} is not in {}".format(model_file, self._path))
+        offset, length = self._models[6 * model], self._models[6 * model + 1]
+        return json.loads(bytes(self._buffer[offset:offset + length]))
+
+    def get_filter(self, model_file: str) -> BloomFilter:
+        model: int = self._find_model_file(model_file)
+        if model == _NO_MODEL:
+            return None
+        offset, length = self._models[6 * model + 2], self._models[6 * model + 3]
+        return BloomFilter(self._filters[2 * model + 1], self._filters[2 * model], self._buffer[offset:offset + length])
+
+    def get_model(self, global_id: str) -> Tuple[str, str]:
+        """Returns the model id and model file that defines a global id, or the model the global id names"""
+        parts: List[str] = global_id.split(".")
+        for end in range(len(parts), 0, -1):
+            model: int = self._find(".".join(parts[:end]))
+            if model != _NO_MODEL:
+                return self._get_string(self._names[2 * model]), self._get_model_file(model)
+        return None, None
+
+
+def _defined_ids(data) -> set:
+    res: set = set()
+    pending: list = [data.get("classes") or [], data.get("functions") or []]
+    while pending:
+        data = pending.pop()
+        if type(data) is dict:
+            if type(data.get("global_id")) is str and data.get("model_type") in ("class", "function"):
+                res.add(data.get("global_id"))
+            pending += [v for v in data.values() if type(v) in (dict, list)]
+        elif type(data) is list:
+            pending += [v for v in data if type(v) in (dict, list)]
+    return res
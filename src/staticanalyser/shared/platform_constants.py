@@ -15,5 +15,17 @@ else:  # name == "posix" must be some variation of linux? if not true then it sh
 
 MODEL_DIR = path.join(GLOBAL_DATA_DIR, "models")
 LANGS_DIR = path.join(GLOBAL_DATA_DIR, "langs")
+CACHE_DIR = path.join(GLOBAL_DATA_DIR, "cache")
 CONFIG_LOCATION = path.join(GLOBAL_DATA_DIR, "config.toml")
 SCHEMA_LOCATION = path.join(path.dirname(__file__), "model_schema.json")
+
+# Indexes written alongside the models live at the top of a model dir, the models themselves are in language dirs
+MODEL_STORE_NAME = "models.store"
+MODEL_DATABASE_NAME = "models.sqlite"
+CALL_GRAPH_NAME = "callgraph.graph"
+MODEL_PACK_NAME = "models.pack"
+# touched whenever models are written to a model dir, so the call graph can tell whether models were added after it
+MODEL_MANIFEST_NAME = "models.manifest"
+SHARD_MANIFEST_NAME = "shard.json"
+# the model dir a shard writes to when no output dir is given, next to the model dir the shards are merged into
+SHARD_DIR_FORMAT = ".model-shard-{}-of-{}"
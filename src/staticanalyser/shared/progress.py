@@ -0,0 +1,23 @@
+# Progress printed while translating. Each thread prints to stdout unless it sends its progress elsewhere, so a query
+# that translates a module on demand keeps the progress of the translation out of the results it writes to stdout
+import threading
+from contextlib import contextmanager
+from typing import TextIO
+
+_streams: threading.local = threading.local()
+
+
+def progress(*values):
+    """Prints values as print would, to the progress stream of the current thread"""
+    print(*values, file=getattr(_streams, "stream", None))
+
+
+@contextmanager
+def progress_to(stream: TextIO):
+    """Sends the progress of the current thread to stream for the duration of the with block"""
+    previous: TextIO = getattr(_streams, "stream", None)
+    _streams.stream = stream
+    try:
+        yield
+    finally:
+        _streams.stream = previous
@@ -0,0 +1,208 @@
+# Source text handling for the translator. The bodies selectors search again are kept as offsets into the preprocessed
+# text rather than copied, so nested bodies share one copy of the file.
+# The edits the preprocessor makes are recorded in a source map, so offsets can be traced back to the original file
+import re
+from bisect import bisect_right
+from hashlib import md5
+from typing import Tuple, Union
+
+
+class TextSpan(object):
+    """A range of a larger text, only turned into its own string when it is serialized or queried"""
+    __slots__ = ("_text", "_start", "_end")
+
+    def __init__(self, text: str, start: int = 0, end: int = None):
+        self._text = text
+        self._start = start
+        self._end = len(text) if end is None else end
+
+    def get_text(self) -> str:
+        return self._text
+
+    def get_start(self) -> int:
+        return self._start
+
+    def get_end(self) -> int:
+        return self._end
+
+    def __str__(self):
+        return self._text[self._start:self._end]
+
+    def __repr__(self):
+        return repr(str(self))
+
+    def __format__(self, format_spec: str):
+        return format(str(self), format_spec)
+
+    def __len__(self):
+        return self._end - self._start
+
+    def __bool__(self):
+        return self._end > self._start
+
+    def __eq__(self, other):
+        if type(other) in (str, TextSpan):
+            return str(self) == str(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(str(self))
+
+    def __reduce__(self):
+        # a span on its own would drag the whole text along, so it is pickled as the text it covers
+        return str, (str(self),)
+
+
+def get_bounds(text: Union[str, TextSpan]) -> Tuple[str, int, int]:
+    """The underlying text and the range of it to search"""
+    if type(text) is TextSpan:
+        return text.get_text(), text.get_start(), text.get_end()
+    return text, 0, len(text)
+
+
+def materialise(value: Union[TextSpan, dict, list, object]):
+    """Replaces the spans in a flattened model by the strings they cover"""
+    if type(value) is TextSpan:
+        return str(value)
+    elif type(value) is dict:
+        for k in value.keys():
+            value[k] = materialise(value[k])
+    elif type(value) is list:
+        for i in range(len(value)):
+            value[i] = materialise(value[i])
+    return value
+
+
+def read_source(file: str) -> Tuple[str, str]:
+    """Reads a source file as utf-8 with universal newlines and returns its text and the md5 of that text"""
+    with open(file, "rb") as f:
+        data: bytes = f.read()
+    # newlines are normalised before decoding, so the file is decoded and hashed once
+    if b"\r" in data:
+        data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+    return str(data, "utf-8"), md5(data).hexdigest()
+
+
+class SourceMap(object):
+    """Maps offsets in preprocessed text to the text it was made from. The preprocessed text is a list of segments,
+    each one either copied from the original text or replacing a range of it; consecutive copies are merged, so the
+    map only grows with the number of edits"""
+    _new_starts: list = None
+    _old_starts: list = None
+    _old_ends: list = None
+    _length: int = None
+    _line_starts: list = None
+
+    def __init__(self, original_text: str):
+        self._new_starts = [0]
+        self._old_starts = [0]
+        self._old_ends = [len(original_text)]
+        self._length = len(original_text)
+        self._line_starts = [0] + [m.end() for m in re.finditer("\n", original_text)]
+
+    def sub(self, regex: str, replacement: str, text: str) -> str:
+        """Equivalent to re.sub(regex, replacement, text), recording the edits it makes"""
+        pieces: list = []
+        edits: list = []
+        position: int = 0
+        length: int = 0
+        for m in re.finditer(regex, text):
+            if m.start() > position:
+                edits.append((length, position, m.start(), True))
+                pieces.append(text[position:m.start()])
+                length += m.start() - position
+            expanded: str = m.expand(replacement)
+            edits.append((length, m.start(), m.end(), False))
+            pieces.append(expanded)
+            length += len(expanded)
+            position = m.end()
+        if not edits:
+            return text
+        if position < len(text):
+            edits.append((length, position, len(text), True))
+            pieces.append(text[position:])
+            length += len(text) - position
+        self._compose(edits, length)
+        return "".join(pieces)
+
+    def _segment(self, offset: int) -> int:
+        return max(bisect_right(self._new_starts, offset) - 1, 0)
+
+    def _segment_end(self, segment: int) -> int:
+        return self._new_starts[segment + 1] if segment + 1 < len(self._new_starts) else self._length
+
+    def _is_copy(self, segment: int) -> bool:
+        return self._segment_end(segment) - self._new_starts[segment] == self._old_ends[segment] - self._old_starts[
+            segment]
+
+    def to_original(self, offset: int) -> int:
+        """The original offset of the character at offset, or the start of the range it replaced"""
+        segment: int = self._segment(offset)
+        if self._is_copy(segment):
+            return self._old_starts[segment] + offset - self._new_starts[segment]
+        return self._old_starts[segment]
+
+    def to_original_end(self, offset: int) -> int:
+        """The original offset an exclusive end offset maps to"""
+        if offset <= 0:
+            return self.to_original(0)
+        segment: int = self._segment(offset - 1)
+        if self._is_copy(segment):
+            return self._old_starts[segment] + offset - self._new_starts[segment]
+        return self._old_ends[segment]
+
+    def _compose(self, edits: list, length: int):
+        new_starts: list = []
+        old_starts: list = []
+        old_ends: list = []
+
+        def emit(new_start: int, new_end: int, old_start: int, old_end: int):
+            if new_end <= new_start:
+                return
+            copy: bool = new_end - new_start == old_end - old_start
+            if new_starts and copy and old_ends[-1] == old_start and \
+                    new_start - new_starts[-1] == old_ends[-1] - old_starts[-1]:
+                old_ends[-1] = old_end
+                return
+            new_starts.append(new_start)
+            old_starts.append(old_start)
+            old_ends.append(old_end)
+
+        for index, (new_start, start, end, copied) in enumerate(edits):
+            new_end: int = edits[index + 1][0] if index + 1 < len(edits) else length
+            if not copied:
+                emit(new_start, new_end, self.to_original(start), self.to_original_end(end) if end > start else
+                     self.to_original(start))
+                continue
+            segment: int = self._segment(start)
+            while start < end:
+                segment_end: int = min(self._segment_end(segment), end)
+                if self._is_copy(segment):
+                    old_start: int = self._old_starts[segment] + start - self._new_starts[segment]
+                    emit(new_start, new_start + segment_end - start, old_start, old_start + segment_end - start)
+                else:
+                    emit(new_start, new_start + segment_end - start, self._old_starts[segment], self._old_ends[segment])
+                new_start += segment_end - start
+                start = segment_end
+                segment += 1
+        self._new_starts = new_starts or [0]
+        self._old_starts = old_starts or [0]
+        self._old_ends = old_ends or [0]
+        self._length = length
+
+    def _line_column(self, offset: int) -> Tuple[int, int]:
+        line: int = bisect_right(self._line_starts, offset)
+        return line, offset - self._line_starts[line - 1] + 1
+
+    def get_location(self, start: int, end: int) -> dict:
+        """The 1-based lines and columns of the first and last character of a range of the preprocessed text"""
+        original_start: int = self.to_original(start)
+        original_end: int = max(self.to_original_end(end) - 1, original_start)
+        start_line, start_column = self._line_column(original_start)
+        end_line, end_column = self._line_column(original_end)
+        return {
+            "start_line": start_line,
+            "start_column": start_column,
+            "end_line": end_line,
+            "end_column": end_column
+        }
@@ -0,0 +1,319 @@
+# A read-only, memory-mapped index of the entities and references in a translated model tree. Every section of the
+# file is a flat array, so processes on the same host can open the store and share one copy of the index through the
+# page cache instead of building it in every process. Only the index is shared, each process still reads and decodes
+# the models it loads
+import mmap
+import struct
+from array import array
+from os import path, replace, getpid, stat, fstat
+from typing import List, Tuple, Union
+import logging
+
+from staticanalyser.shared.model import ModelOperations
+
+STORE_MAGIC: bytes = b"SASTORE1"
+# magic, version, string count, model count, node count, edge count, then the offsets of the sections
+_HEADER: struct.Struct = struct.Struct("=8sIIIII10Q")
+_STORE_VERSION: int = 2
+_NO_NODE: int = -1
+
+
+class NodeKind(object):
+    FUNCTION = 1
+    CLASS = 2
+
+    _model_types = {
+        "function": FUNCTION,
+        "class": CLASS
+    }
+
+    @staticmethod
+    def from_model_type(model_type: str) -> int:
+        return NodeKind._model_types.get(model_type) or 0
+
+
+class _StoreBuilder(object):
+    _strings: dict = None
+    _models: list = None
+    _nodes: list = None
+    _edges: list = None
+
+    def __init__(self):
+        self._strings = {}
+        self._models = []
+        self._nodes = []
+        self._edges = []
+
+    def _string(self, value: str) -> str:
+        self._strings[value] = None
+        return value
+
+    def add_model(self, model_id: str, model_file: str, model_data: dict):
+        model_index: int = len(self._models)
+        self._models.append((self._string(model_id), self._string(model_file)))
+        for group in ("classes", "functions"):
+            for entity in model_data.get(group) or []:
+                self._add_entity(entity, model_index, _NO_NODE)
+
+    def _add_entity(self, data: Union[dict, list], model_index: int, parent: int):
+        if type(data) is list:
+            for e in data:
+                self._add_entity(e, model_index, parent)
+        elif type(data) is dict:
+            kind: int = NodeKind.from_model_type(data.get("model_type"))
+            if kind and data.get("global_id"):
+                node: int = len(self._nodes)
+                self._nodes.append((self._string(data.get("global_id")), kind, model_index, parent))
+                parent = node
+            elif data.get("model_type") == "reference" and type(data.get("ref")) is str and parent != _NO_NODE:
+                self._edges.append((parent, self._string(data.get("ref"))))
+            for v in data.values():
+                if type(v) in (dict, list):
+                    self._add_entity(v, model_index, parent)
+
+    def write(self, store_path: str):
+        strings: list = sorted(self._strings.keys(), key=lambda s: s.encode("utf-8"))
+        string_index: dict = {s: i for i, s in enumerate(strings)}
+
+        string_offsets: array = array("Q", [0])
+        string_data: bytearray = bytearray()
+        for s in strings:
+            string_data += s.encode("utf-8")
+            string_offsets.append(len(string_data))
+
+        # models are kept in string order so they can be binary searched by model id
+        model_order: list = sorted(range(len(self._models)), key=lambda m: string_index[self._models[m][0]])
+        model_rank: dict = {m: rank for rank, m in enumerate(model_order)}
+        models: array = array("I")
+        for m in model_order:
+            models.extend((string_index[self._models[m][0]], string_index[self._models[m][1]]))
+        # the nodes of a model are added together, so each model has one range of them
+        model_nodes: array = array("I", [0] * (2 * len(self._models)))
+        for index, (_, _, model_index, _) in enumerate(self._nodes):
+            rank: int = model_rank[model_index]
+            if model_nodes[2 * rank + 1] == 0:
+                model_nodes[2 * rank] = index
+            model_nodes[2 * rank + 1] += 1
+
+        nodes: array = array("I")
+        string_nodes: array = array("i", [_NO_NODE] * len(strings))
+        for index, (global_id, kind, model_index, parent) in enumerate(self._nodes):
+            nodes.extend((string_index[global_id], kind, model_rank[model_index], parent + 1))
+            if string_nodes[string_index[global_id]] == _NO_NODE:
+                string_nodes[string_index[global_id]] = index
+
+        edge_offsets, edge_targets = compress_rows([(n, string_index[r]) for n, r in self._edges], len(self._nodes))
+        ref_offsets, ref_nodes = compress_rows([(string_index[r], n) for n, r in self._edges], len(strings))
+
+        sections: list = [string_offsets, bytes(string_data), models, nodes, string_nodes,
+                          edge_offsets, edge_targets, ref_offsets, ref_nodes, model_nodes]
+        offsets: list = []
+        body: bytearray = bytearray()
+        for section in sections:
+            body += b"\0" * (-(_HEADER.size + len(body)) % 8)
+            offsets.append(_HEADER.size + len(body))
+            body += section.tobytes() if type(section) is array else section
+        header: bytes = _HEADER.pack(STORE_MAGIC, _STORE_VERSION, len(strings), len(self._models), len(self._nodes),
+                                     len(self._edges), *offsets)
+        tmp_path: str = "{}.{}.tmp".format(store_path, getpid())
+        with open(tmp_path, "wb") as f:
+            f.write(header)
+            f.write(body)
+        replace(tmp_path, store_path)
+
+
+def compress_rows(pairs: list, row_count: int) -> Tuple[array, array]:
+    """Builds a compressed sparse row representation of (row, column) pairs, the offsets of the rows and their columns
+    in row order. The store and the call graph both keep their edges this way"""
+    offsets: array = array("Q", [0] * (row_count + 1))
+    for row, _ in pairs:
+        offsets[row + 1] += 1
+    for i in range(row_count):
+        offsets[i + 1] += offsets[i]
+    columns: array = array("I", [0] * len(pairs))
+    fill: array = array("Q", offsets)
+    for row, column in pairs:
+        columns[fill[row]] = column
+        fill[row] += 1
+    return offsets, columns
+
+
+class ModelStore(object):
+    _path: str = None
+    _dir: str = None
+    _file = None
+    _buffer: mmap.mmap = None
+    _views: list = None
+    _mtime_ns: int = None
+
+    @staticmethod
+    def write(store_path: str, model_files: list) -> None:
+        builder: _StoreBuilder = _StoreBuilder()
+        store_dir: str = path.dirname(path.abspath(store_path))
+        for model_file in model_files:
+            try:
+                model_data: dict = ModelOperations.read_model_file(model_file)
+            except (OSError, ValueError):
+                logging.warning("Could not read {} for the model store".format(model_file))
+                continue
+            builder.add_model(model_data.get("model_id"), path.relpath(path.abspath(str(model_file)), store_dir),
+                              model_data)
+        builder.write(store_path)
+        logging.info("Written model store {} for {} models".format(store_path, len(model_files)))
+
+    def __init__(self, store_path: str):
+        self._path = path.abspath(store_path)
+        self._dir = path.dirname(self._path)
+        self._file = open(self._path, "rb")
+        try:
+            self._mtime_ns = fstat(self._file.fileno()).st_mtime_ns
+            self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            header: tuple = _HEADER.unpack_from(self._buffer, 0)
+        except OSError:
+            self.close()
+            raise
+        except (ValueError, struct.error):
+            # an empty or truncated file
+            self.close()
+            raise ValueError("{} is not a model store".format(store_path))
+        if header[0] != STORE_MAGIC or header[1] != _STORE_VERSION:
+            self.close()
+            raise ValueError("{} is not a model store".format(store_path))
+        string_count, model_count, node_count, edge_count = header[2:6]
+        offsets: tuple = header[6:]
+        view: memoryview = memoryview(self._buffer)
+        self._string_offsets = view[offsets[0]:offsets[0] + 8 * (string_count + 1)].cast("Q")
+        self._string_data = view[offsets[1]:offsets[1] + self._string_offsets[string_count]]
+        self._models = view[offsets[2]:offsets[2] + 8 * model_count].cast("I")
+        self._nodes = view[offsets[3]:offsets[3] + 16 * node_count].cast("I")
+        self._string_nodes = view[offsets[4]:offsets[4] + 4 * string_count].cast("i")
+        self._edge_offsets = view[offsets[5]:offsets[5] + 8 * (node_count + 1)].cast("Q")
+        self._edge_targets = view[offsets[6]:offsets[6] + 4 * edge_count].cast("I")
+        self._ref_offsets = view[offsets[7]:offsets[7] + 8 * (string_count + 1)].cast("Q")
+        self._ref_nodes = view[offsets[8]:offsets[8] + 4 * edge_count].cast("I")
+        self._model_nodes = view[offsets[9]:offsets[9] + 8 * model_count].cast("I")
+        self._views = [view, self._string_offsets, self._string_data, self._models, self._nodes, self._string_nodes,
+                       self._edge_offsets, self._edge_targets, self._ref_offsets, self._ref_nodes, self._model_nodes]
+
+    def __reduce__(self):
+        # worker processes reopen the same file, the operating system shares the mapped pages between them
+        return ModelStore, (self._path,)
+
+    def close(self):
+        for view in self._views or []:
+            view.release()
+        self._views = None
+        if self._buffer:
+            self._buffer.close()
+        self._buffer = None
+        self._file.close()
+
+    def get_path(self) -> str:
+        return self._path
+
+    def is_current(self, model_file: str) -> bool:
+        """Whether a model file is as it was when the store was written, the models written since are not in it"""
+        try:
+            return stat(model_file).st_mtime_ns <= self._mtime_ns
+        except OSError:
+            return False
+
+    def get_string(self, index: int) -> str:
+        return str(self._string_data[self._string_offsets[index]:self._string_offsets[index + 1]], "utf-8")
+
+    def find_string(self, value: str) -> int:
+        target: bytes = value.encode("utf-8")
+        low, high = 0, len(self._string_offsets) - 1
+        while low < high:
+            mid: int = (low + high) // 2
+            if self._string_data[self._string_offsets[mid]:self._string_offsets[mid + 1]].tobytes() < target:
+                low = mid + 1
+            else:
+                high = mid
+        if low < len(self._string_offsets) - 1 and self.get_string(low) == value:
+            return low
+        return -1
+
+    def _find_model(self, model_id: str) -> int:
+        string: int = self.find_string(model_id)
+        low, high = 0, len(self._models) // 2
+        while string != -1 and low < high:
+            mid: int = (low + high) // 2
+            if self._models[2 * mid] < string:
+                low = mid + 1
+            else:
+                high = mid
+        if string != -1 and low < len(self._models) // 2 and self._models[2 * low] == string:
+            return low
+        return -1
+
+    def has_model(self, model_id: str) -> bool:
+        return self._find_model(model_id) != -1
+
+    def _get_node(self, global_id: str) -> int:
+        string: int = self.find_string(global_id)
+        return self._string_nodes[string] if string != -1 else _NO_NODE
+
+    def _get_model_file(self, model: int) -> str:
+        return path.join(self._dir, self.get_string(self._models[2 * model + 1]))
+
+    def get_model(self, global_id: str) -> Tuple[str, str]:
+        """Returns the model id and model file that defines a global id, or the model the global id names"""
+        parts: List[str] = global_id.split(".")
+        for end in range(len(parts), 0, -1):
+            prefix: str = ".".join(parts[:end])
+            node: int = self._get_node(prefix)
+            model: int = self._nodes[4 * node + 2] if node != _NO_NODE else self._find_model(prefix)
+            if model != -1:
+                return self.get_string(self._models[2 * model]), self._get_model_file(model)
+        return None, None
+
+    def get_references(self, global_id: str) -> List[str]:
+        """The global ids directly referenced from the body of an entity"""
+        node: int = self._get_node(global_id)
+        if node == _NO_NODE:
+            return []
+        return [self.get_string(self._edge_targets[e]) for e in
+                range(self._edge_offsets[node], self._edge_offsets[node + 1])]
+
+    def _referencing_nodes(self, global_id: str) -> List[int]:
+        string: int = self.find_string(global_id)
+        if string == -1:
+            return []
+        # the list keeps the order nodes are met in, the set what was met
+        nodes: list = []
+        seen: set = set()
+        for e in range(self._ref_offsets[string], self._ref_offsets[string + 1]):
+            node: int = self._ref_nodes[e]
+            # entities enclosing a reference reference it too, matching Navigator._find_all_references
+            while node != _NO_NODE and node not in seen:
+                seen.add(node)
+                nodes.append(node)
+                node = self._nodes[4 * node + 3] - 1
+        return nodes
+
+    def get_module_functions(self, model_id: str) -> List[str]:
+        """The functions defined in a model, including methods and nested functions, in the order they are defined"""
+        model: int = self._find_model(model_id)
+        if model == -1:
+            return []
+        first, count = self._model_nodes[2 * model], self._model_nodes[2 * model + 1]
+        return [self.get_string(self._nodes[4 * node]) for node in range(first, first + count) if
+                self._nodes[4 * node + 1] == NodeKind.FUNCTION]
+
+    def get_referencing_entities(self, global_id: str) -> List[str]:
+        return [self.get_string(self._nodes[4 * node]) for node in self._referencing_nodes(global_id)]
+
+    def get_referencing_functions(self, global_id: str) -> List[str]:
+        return [self.get_string(self._nodes[4 * node]) for node in self._referencing_nodes(global_id) if
+                self._nodes[4 * node + 1] == NodeKind.FUNCTION]
+
+    def _referencing_models(self, global_id: str) -> List[int]:
+        # dict keys keep the order the models are met in
+        return list(dict.fromkeys(self._nodes[4 * node + 2] for node in self._referencing_nodes(global_id)))
+
+    def get_referencing_model_files(self, global_id: str) -> List[str]:
+        return [self._get_model_file(model) for model in self._referencing_models(global_id)]
+
+    def get_referencing_model_ids(self, global_id: str) -> List[str]:
+        return [self.get_string(self._models[2 * model]) for model in self._referencing_models(global_id)]
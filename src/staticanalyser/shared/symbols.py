@@ -0,0 +1,49 @@
+# Interning of the strings of loaded models. The same global ids, references and module prefixes are repeated across
+# every model that mentions them, a symbol table keeps one copy of each so they share memory and compare by identity
+from typing import Dict, List, Union
+
+# function bodies and other long texts are rarely repeated, they are left as they are
+MAX_SYMBOL_LENGTH: int = 256
+NO_SYMBOL: int = -1
+
+
+class SymbolTable(object):
+    """Numbers every distinct string it interns, from 0 in the order they are met, and keeps one copy of each"""
+    _symbols: Dict[str, int] = None
+    _strings: List[str] = None
+
+    def __init__(self):
+        self._symbols = {}
+        self._strings = []
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+    def intern(self, value: str) -> str:
+        """The copy of a string kept in the table, added to it first if it has not been met"""
+        symbol: int = self._symbols.get(value)
+        if symbol is None:
+            symbol = self._symbols[value] = len(self._strings)
+            self._strings.append(value)
+        return self._strings[symbol]
+
+    def get_symbol(self, value: str) -> int:
+        """The number of a string, NO_SYMBOL if it has not been interned"""
+        return self._symbols.get(value, NO_SYMBOL)
+
+    def get_string(self, symbol: int) -> str:
+        return self._strings[symbol]
+
+    def intern_model(self, data: Union[dict, list]) -> Union[dict, list]:
+        """Interns the short strings of a model read from its file in place, and returns it"""
+        pending: list = [data]
+        while pending:
+            d = pending.pop()
+            items = d.items() if type(d) is dict else enumerate(d)
+            for k, v in list(items):
+                if type(v) is str:
+                    if len(v) <= MAX_SYMBOL_LENGTH:
+                        d[k] = self.intern(v)
+                elif type(v) in (dict, list):
+                    pending.append(v)
+        return data
@@ -0,0 +1,372 @@
+# A python3 frontend that selects with the parser of the running interpreter instead of the selector regexes. It
+# builds the same models the regexes do, so what it writes is read like any other model
+import ast
+import logging
+import time
+from os import path
+from typing import Iterator, List, Union
+
+import staticanalyser.shared.model as model
+from staticanalyser.shared import config
+from staticanalyser.shared.source import SourceMap
+from staticanalyser.translator.descriptor import Descriptor
+
+# the name the regex frontend gives the body of an if __name__ == "__main__" block
+MAIN_FUNCTION: str = "sa_python_main"
+
+
+class AstDescriptor(Descriptor):
+    """Selects python3 sources with the ast module. Parsing is linear in the size of a source, so sources are neither
+    preprocessed nor split into chunks, and nothing is selected twice. Sources the interpreter can't parse, such as
+    python 2 modules in the global sources, are selected with the regexes"""
+
+    def select_source(self, file: str, file_contents: str, source_map: SourceMap, prefix: str) -> dict:
+        phase_start: float = time.perf_counter()
+        try:
+            tree: ast.Module = ast.parse(file_contents)
+        except (SyntaxError, ValueError) as e:
+            logging.warning("Can't parse {} ({}), selecting it with the regexes".format(file, e))
+            return super(AstDescriptor, self).select_source(file, file_contents, source_map, prefix)
+        package: bool = path.splitext(path.basename(file))[0] == config.get_language_package_module(self._lang)
+        selected_entities: dict = _ModuleSelection(self._lang, file_contents, prefix, package).select(tree)
+        model.ModelOperations.locate(selected_entities, source_map)
+        self._record_phase("select", phase_start)
+        return selected_entities
+
+    def deduplicate(self, selected_entities: dict):
+        pass
+
+
+def _is_main_guard(node: ast.stmt) -> bool:
+    if type(node) is not ast.If or type(node.test) is not ast.Compare or len(node.test.comparators) != 1 or \
+            type(node.test.ops[0]) is not ast.Eq:
+        return False
+    operands: list = [node.test.left, node.test.comparators[0]]
+    return any(type(o) is ast.Name and o.id == "__name__" for o in operands) and \
+        any(type(o) is ast.Constant and o.value == "__main__" for o in operands)
+
+
+def _blocks(node: ast.stmt) -> List[list]:
+    """The blocks of statements nested in a compound statement, in source order"""
+    res: list = [getattr(node, "body", None)]
+    res += [h.body for h in getattr(node, "handlers", [])] + [c.body for c in getattr(node, "cases", [])]
+    res += [getattr(node, "orelse", None), getattr(node, "finalbody", None)]
+    return [b for b in res if type(b) is list and b]
+
+
+def _calls(node: ast.AST) -> Iterator[ast.Call]:
+    """The calls in a node in the order they are made, each after the calls in its arguments"""
+    for child in ast.iter_child_nodes(node):
+        yield from _calls(child)
+    if type(node) is ast.Call:
+        yield node
+
+
+class _ModuleSelection(object):
+    """Builds the models of one parsed module. Spans are offsets in the source, which is what locate expects for a
+    source that wasn't preprocessed"""
+    _lang: str = None
+    _text: str = None
+    _prefix: str = None
+    _package: bool = False
+    _line_starts: list = None
+    _modules: dict = None
+
+    def __init__(self, language: str, text: str, prefix: str, package: bool):
+        self._lang = language
+        self._text = text
+        self._prefix = prefix
+        self._package = package
+        self._line_starts = [0]
+        line_end: int = text.find("\n")
+        while line_end != -1:
+            self._line_starts.append(line_end + 1)
+            line_end = text.find("\n", line_end + 1)
+        self._modules = {}
+
+    def select(self, tree: ast.Module) -> dict:
+        res: dict = {"functions": [], "classes": [], "dependencies": self._dependencies(tree)}
+        self._definitions(tree.body, res)
+        return res
+
+    def _offset(self, line: int, column: int) -> int:
+        # ast columns count utf-8 bytes
+        start: int = self._line_starts[line - 1]
+        if self._text[start:start + column].isascii():
+            return start + column
+        return start + len(self._text[start:start + column].encode("utf-8")[:column].decode("utf-8", "ignore"))
+
+    def _span(self, node: ast.AST) -> tuple:
+        return self._offset(node.lineno, node.col_offset), self._offset(node.end_lineno, node.end_col_offset)
+
+    def _segment(self, node: ast.AST) -> str:
+        if node is None:
+            return ""
+        start, end = self._span(node)
+        return self._text[start:end]
+
+    def _located(self, entity: model.ModelGeneric, node: ast.AST, end_node: ast.AST = None) -> model.ModelGeneric:
+        entity.set_span(self._span(node)[0], self._span(end_node or node)[1])
+        return entity
+
+    def _header(self, node: ast.stmt, children: list) -> str:
+        """The text of a compound statement up to the colon ending its header"""
+        start: int = self._span(node)[0]
+        end: int = max([self._span(c)[1] for c in children if c is not None] + [start])
+        return self._text[start:self._text.index(":", end) + 1]
+
+    def _body(self, statements: list) -> str:
+        """The text of a block, with the indentation of its first line"""
+        start, end = self._span(statements[0])[0], self._span(statements[-1])[1]
+        line_start: int = self._line_starts[statements[0].lineno - 1]
+        return self._text[line_start if self._text[line_start:start].isspace() else start:end]
+
+    def _dependencies(self, tree: ast.Module) -> list:
+        # imports are dependencies wherever they are in the module, like the import selectors find them
+        res: list = []
+        imports: list = sorted((n for n in ast.walk(tree) if type(n) in (ast.Import, ast.ImportFrom)),
+                               key=lambda n: (n.lineno, n.col_offset))
+        for node in imports:
+            if type(node) is ast.Import:
+                for alias in node.names:
+                    bound: str = alias.asname or alias.name.split(".")[0]
+                    self._modules[bound] = alias.name if alias.asname else bound
+                    res.append(self._dependency(node, alias.name, [alias.name]))
+            else:
+                source: str = self._absolute_module(node)
+                for alias in node.names:
+                    if alias.asname and not source.startswith("."):
+                        # the resolver only knows imported names, so calls to an alias are qualified here
+                        self._modules[alias.asname] = "{}.{}".format(source, alias.name)
+                res.append(self._dependency(node, source, [alias.name for alias in node.names]))
+        return res
+
+    def _dependency(self, node: ast.stmt, source: str, provides: list) -> model.DependencyModel:
+        d: model.DependencyModel = model.DependencyModel(self._lang, self._prefix, {"source": source})
+        d.add_subselection({"provided_dependencies": [model.BasicString(self._lang, self._prefix, {"value": p})
+                                                      for p in provides]})
+        return self._located(d, node)
+
+    def _absolute_module(self, node: ast.ImportFrom) -> str:
+        if not node.level:
+            return node.module
+        package: list = self._prefix.split(".")[1:]
+        if not self._package:
+            package = package[:-1]
+        if node.level - 1 > len(package):
+            return "." * node.level + (node.module or "")
+        package = package[:len(package) - node.level + 1]
+        return ".".join(package + ([node.module] if node.module else []))
+
+    def _definitions(self, statements: list, res: dict):
+        """Selects the functions and classes of a module, including those defined in its compound statements"""
+        for node in statements:
+            if type(node) in (ast.FunctionDef, ast.AsyncFunctionDef):
+                res["functions"].append(self._function(node, self._prefix))
+            elif type(node) is ast.ClassDef:
+                res["classes"].append(self._class(node, self._prefix))
+            elif _is_main_guard(node):
+                res["functions"].append(self._main_function(node))
+                self._definitions(node.orelse, res)
+            else:
+                for block in _blocks(node):
+                    self._definitions(block, res)
+
+    def _class(self, node: ast.ClassDef, prefix: str) -> model.ClassModel:
+        klazz: model.ClassModel = model.ClassModel(self._lang, prefix, {"name": node.name,
+                                                                         "body": self._body(node.body)})
+        inner_prefix: str = "{}.{}".format(prefix, node.name)
+        attributes: list = []
+        for st in node.body:
+            if type(st) is ast.Assign:
+                attributes += [self._variable(t, inner_prefix, t.id, None, st.value, st) for t in st.targets if
+                               type(t) is ast.Name]
+            elif type(st) is ast.AnnAssign and type(st.target) is ast.Name:
+                attributes.append(self._variable(st.target, inner_prefix, st.target.id, st.annotation, st.value, st))
+        klazz.add_subselection({
+            "class": [self._class(st, inner_prefix) for st in node.body if type(st) is ast.ClassDef],
+            "attribute": attributes,
+            "function": [self._function(st, inner_prefix) for st in node.body if
+                         type(st) in (ast.FunctionDef, ast.AsyncFunctionDef)]
+        })
+        return self._located(klazz, node)
+
+    def _variable(self, node: ast.AST, prefix: str, name: Union[str, None], annotation: ast.AST, value: ast.AST,
+                  end_node: ast.AST = None) -> model.VariableModel:
+        return self._located(model.VariableModel(self._lang, prefix, {
+            "name": name,
+            "type": self._segment(annotation),
+            "initial_value": self._segment(value)
+        }), node, end_node)
+
+    def _parameters(self, arguments: ast.arguments, prefix: str) -> list:
+        positional: list = arguments.posonlyargs + arguments.args
+        defaults: list = [None] * (len(positional) - len(arguments.defaults)) + arguments.defaults
+        res: list = [self._variable(a, prefix, a.arg, a.annotation, d, d) for a, d in zip(positional, defaults)]
+        if arguments.vararg:
+            res.append(self._variable(arguments.vararg, prefix, arguments.vararg.arg, arguments.vararg.annotation,
+                                      None))
+        res += [self._variable(a, prefix, a.arg, a.annotation, d, d) for a, d in
+                zip(arguments.kwonlyargs, arguments.kw_defaults)]
+        if arguments.kwarg:
+            res.append(self._variable(arguments.kwarg, prefix, arguments.kwarg.arg, arguments.kwarg.annotation, None))
+        return res
+
+    def _function(self, node: Union[ast.FunctionDef, ast.AsyncFunctionDef], prefix: str) -> model.FunctionModel:
+        arguments: ast.arguments = node.args
+        header_children: list = arguments.posonlyargs + arguments.args + arguments.kwonlyargs + \
+            arguments.defaults + arguments.kw_defaults + [arguments.vararg, arguments.kwarg, node.returns] + \
+            getattr(node, "type_params", [])
+        func: model.FunctionModel = model.FunctionModel(self._lang, prefix, {
+            "name": node.name,
+            "body": self._body(node.body),
+            "declaration": self._header(node, header_children)
+        })
+        inner_prefix: str = "{}.{}".format(prefix, node.name)
+        return self._located(self._add_block(func, {"parameter": self._parameters(arguments, inner_prefix)},
+                                             node.body, inner_prefix), node)
+
+    def _main_function(self, node: ast.If) -> model.FunctionModel:
+        func: model.FunctionModel = model.FunctionModel(self._lang, self._prefix, {
+            "name": MAIN_FUNCTION,
+            "body": self._body(node.body),
+            "declaration": "def {}():".format(MAIN_FUNCTION)
+        })
+        inner_prefix: str = "{}.{}".format(self._prefix, MAIN_FUNCTION)
+        return self._located(self._add_block(func, {"parameter": []}, node.body, inner_prefix), node,
+                             node.body[-1])
+
+    def _add_block(self, entity: model.ControlFlowGeneric, sub_selection: dict, statements: list,
+                   prefix: str) -> model.ControlFlowGeneric:
+        # the blocks are nested in the statements already, the other keys only stop the models pruning them
+        sub_selection.update({"statement": self._block(statements, prefix), "for_loop": [], "while_loop": [],
+                              "if_condition": [], "function": []})
+        entity.add_subselection(sub_selection)
+        return entity
+
+    def _block(self, statements: list, prefix: str) -> list:
+        res: list = []
+        for st in statements:
+            res += self._statement(st, prefix)
+        return res
+
+    def _statement(self, node: ast.stmt, prefix: str) -> list:
+        """The models of a statement in a block, preceded by the calls made evaluating its header"""
+        node_type: type = type(node)
+        if node_type in (ast.FunctionDef, ast.AsyncFunctionDef):
+            return [self._function(node, prefix)] + self._decorations(node, prefix)
+        if node_type is ast.ClassDef:
+            return [self._class(node, prefix)]
+        if node_type is ast.If:
+            condition: model.ConditionModel = model.ConditionModel(self._lang, prefix, {
+                "condition": self._segment(node.test),
+                "true_block": self._body(node.body),
+                "false_block": self._body(node.orelse) if node.orelse else ""
+            })
+            condition.add_subselection({"statement": {"true_block": self._block(node.body, prefix),
+                                                      "false_block": self._block(node.orelse, prefix)}})
+            return self._call_statements(node.test, prefix) + [self._located(condition, node)]
+        if node_type in (ast.For, ast.AsyncFor):
+            loop: model.ForLoopModel = model.ForLoopModel(self._lang, prefix, {
+                "loop": self._header(node, [node.target, node.iter]),
+                "body": self._body(node.body)
+            })
+            return self._call_statements(node.iter, prefix) + \
+                [self._located(self._add_block(loop, {}, node.body, prefix), node, node.body[-1])] + \
+                self._block(node.orelse, prefix)
+        if node_type is ast.While:
+            loop: model.WhileLoopModel = model.WhileLoopModel(self._lang, prefix, {
+                "loop": self._header(node, [node.test]),
+                "body": self._body(node.body),
+                "condition": self._segment(node.test)
+            })
+            return self._call_statements(node.test, prefix) + \
+                [self._located(self._add_block(loop, {}, node.body, prefix), node, node.body[-1])] + \
+                self._block(node.orelse, prefix)
+        blocks: list = _blocks(node)
+        if blocks:
+            # with, try and match run their blocks in line
+            res: list = []
+            for header in [i.context_expr for i in getattr(node, "items", [])] + [getattr(node, "subject", None)]:
+                if header is not None:
+                    res += self._call_statements(header, prefix)
+            for block in blocks:
+                res += self._block(block, prefix)
+            return res
+        return self._simple_statement(node, prefix)
+
+    def _simple_statement(self, node: ast.stmt, prefix: str) -> list:
+        lhs: str = ""
+        value: ast.AST = getattr(node, "value", None)
+        if type(node) is ast.Return:
+            lhs = "return"
+        elif type(node) is ast.Assign:
+            lhs = self._segment(node.targets[0])
+        elif type(node) in (ast.AugAssign, ast.AnnAssign):
+            lhs = self._segment(node.target)
+        elif type(node) is not ast.Expr:
+            value = None
+        calls: list = list(_calls(node))
+        if type(value) is ast.Await:
+            value = value.value
+        if type(value) is ast.Call and calls and calls[-1] is value:
+            return self._call_statements(calls[:-1], prefix) + [self._located(model.StatementModel(
+                self._lang, prefix, {"lhs": lhs, "rhs": self._reference(value, prefix)}), node)]
+        statement: model.StatementModel = model.StatementModel(self._lang, prefix, {
+            "lhs": lhs,
+            "rhs": self._segment(value) if value is not None or lhs else self._segment(node)
+        })
+        return self._call_statements(calls, prefix) + [self._located(statement, node)]
+
+    def _call_statements(self, calls: Union[ast.AST, list], prefix: str) -> list:
+        """A statement for each call made evaluating a node, or for each of a list of calls"""
+        return [self._located(model.StatementModel(self._lang, prefix, {
+            "lhs": "",
+            "rhs": self._reference(c, prefix)
+        }), c) for c in (calls if type(calls) is list else _calls(calls))]
+
+    def _decorations(self, node: Union[ast.FunctionDef, ast.AsyncFunctionDef], prefix: str) -> list:
+        """Statements for decorating a nested function, which the regexes write out as name = decorator(name)"""
+        res: list = []
+        for decorator in node.decorator_list:
+            res += self._call_statements(decorator, prefix)
+            if type(decorator) is not ast.Call:
+                reference: model.ReferenceModel = self._reference(decorator, prefix)
+                reference.add_subselection({"parameter_call": [
+                    self._located(model.VariableModel(self._lang, prefix, {"initial_value": node.name}), node)]})
+                res.append(self._located(model.StatementModel(self._lang, prefix, {
+                    "lhs": node.name,
+                    "rhs": reference
+                }), decorator))
+        return res
+
+    def _qualify(self, func: ast.AST) -> Union[str, None]:
+        """The global id of a call through an imported module or alias, if it is one"""
+        parts: list = []
+        while type(func) is ast.Attribute:
+            parts.insert(0, func.attr)
+            func = func.value
+        if type(func) is not ast.Name or func.id not in self._modules or (not parts and "." not in
+                                                                            self._modules[func.id]):
+            return None
+        return ".".join([self._lang, self._modules[func.id]] + parts)
+
+    def _reference(self, call: Union[ast.Call, ast.AST], prefix: str) -> model.ReferenceModel:
+        """A reference to what a call calls, or to a function or class used as a decorator"""
+        func: ast.AST = call.func if type(call) is ast.Call else call
+        target: str = ""
+        name: str = self._qualify(func)
+        if name is None and type(func) is ast.Attribute:
+            # methods on self are resolved against the class, like the regexes resolve them
+            if type(func.value) is ast.Name and func.value.id == "self":
+                name = func.attr
+            else:
+                name, target = self._segment(func), self._segment(func.value)
+        elif name is None:
+            name = self._segment(func)
+        reference: model.ReferenceModel = model.ReferenceModel(self._lang, prefix, {"call": name, "target": target})
+        if type(call) is ast.Call:
+            parameters: list = [self._variable(a, prefix, None, None, a) for a in call.args]
+            parameters += [self._variable(k, prefix, k.arg, None, k.value) for k in call.keywords]
+            reference.add_subselection({"parameter_call": parameters})
+        return self._located(reference, call)
@@ -0,0 +1,143 @@
+# A content addressed cache of selected entities. Functions and classes are keyed on the language bundle they were
+# selected with and the text the selector captured for them, so unchanged entities of a modified file and identical
+# entities of vendored copies are only ever selected once. Entries are pickled, so a cache dir other users can write to
+# is never read
+import os
+import pickle
+from hashlib import md5
+from os import path, replace, getpid, stat, utime, remove
+from pathlib import Path
+from typing import Union
+import logging
+
+import staticanalyser.shared.model as model
+
+# bump whenever the model classes change in a way that makes older cache entries unusable
+CACHE_VERSION: int = 2
+# the size prune_cache brings a cache dir down to by default
+CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+
+
+def rebase_prefix(entity: Union[model.ModelGeneric, list, dict], old_prefix: str, new_prefix: str):
+    """Moves the global ids of an entity and everything nested in it from one module prefix to another"""
+    if type(entity) is list:
+        for e in entity:
+            rebase_prefix(e, old_prefix, new_prefix)
+    elif type(entity) is dict:
+        for e in entity.values():
+            rebase_prefix(e, old_prefix, new_prefix)
+    elif issubclass(type(entity), model.ModelGeneric):
+        for k in ("_prefix", "_global_identifier"):
+            value: str = entity.__dict__.get(k)
+            if type(value) is str and (value == old_prefix or value.startswith("{}.".format(old_prefix))):
+                entity.__dict__[k] = new_prefix + value[len(old_prefix):]
+        for k in entity.__dict__.keys():
+            if type(entity.__dict__[k]) in (list, dict) or issubclass(type(entity.__dict__[k]), model.ModelGeneric):
+                rebase_prefix(entity.__dict__[k], old_prefix, new_prefix)
+
+
+def _is_private_dir(dir_path: str) -> bool:
+    """Whether only the current user can write to a dir, always on platforms without user ids"""
+    if not hasattr(os, "getuid"):
+        return True
+    dir_stat = stat(dir_path)
+    return dir_stat.st_uid == os.getuid() and not dir_stat.st_mode & 0o022
+
+
+def prune_cache(cache_dir: str, max_bytes: int = CACHE_MAX_BYTES) -> int:
+    """Removes the least recently used entries of every language in a cache dir until they take at most max_bytes,
+    returns how many were removed"""
+    entries: list = []
+    for entry in Path(cache_dir).glob("*/*/*.pickle"):
+        try:
+            entry_stat = stat(str(entry))
+        except OSError:
+            continue
+        entries.append((entry_stat.st_mtime, entry_stat.st_size, str(entry)))
+    total: int = sum(size for _, size, _ in entries)
+    removed: int = 0
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            remove(entry)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+class SelectionCache(object):
+    _cache_dir: str = None
+    _bundle_hash: str = None
+    _hits: int = None
+    _misses: int = None
+    _private: bool = None
+
+    def __init__(self, cache_dir: str, bundle_hash: str):
+        self._cache_dir = cache_dir
+        self._bundle_hash = bundle_hash
+        self._hits = 0
+        self._misses = 0
+
+    def get_key(self, selector_name: str, artefact_info: dict) -> str:
+        key = md5("{}:{}:{}".format(CACHE_VERSION, self._bundle_hash, selector_name).encode("utf-8"))
+        for k in sorted(artefact_info.keys()):
+            key.update("\0{}\0{}".format(k, artefact_info[k]).encode("utf-8"))
+        return key.hexdigest()
+
+    def get_cache_dir(self) -> str:
+        return self._cache_dir
+
+    def _get_entry_path(self, key: str) -> str:
+        return path.join(self._cache_dir, key[:2], "{}.pickle".format(key))
+
+    def _is_usable(self) -> bool:
+        if self._private is None:
+            try:
+                Path(self._cache_dir).mkdir(mode=0o700, parents=True, exist_ok=True)
+                self._private = _is_private_dir(self._cache_dir) and _is_private_dir(path.dirname(self._cache_dir))
+            except OSError:
+                self._private = False
+            if not self._private:
+                logging.warning("Selection cache {} is not private to this user, it is not used".format(
+                    self._cache_dir))
+        return self._private
+
+    def get(self, key: str, prefix: str) -> model.ModelGeneric:
+        if not self._is_usable():
+            self._misses += 1
+            return None
+        entry_path: str = self._get_entry_path(key)
+        try:
+            with open(entry_path, "rb") as f:
+                cached_prefix, entity = pickle.load(f)
+            # the entries used last are the ones prune_cache keeps
+            utime(entry_path)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+            self._misses += 1
+            return None
+        self._hits += 1
+        if cached_prefix != prefix:
+            rebase_prefix(entity, cached_prefix, prefix)
+        return entity
+
+    def put(self, key: str, prefix: str, entity: model.ModelGeneric):
+        if not self._is_usable():
+            return
+        entry_path: str = self._get_entry_path(key)
+        try:
+            Path(path.dirname(entry_path)).mkdir(parents=True, exist_ok=True)
+            tmp_path: str = "{}.{}.tmp".format(entry_path, getpid())
+            with open(tmp_path, "wb") as f:
+                pickle.dump((prefix, entity), f, protocol=pickle.HIGHEST_PROTOCOL)
+            replace(tmp_path, entry_path)
+        except OSError:
+            logging.warning("Could not write selection cache entry {}".format(entry_path))
+
+    def get_stats(self) -> dict:
+        return {
+            "hits": self._hits,
+            "misses": self._misses
+        }
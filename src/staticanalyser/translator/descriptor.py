@@ -1,12 +1,18 @@
 import copy
 import datetime
+import importlib
+import signal
+import threading
+import time
 from hashlib import md5
 from enum import Enum
-from os import path
+from os import path, replace, remove, getpid
 from pathlib import Path
 
 import sys
-from typing import Union, Iterator
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+from typing import Union, Iterator, List
 
 from jsonschema import validate
 
@@ -15,13 +21,28 @@ import toml
 from staticanalyser.shared import config
 from staticanalyser.shared.platform_constants import LANGS_DIR, PATH_SEPARATOR
 import staticanalyser.shared.model as model
+import staticanalyser.shared.source as source
+from staticanalyser.shared.source import TextSpan, SourceMap
+from staticanalyser.shared.locking import ModelLock
+from staticanalyser.shared.progress import progress
+from staticanalyser.shared.bloom import ModelFilter
 from staticanalyser.regexbuilder import *
+from staticanalyser.regexbuilder.literals import required_literals, may_match
+from staticanalyser.translator.cache import SelectionCache
 import re
 import json
 import logging
 import staticanalyser.shared.config
 
 
+# the frontends a language can select its sources with, by the name its [info] gives. A language can also name the
+# class of a frontend of its own as "module:Class"
+FRONTENDS: dict = {
+    "regex": "staticanalyser.translator.descriptor:Descriptor",
+    "ast": "staticanalyser.translator.ast_frontend:AstDescriptor"
+}
+
+
 class RegexBuilderFactory(object):
     _builders: dict = {}
 
@@ -62,12 +83,12 @@ class Directive(object):
     def __str__(self):
         return "{}: {}".format(self._name, self._description)
 
-    def apply(self, file_contents: str) -> str:
+    def apply(self, file_contents: str, source_map: SourceMap = None) -> str:
         r: RegexBuilder = RegexBuilderFactory.get_builder(self._lang)
         logging.info("Applying {}".format(self._name))
         for v in self._variations:
             logging.debug("{} regex: {}".format(self._name, r.build(v.get("regex_format_string"))))
-            file_contents = re.sub(
+            file_contents = (source_map.sub if source_map else re.sub)(
                 r.build(v.get("regex_format_string")),
                 v.get("regex_replace"),
                 file_contents
@@ -75,6 +96,148 @@ class Directive(object):
         return file_contents
 
 
+class SelectorTimeout(Exception):
+    pass
+
+
+class RegexGuard(object):
+    """Puts a time budget on every application of a selector regex. Patterns with nested quantifiers can backtrack
+    for minutes on some inputs; when the budget runs out the selector keeps what it matched so far, and the selector,
+    file and offset the engine was stuck after are recorded so the pattern can be fixed. The budget is enforced with
+    SIGALRM, which is only available on posix in the main thread. Elsewhere overruns are recorded but not stopped.
+    The file and the incidents recorded for it are kept per thread, as threads translate files side by side"""
+    _budget: float = None
+    _files: threading.local = threading.local()
+    _active: bool = False
+    _warned_unarmed: bool = False
+
+    @staticmethod
+    def configure(budget: float):
+        RegexGuard._budget = budget if budget and budget > 0 else None
+
+    @staticmethod
+    def set_source_file(source_file: str):
+        """Starts recording the incidents of source_file, dropping any left by a file that failed to translate"""
+        RegexGuard._files.source_file = source_file
+        RegexGuard._files.incidents = []
+
+    @staticmethod
+    def get_source_file() -> str:
+        return getattr(RegexGuard._files, "source_file", None)
+
+    @staticmethod
+    def add_incident(incident: dict):
+        if not hasattr(RegexGuard._files, "incidents"):
+            RegexGuard._files.incidents = []
+        RegexGuard._files.incidents.append(incident)
+
+    @staticmethod
+    def take_incidents() -> list:
+        incidents: list = getattr(RegexGuard._files, "incidents", [])
+        RegexGuard._files.incidents = []
+        return incidents
+
+    @staticmethod
+    def _on_alarm(signum, frame):
+        if RegexGuard._active:
+            raise SelectorTimeout()
+
+    @staticmethod
+    def _can_interrupt() -> bool:
+        if hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread():
+            return True
+        if not RegexGuard._warned_unarmed:
+            RegexGuard._warned_unarmed = True
+            logging.warning("Selector budgets can only stop selectors on posix in the main thread, selectors that "
+                            "exceed theirs in {} are recorded but not stopped".format(threading.current_thread().name))
+        return False
+
+    @staticmethod
+    def _record(selector_name: str, offset: int, seconds: float, skipped: bool):
+        incident: dict = {
+            "selector": selector_name,
+            "file": RegexGuard.get_source_file(),
+            "offset": offset,
+            "seconds": round(seconds, 3),
+            "skipped": skipped
+        }
+        logging.warning("Selector {} exceeded its {}s budget in {} after offset {}{}".format(
+            selector_name, RegexGuard._budget, RegexGuard.get_source_file(), offset,
+            ", skipping the rest of the text" if skipped else ""))
+        RegexGuard.add_incident(incident)
+
+    @staticmethod
+    def finditer(regex: str, text: str, selector_name: str, start: int = 0, end: int = None) -> list:
+        """The matches of regex in text[start:end] with re.M that were found within the budget"""
+        res: list = []
+        offset: int = start
+        started: float = time.perf_counter()
+        interruptible: bool = RegexGuard._budget is not None and RegexGuard._can_interrupt()
+        previous_handler = None
+        if interruptible:
+            previous_handler = signal.signal(signal.SIGALRM, RegexGuard._on_alarm)
+            RegexGuard._active = True
+            signal.setitimer(signal.ITIMER_REAL, RegexGuard._budget)
+        try:
+            for m in re.compile(regex, flags=re.M).finditer(text, start, len(text) if end is None else end):
+                res.append(m)
+                offset = m.end()
+        except SelectorTimeout:
+            RegexGuard._record(selector_name, offset, time.perf_counter() - started, True)
+            return res
+        finally:
+            if interruptible:
+                RegexGuard._active = False
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous_handler)
+        if RegexGuard._budget is not None and time.perf_counter() - started > RegexGuard._budget:
+            RegexGuard._record(selector_name, offset, time.perf_counter() - started, False)
+        return res
+
+    @staticmethod
+    def findall(regex: str, text: str, selector_name: str) -> list:
+        """Equivalent to re.findall(regex, text, flags=re.M) within the budget"""
+        return [_findall_result(m) for m in RegexGuard.finditer(regex, text, selector_name)]
+
+
+def _findall_result(m, span_groups: set = frozenset()) -> Union[str, tuple]:
+    """The element re.findall would have produced for a match. Groups in span_groups that cover several lines from
+    the start of a line are kept as spans, a regex searching such a span sees the same text it would in a copy"""
+    if m.re.groups == 0:
+        return m.group(0)
+    if m.re.groups == 1:
+        return m.group(1) or ""
+    res: list = []
+    for i in range(m.re.groups):
+        start, end = m.span(i + 1)
+        if start == -1:
+            res.append("")
+        elif i in span_groups and (start == 0 or m.string[start - 1] == "\n") and m.string.find("\n", start, end) >= 0:
+            res.append(TextSpan(m.string, start, end))
+        else:
+            res.append(m.group(i + 1))
+    return tuple(res)
+
+
+def _group_offsets(m, variation: dict, base: int) -> dict:
+    """The offsets in the preprocessed file of the values a variation takes from a match"""
+    res: dict = {}
+    for k, group in variation.items():
+        if type(group) is int:
+            start: int = m.start(group + 1) if m.re.groups > 1 and group < m.re.groups else -1
+            res[k] = base + (start if start != -1 else m.start())
+    return res
+
+
+def _trim(text: str, start: int, end: int, base: int) -> tuple:
+    """The range of a match without its leading and trailing whitespace, as offsets in the preprocessed file"""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return base + start, base + end
+
+
 class Selector(object):
     _lang: str = None
     _registered_selectors: dict = {}
@@ -85,6 +248,11 @@ class Selector(object):
     _variations: list = None
     _top_level_selector: bool = None
     _model_type: type = None
+    _search_texts: set = None
+    # the literals each built regex needs, and per selector how often a variation was due to run and how often it
+    # was skipped because the text lacked them
+    _required_literals: dict = {}
+    _prefilter_stats: dict = {}
 
     @staticmethod
     def get_selector(language: str, name: str, data: dict):
@@ -96,6 +264,28 @@ class Selector(object):
     def get_selector_by_name(name: str):
         return Selector._registered_selectors.get(name)
 
+    @staticmethod
+    def get_prefilter_stats(language: str = None) -> dict:
+        """Per selector, how many variation runs the literal prefilter saw and skipped, and the share it skipped"""
+        return {
+            name: dict(stats, skip_rate=stats["skipped"] / stats["runs"] if stats["runs"] else 0.0)
+            for name, stats in Selector._prefilter_stats.items()
+            if language is None or name.startswith("{}.".format(language))
+        }
+
+    @staticmethod
+    def take_prefilter_stats() -> dict:
+        stats: dict = Selector._prefilter_stats
+        Selector._prefilter_stats = {}
+        return stats
+
+    @staticmethod
+    def add_prefilter_stats(stats: dict):
+        for name, counts in stats.items():
+            totals: dict = Selector._prefilter_stats.setdefault(name, {"runs": 0, "skipped": 0})
+            for k in totals.keys():
+                totals[k] += counts.get(k, 0)
+
     def __init__(self, language: str, name: str, data: dict):
         self._model_type = model.ModelMap.get_model_class(data.get("model_element"))
         self._name = name
@@ -107,64 +297,101 @@ class Selector(object):
         self._subselectors = {}
         if data.get("subselectors") is not None:
             self._subselectors = data.get("subselectors")
+        self._search_texts = {st for sub in self._subselectors.values() for st in sub.get("search_texts") or []}
 
     def __str__(self):
         return "{}: {}".format("{}.{}".format(self._lang, self._name), self._description)
 
-    def select(self, file_contents: str, prefix: str = "") -> list:
+    def select(self, file_contents: Union[str, TextSpan], prefix: str = "", cache: SelectionCache = None,
+               base: int = 0) -> list:
+        """Selects from a span of the preprocessed file, or from a copy of the text at offset base in it"""
         res: list = []
+        text, start, end = source.get_bounds(file_contents)
+        base = 0 if type(file_contents) is TextSpan else base
         v: dict
         for v in self._variations:
             r: RegexBuilder = RegexBuilderFactory.get_builder(self._lang)
             regex: str = r.build(v.get("regex_format_string"))
             logging.debug("selector {} regex: {}".format(self._name, regex))
+            if not self._may_match(regex, text, start, end):
+                continue
+            span_groups: set = {v[k] for k in self._search_texts if type(v.get(k)) is int}
             try:
-                artefacts: list = re.findall(regex, file_contents, flags=re.M)
-                logging.debug("selector {} found {} results".format(self._name, len(artefacts)))
-                for artefact in artefacts:
+                matches: list = RegexGuard.finditer(regex, text, self.get_qualified_name(), start, end)
+                logging.debug("selector {} found {} results".format(self._name, len(matches)))
+                for match in matches:
+                    artefact: Union[str, tuple] = _findall_result(match, span_groups)
                     artefact_info: dict = {}
                     for k in v.keys():
                         if k != "regex_format_string":
-                            print("trying to get {}({}) from {}".format(k, v[k], artefact))
+                            progress("trying to get {}({}) from {}".format(k, v[k], artefact))
                             try:
                                 artefact_info[k] = artefact[v[k]]
                             except IndexError:
-                                print("Index failed for looking up {} in {} for {}".format(k, self._name, artefact))
-                    print("artefact info is {}".format(artefact_info))
+                                progress("Index failed for looking up {} in {} for {}".format(k, self._name, artefact))
+                    progress("artefact info is {}".format(artefact_info))
                     a: Union[
                         model.ModelGeneric,
                         model.NamedModelGeneric
                     ]
                     if self._model_type is not None:
-                        a = self._model_type(self._lang, prefix, artefact_info)
-
-                        sub_selection: dict = {}
-                        for selector in self._subselectors.keys():
-                            s: Selector = Selector.get_selector_by_name("{}.{}".format(self._lang, selector))
-                            if s is not None:
-                                for st in self._subselectors[selector]["search_texts"]:
-                                    if artefact_info.get(st):
-                                        _res = s.select(
-                                            artefact_info.get(st),
-                                            "{}.{}".format(prefix, a.get_name()) if issubclass(type(a),
-                                                                                               model.NamedModelGeneric) else prefix
-                                        )
-                                        if not sub_selection.get(selector):
-                                            sub_selection[selector] = {
-                                                st: _res
-                                            } if len(self._subselectors[selector]["search_texts"]) > 1 else _res
-                                        else:
-                                            if len(self._subselectors[selector]["search_texts"]) > 1:
-                                                sub_selection[selector][st] = _res
-                                            else:
-                                                sub_selection[selector] += _res
-
-                        a.add_subselection(sub_selection)
+                        span: tuple = _trim(text, match.start(), match.end(), base)
+                        cache_key: str = None
+                        if cache and issubclass(self._model_type, model.NamedModelGeneric):
+                            cache_key = cache.get_key(self.get_qualified_name(), artefact_info)
+                        a = cache.get(cache_key, prefix) if cache_key else None
+                        if a is None:
+                            a = self._build_artefact(artefact_info, prefix, _group_offsets(match, v, base))
+                            a.set_span(*span)
+                            if cache_key:
+                                cache.put(cache_key, prefix, a)
+                        elif a.get_span():
+                            model.ModelOperations.shift_spans(a, span[0] - a.get_span()[0])
                         res.append(a)
             except re.error:
                 logging.error("Regex error in {}".format(self._name))
         return res
 
+    def _may_match(self, regex: str, text: str, start: int, end: int) -> bool:
+        clauses: list = Selector._required_literals.get(regex)
+        if clauses is None:
+            clauses = Selector._required_literals[regex] = required_literals(regex, re.M)
+        stats: dict = Selector._prefilter_stats.setdefault(self.get_qualified_name(), {"runs": 0, "skipped": 0})
+        stats["runs"] += 1
+        if may_match(clauses, text, start, end):
+            return True
+        stats["skipped"] += 1
+        return False
+
+    def _build_artefact(self, artefact_info: dict, prefix: str, offsets: dict = None) -> model.ModelGeneric:
+        a = self._model_type(self._lang, prefix, artefact_info)
+        offsets = offsets or {}
+
+        sub_selection: dict = {}
+        for selector in self._subselectors.keys():
+            s: Selector = Selector.get_selector_by_name("{}.{}".format(self._lang, selector))
+            if s is not None:
+                for st in self._subselectors[selector]["search_texts"]:
+                    if artefact_info.get(st):
+                        _res = s.select(
+                            artefact_info.get(st),
+                            "{}.{}".format(prefix, a.get_name()) if issubclass(type(a),
+                                                                               model.NamedModelGeneric) else prefix,
+                            base=offsets.get(st, 0)
+                        )
+                        if not sub_selection.get(selector):
+                            sub_selection[selector] = {
+                                st: _res
+                            } if len(self._subselectors[selector]["search_texts"]) > 1 else _res
+                        else:
+                            if len(self._subselectors[selector]["search_texts"]) > 1:
+                                sub_selection[selector][st] = _res
+                            else:
+                                sub_selection[selector] += _res
+
+        a.add_subselection(sub_selection)
+        return a
+
     def get_is_top_level_selector(self) -> bool:
         return self._top_level_selector
 
@@ -186,15 +413,14 @@ class Preprocessor(object):
         for directive in directives.keys():
             self._directives.append(Directive(lang, directive, directives.get(directive)))
 
-    def apply(self, file_contents: str):
+    def apply(self, file_contents: str, source_map: SourceMap = None):
         directive: Directive
         for directive in self._directives:
-            file_contents = directive.apply(file_contents)
+            file_contents = directive.apply(file_contents, source_map)
         return file_contents
 
 
 class Descriptor(object):
-    _language_global_lock: dict = {}
     _descriptors: dict = {}
     _lang: str = None
     _syntax_descriptor: dict = None
@@ -203,14 +429,29 @@ class Descriptor(object):
     _json_mappings: dict = None
     _global_source_dirs: list = None
     _builtins: dict = None
+    _bundle_hash: str = None
+    _cache: SelectionCache = None
+    _chunk_jobs: int = 1
+    _chunk_lines: int = 5000
+    _phase_times: dict = None
+    _model_writer = None
 
     @staticmethod
     def get_descriptor(language: str):
         if language not in Descriptor._descriptors.keys():
             logging.debug("Descriptor not found, creating new one")
-            Descriptor._descriptors[language] = Descriptor(language)
+            Descriptor._descriptors[language] = Descriptor.get_frontend(
+                config.get_language_frontend(language) or "regex")(language)
         return Descriptor._descriptors[language]
 
+    @staticmethod
+    def get_frontend(name: str) -> type:
+        """The descriptor class of a frontend, see FRONTENDS"""
+        module_name, _, class_name = FRONTENDS.get(name, name).partition(":")
+        if not class_name:
+            raise ValueError("Unknown frontend {}".format(name))
+        return getattr(importlib.import_module(module_name), class_name)
+
     def __init__(self, language_name: str):
         if language_name is None:
             logging.error("No language was provided to descriptor")
@@ -219,7 +460,9 @@ class Descriptor(object):
             self._lang = language_name
             language_config = None
             with open(path.join(LANGS_DIR, "{}.toml".format(language_name)), "r") as language_file:
-                language_config = toml.load(language_file)
+                language_bundle: str = language_file.read()
+            language_config = toml.loads(language_bundle)
+            self._bundle_hash = md5(language_bundle.encode("utf-8")).hexdigest()
 
             self._configure_regex_builder(language_config.get("snippets"), language_config.get("format_strings"))
             self._load_preprocessor(language_config.get("directives"))
@@ -240,8 +483,52 @@ class Descriptor(object):
             if s is not None and s.get_is_top_level_selector():
                 self._selectors.append(s)
 
-    def preprocess(self, file_contents: str) -> str:
-        return self._preprocessor.apply(file_contents)
+    def configure(self, options: dict = None):
+        """Applies the per run translation options, see translate for the keys"""
+        options = options or {}
+        self.use_cache(options.get("cache_dir"))
+        self._chunk_jobs = options.get("chunk_jobs") or 1
+        self._chunk_lines = options.get("chunk_lines") or Descriptor._chunk_lines
+        RegexGuard.configure(options.get("selector_timeout"))
+
+    def get_options(self) -> dict:
+        return {
+            "cache_dir": path.dirname(self._cache.get_cache_dir()) if self._cache else None,
+            "chunk_jobs": self._chunk_jobs,
+            "chunk_lines": self._chunk_lines,
+            "selector_timeout": RegexGuard._budget
+        }
+
+    def _record_phase(self, phase: str, start: float) -> float:
+        now: float = time.perf_counter()
+        if self._phase_times is None:
+            self._phase_times = {}
+        self._phase_times[phase] = self._phase_times.get(phase, 0.0) + now - start
+        return now
+
+    def get_phase_times(self) -> dict:
+        """Seconds spent in each phase of parse since the descriptor was created or the times were reset"""
+        return dict(self._phase_times or {})
+
+    def reset_phase_times(self):
+        self._phase_times = {}
+
+    def get_prefilter_stats(self) -> dict:
+        return Selector.get_prefilter_stats(self._lang)
+
+    def use_cache(self, cache_dir: path):
+        """Reuse selections of unchanged functions and classes from a content addressed cache in cache_dir"""
+        if cache_dir is None:
+            self._cache = None
+        elif self._cache is None or self._cache.get_cache_dir() != path.join(cache_dir, self._lang):
+            self._cache = SelectionCache(path.join(cache_dir, self._lang), self._bundle_hash)
+
+    def get_cache(self) -> SelectionCache:
+        return self._cache
+
+    def preprocess(self, file_contents: str, source_map: SourceMap = None) -> str:
+        """Applies the directives of the language, recording the edits they make in source_map if one is given"""
+        return self._preprocessor.apply(file_contents, source_map)
 
     def select(self, file_contents: str, prefix=None) -> dict:
         res: dict = {}
@@ -251,7 +538,79 @@ class Descriptor(object):
                 logging.info("Mapping {} to {} in json".format(selector.get_name(),
                                                                self._json_mappings.get(selector.get_name())))
                 res[self._json_mappings.get(selector.get_name()) or selector.get_name()] = selector.select(
-                    file_contents, prefix=prefix or self._lang)
+                    file_contents, prefix=prefix or self._lang, cache=self._cache)
+        return res
+
+    def split_top_level(self, file_contents: str, chunk_count: int) -> List[str]:
+        """Splits preprocessed text before top level definitions into at most chunk_count chunks of similar size.
+        Selections never span top level definitions, so selecting the chunks one after another finds what selecting
+        the whole text finds, in the same order"""
+        r: RegexBuilder = RegexBuilderFactory.get_builder(self._lang)
+        try:
+            boundary: str = r.build("top_level_definition")
+        except KeyError:
+            logging.info("{} has no top_level_definition snippet, not splitting".format(self._lang))
+            return [file_contents]
+        chunks: list = []
+        chunk_start: int = 0
+        target_size: float = len(file_contents) / chunk_count
+        for m in re.finditer(boundary, file_contents, flags=re.M):
+            if m.start() - chunk_start >= target_size:
+                chunks.append(file_contents[chunk_start:m.start()])
+                chunk_start = m.start()
+        chunks.append(file_contents[chunk_start:])
+        return chunks
+
+    def select_source(self, file: str, file_contents: str, source_map: SourceMap, prefix: str) -> dict:
+        """Selects from the contents of a source file and locates what was selected in it"""
+        phase_start: float = time.perf_counter()
+        file_contents = self.preprocess(file_contents, source_map)
+        logging.debug("Preprocessing done.")
+        phase_start = self._record_phase("preprocess", phase_start)
+        if self._chunk_jobs > 1 and file_contents.count("\n") >= self._chunk_lines:
+            selected_entities: dict = self.select_chunked(file_contents, prefix)
+        else:
+            selected_entities: dict = self.select(file_contents, prefix)
+        model.ModelOperations.locate(selected_entities, source_map)
+        logging.debug("Selecting done.")
+        self._record_phase("select", phase_start)
+        return selected_entities
+
+    def deduplicate(self, selected_entities: dict):
+        """Drops the top level functions that were also selected as methods"""
+        klazz: model.ClassModel
+        for klazz in selected_entities.get("classes") or []:
+            func: model.FunctionModel
+            for func in klazz.get_functions():
+                function_hash = func.get_hash()
+                tlfunc: model.FunctionModel
+                for tlfunc in selected_entities.get("functions") or []:
+                    logging.info("found duplicate for {}".format(tlfunc.get_name()))
+                    if tlfunc.get_hash() == function_hash:
+                        selected_entities.get("functions").remove(tlfunc)
+
+    def select_chunked(self, file_contents: str, prefix: str) -> dict:
+        chunks: List[str] = self.split_top_level(file_contents, self._chunk_jobs)
+        if len(chunks) < 2:
+            return self.select(file_contents, prefix)
+        logging.info("Selecting {} chunks in {} processes".format(len(chunks), min(self._chunk_jobs, len(chunks))))
+        options: dict = self.get_options()
+        options["chunk_jobs"] = 1
+        with ProcessPoolExecutor(max_workers=min(self._chunk_jobs, len(chunks)),
+                                 mp_context=mp.get_context("spawn")) as pool:
+            selections: list = list(pool.map(_select_chunk, [(self._lang, options, c, prefix) for c in chunks]))
+        res: dict = {}
+        chunk_start: int = 0
+        for chunk, (selection, incidents, prefilter_stats) in zip(chunks, selections):
+            Selector.add_prefilter_stats(prefilter_stats)
+            for k in selection.keys():
+                model.ModelOperations.shift_spans(selection[k], chunk_start)
+                res.setdefault(k, []).extend(selection[k])
+            for incident in incidents:
+                incident["file"] = RegexGuard.get_source_file()
+                incident["offset"] += chunk_start
+                RegexGuard.add_incident(incident)
+            chunk_start += len(chunk)
         return res
 
     def __str__(self):
@@ -267,35 +626,52 @@ class Descriptor(object):
 
     def _get_base_prefix(self, filename: str, extension: str, source_paths: list):
         file_path: str = self._get_shortest_path(filename, source_paths)
-        return "{}.{}".format(self._lang, path.relpath(filename, file_path)[:-1 * len(".{}".format(extension))].replace(
-            PATH_SEPARATOR, '.'))
+        prefix: str = "{}.{}".format(self._lang, path.relpath(filename, file_path)[:-1 * len(".{}".format(
+            extension))].replace(PATH_SEPARATOR, '.'))
+        package_module: str = config.get_language_package_module(self._lang)
+        if package_module and prefix.endswith(".{}".format(package_module)) and prefix.count(".") > 1:
+            prefix = prefix[:-1 * len(".{}".format(package_module))]
+        return prefix
 
     def _get_json_path(self, output_path: path, input_file: str, source_paths: list):
         object_path = self._get_shortest_path(input_file, source_paths)
         model_path: path = path.relpath(input_file, object_path)
         return path.join(output_path, self._lang, model_path) + ".json"
 
+    def get_model_path(self, output_path: path, input_file: str, source_paths: list) -> str:
+        """The model file parse writes for a source file"""
+        return self._get_json_path(output_path, input_file, source_paths)
+
     def output_json(self, output_path: path, input_file: str, source_paths: path, sa_model: dict,
-                    file_hash: str, extension: str):
+                    file_hash: str, extension: str, lock: ModelLock = None):
         file_path: path = self._get_json_path(output_path, input_file, source_paths)
         file_dir: path = path.abspath(path.dirname(file_path))
         if not path.exists(file_dir):
             Path(file_dir).mkdir(parents=True, exist_ok=True)
-        with open(file_path, "w") as f:
-            sa_model["hash"] = file_hash
-            sa_model["file_name"] = str(input_file)
-            sa_model["date_generated"] = str(datetime.datetime.now())
-            sa_model["model_id"] = self._get_base_prefix(input_file, extension, source_paths)
-            sa_model["source_language"] = self._lang
-            group: str
-            for group in sa_model.keys():
-                se: list = sa_model.get(group)
-                if type(se) is list:
-                    for i in range(len(se)):
-                        se.append(se.pop(0).flatten())
-            validate(sa_model, model.SCHEMA)
-            json_output = json.dumps(sa_model, indent=4)
-            print(json_output, file=f)
+        sa_model["hash"] = file_hash
+        sa_model["file_name"] = str(input_file)
+        sa_model["date_generated"] = str(datetime.datetime.now())
+        sa_model["model_id"] = self._get_base_prefix(input_file, extension, source_paths)
+        sa_model["source_language"] = self._lang
+        group: str
+        for group in sa_model.keys():
+            se: list = sa_model.get(group)
+            if type(se) is list:
+                for i in range(len(se)):
+                    e = se.pop(0)
+                    se.append(e.flatten() if issubclass(type(e), model.ModelGeneric) else e)
+        source.materialise(sa_model)
+        validate(sa_model, model.SCHEMA)
+        json_output = json.dumps(sa_model, indent=4)
+        if self._model_writer is not None:
+            self._model_writer.write(file_path, json_output, sa_model, lock)
+        else:
+            write_model_file(file_path, json_output, sa_model)
+
+    def set_model_writer(self, writer):
+        """Hands the models output_json makes, and the locks held on them, to writer.write rather than writing them.
+        None writes them again"""
+        self._model_writer = writer
 
     def _resolve_classes(self, namespace_stack: list, classes: list):
         klazz: model.ClassModel
@@ -326,7 +702,8 @@ class Descriptor(object):
                     rhs: model.ReferenceModel
                     call: str = rhs.get_ref()
                     logging.info("Resolving found reference to {}".format(call))
-                    call_found: bool = False
+                    # frontends may qualify references to imported modules themselves
+                    call_found: bool = (call or "").startswith("{}.".format(self._lang))
                     for ns in namespace_stack[::-1]:
                         item: Union[
                             str,
@@ -408,47 +785,78 @@ class Descriptor(object):
         self._resolve_functions(namespace_stack, res.get("functions"))
         return res
 
-    def parse(self, file: str, file_extension: str, local_dir: path, source_paths: path, force: bool):
+    def parse(self, file: str, file_extension: str, local_dir: path, source_paths: path, force: bool,
+              read_source=None):
+        """Translates a file into its model. read_source returns the text and hash of the file when it was read ahead"""
+        # writers of one model take turns, so a file being translated elsewhere is skipped as up to date once it is done
+        with ModelLock(self._get_json_path(local_dir, file, source_paths)) as lock:
+            self._parse(file, file_extension, local_dir, source_paths, force, read_source, lock)
+
+    def _parse(self, file: str, file_extension: str, local_dir: path, source_paths: path, force: bool,
+               read_source=None, lock: ModelLock = None):
         try:
             logging.debug("Attempting to read file")
-            with open(file, "r") as f:
-                file_contents: str = f.read()
-            file_hash: str = md5(file_contents.encode("utf-8")).hexdigest()
+            phase_start: float = time.perf_counter()
+            RegexGuard.set_source_file(file)
+            file_contents, file_hash = read_source() if read_source else source.read_source(file)
             logging.debug("File has hash {}".format(file_hash))
             model_expired: bool = True
             if path.exists(self._get_json_path(local_dir, file, source_paths)) and not force:
-                with open(self._get_json_path(local_dir, file, source_paths), "r") as m:
-                    json_model = json.load(m)
-                    if json_model.get("hash") == file_hash:
-                        logging.info("Model file is still valid for source")
-                        model_expired = False
+                try:
+                    json_model: dict = model.ModelOperations.read_model_file(
+                        self._get_json_path(local_dir, file, source_paths))
+                except ValueError:
+                    json_model: dict = {}
+                if json_model.get("hash") == file_hash:
+                    logging.info("Model file is still valid for source")
+                    model_expired = False
+            phase_start = self._record_phase("read", phase_start)
             if model_expired:
-                print("Translating {}".format(file))
-                file_contents = self.preprocess(file_contents)
-                logging.debug("Preprocessing done.")
+                progress("Translating {}".format(file))
+                source_map: SourceMap = SourceMap(file_contents)
                 prefix: str = self._get_base_prefix(file, file_extension, source_paths)
-                selected_entities: dict = self.select(file_contents, prefix)
-                logging.debug("Selecting done.")
-                # TODO resolve references
-                klazz: model.ClassModel
-                for klazz in selected_entities.get("classes") or []:
-                    func: model.FunctionModel
-                    for func in klazz.get_functions():
-                        function_hash = func.get_hash()
-                        tlfunc: model.FunctionModel
-                        for tlfunc in selected_entities.get("functions") or []:
-                            logging.info("found duplicate for {}".format(tlfunc.get_name()))
-                            if tlfunc.get_hash() == function_hash:
-                                selected_entities.get("functions").remove(tlfunc)
+                selected_entities: dict = self.select_source(file, file_contents, source_map, prefix)
+                phase_start = time.perf_counter()
+                self.deduplicate(selected_entities)
                 logging.debug("Reference deduplication done.")
+                phase_start = self._record_phase("deduplicate", phase_start)
 
                 self.resolve_references(selected_entities)
 
                 logging.debug("Reference resolution done.")
-
-                self.output_json(local_dir, file, source_paths, selected_entities, file_hash, file_extension)
-                print("Translation done for {}".format(file))
+                phase_start = self._record_phase("resolve", phase_start)
+                incidents: list = RegexGuard.take_incidents()
+                for incident in incidents:
+                    incident["line"] = source_map.get_location(incident["offset"], incident["offset"])["start_line"]
+                if incidents:
+                    selected_entities["selector_timeouts"] = incidents
+
+                self.output_json(local_dir, file, source_paths, selected_entities, file_hash, file_extension, lock)
+                self._record_phase("output", phase_start)
+                progress("Translation done for {}".format(file))
             else:
-                print("Skipping {}".format(file))
+                progress("Skipping {}".format(file))
         except UnicodeDecodeError:
-            print("Skipping {} due to decoding error".format(file))
+            progress("Skipping {} due to decoding error".format(file))
+
+
+def write_model_file(file_path: str, json_output: str, sa_model: dict):
+    # the model is written next to its final path and renamed over it, so readers see the old or the new model
+    tmp_path: str = "{}.{}.{}.tmp".format(file_path, getpid(), threading.get_ident())
+    try:
+        with open(tmp_path, "w") as f:
+            print(json_output, file=f)
+        replace(tmp_path, file_path)
+    finally:
+        if path.exists(tmp_path):
+            remove(tmp_path)
+    ModelFilter.write(file_path, sa_model)
+
+
+def _select_chunk(task: tuple) -> tuple:
+    language, options, chunk, prefix = task
+    d: Descriptor = Descriptor.get_descriptor(language)
+    d.configure(options)
+    Selector.take_prefilter_stats()
+    selection: dict = d.select(chunk, prefix)
+    return selection, RegexGuard.take_incidents(), Selector.take_prefilter_stats()
@@ -0,0 +1,91 @@
+# Overlaps the I/O of a translation worker with its selection. The next few sources of the worker are read on a
+# background thread while the current one is translated, and finished models are written on another one
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Iterator, Tuple
+import multiprocessing as mp
+
+import staticanalyser.shared.source as source
+from staticanalyser.shared.locking import ModelLock
+from staticanalyser.translator.descriptor import write_model_file
+
+
+class SourcePrefetcher(object):
+    """Takes files from a worker's queue and reads up to depth of them ahead. Each file is yielded with the future of
+    its text and hash, errors reading it are raised by the future"""
+    _file_queue: mp.Queue = None
+    _depth: int = None
+    _pending: deque = None
+    _executor: ThreadPoolExecutor = None
+
+    def __init__(self, file_queue: mp.Queue, depth: int):
+        self._file_queue = file_queue
+        self._depth = max(1, depth)
+        self._pending = deque()
+
+    def __iter__(self) -> Iterator[Tuple[str, Future]]:
+        exhausted: bool = False
+        with ThreadPoolExecutor(1) as self._executor:
+            while True:
+                while not exhausted and len(self._pending) < self._depth:
+                    try:
+                        file: str = self._file_queue.get_nowait()
+                    except queue.Empty:
+                        file = None
+                    if file is None:
+                        exhausted = True
+                    else:
+                        self._pending.append((file, self._executor.submit(source.read_source, file)))
+                if not self._pending:
+                    return
+                yield self._pending.popleft()
+
+
+class ModelWriter(object):
+    """Writes models on a background thread as Descriptor.output_json would. At most queue_size models wait to be
+    written, so translation blocks rather than holding many models when the writes fall behind. The lock of a model
+    is held until it is written, so other workers still wait for it rather than translating it again"""
+    _queue: queue.Queue = None
+    _thread: threading.Thread = None
+    _error: BaseException = None
+
+    def __init__(self, queue_size: int):
+        self._queue = queue.Queue(max(1, queue_size))
+        self._thread = threading.Thread(target=self._run, name="model-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, file_path: str, json_output: str, sa_model: dict, lock: ModelLock = None):
+        self._raise()
+        self._queue.put((file_path, json_output, sa_model, lock.hand_off() if lock else None))
+
+    def _run(self):
+        while True:
+            item: tuple = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._error is None:
+                    write_model_file(*item[:3])
+            except BaseException as e:
+                # kept for the translating thread, the models after it are dropped
+                self._error = e
+            finally:
+                if item and item[3]:
+                    item[3].release()
+                self._queue.task_done()
+
+    def _raise(self):
+        if self._error is not None:
+            raise self._error
+
+    def flush(self):
+        """Waits until every model given so far is written"""
+        self._queue.join()
+        self._raise()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._raise()
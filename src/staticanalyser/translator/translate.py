@@ -1,13 +1,38 @@
+from hashlib import md5
 from pathlib import Path
+from typing import Tuple, List
+import json
 import queue
+import shutil
+import sys
 import staticanalyser.shared.config as config
 import staticanalyser.translator.descriptor as descriptor
-from staticanalyser.shared.platform_constants import MODEL_DIR
-from os import path, getcwd, name
+from staticanalyser.shared.platform_constants import MODEL_DIR, MODEL_STORE_NAME, MODEL_DATABASE_NAME, CACHE_DIR, \
+    SHARD_MANIFEST_NAME, SHARD_DIR_FORMAT, MODEL_PACK_NAME, MODEL_MANIFEST_NAME
+from staticanalyser.shared.model import ModelOperations
+from staticanalyser.shared.progress import progress_to
+from staticanalyser.shared.store import ModelStore
+from staticanalyser.shared.database import ModelDatabase
+from staticanalyser.shared.bloom import ModelFilter
+from staticanalyser.shared.pack import ModelPack
+from staticanalyser.translator.pipeline import SourcePrefetcher, ModelWriter
+from staticanalyser.translator.cache import prune_cache, CACHE_MAX_BYTES
+from os import path, getcwd, name, sep, stat
 import multiprocessing as mp
 import re
+from jsonschema import ValidationError
 import logging
 
+_MP_CONTEXT = mp.get_context("spawn")
+# global ids whose module could not be found or translated with the state of the source dirs when it was searched for,
+# so navigation only searches the source dirs again once a module may have been added or changed there
+_MISSING_GLOBALS: dict = {}
+# models a worker writes before adding them to the model database in one transaction
+DATABASE_BATCH_SIZE: int = 64
+# sources a worker reads ahead of the one it translates, and models it lets wait for the writer thread
+PREFETCH_FILES: int = 4
+WRITE_QUEUE_SIZE: int = 8
+
 
 def lookup_parser(extension: str) -> list:
     return config.get_languages_by_extension(extension)
@@ -17,18 +42,69 @@ def get_file_extension(entity: str) -> str:
     return re.split(r'\.', str(entity))[-1]  # TODO compile regex pattern for better performance
 
 
-def parse(file_queue: mp.Queue, local_dir, source_paths, force):
+def _iter_files(file_queue: mp.Queue, prefetch: int, other_queues: list = None):
+    # only the worker's own files are read ahead, the ones left to the others are taken one at a time
+    if prefetch:
+        yield from SourcePrefetcher(file_queue, prefetch)
+    else:
+        yield from _take_files(file_queue)
+    for other_queue in other_queues or []:
+        yield from _take_files(other_queue)
+
+
+def _take_files(file_queue: mp.Queue):
     try:
         file = file_queue.get_nowait()
         while file is not None:
+            yield file, None
+            file = file_queue.get_nowait()
+    except queue.Empty:
+        pass
+
+
+def parse(file_queue: mp.Queue, local_dir, source_paths, force, descriptor_options=None, database_path=None,
+          prefetch: int = PREFETCH_FILES, other_queues: list = None):
+    """Translates files from the queue until it is empty, then those left in other_queues, the queues of the other
+    workers. With prefetch, the next files of the queue are read while one is translated and the models are written
+    on a background thread, otherwise each file is read, translated and written in turn"""
+    database: ModelDatabase = ModelDatabase(database_path) if database_path else None
+    writer: ModelWriter = ModelWriter(WRITE_QUEUE_SIZE) if prefetch else None
+    batch: list = []
+    used_parsers: list = []
+    try:
+        for file, contents in _iter_files(file_queue, prefetch, other_queues):
             logging.info("Selected {} for translation".format(file))
             parser_options = lookup_parser(get_file_extension(file))
             if parser_options[0] is not None:  # TODO potentially try many parsers and use next if errors with first?
                 selected_parser = descriptor.Descriptor.get_descriptor(parser_options[0])
-                selected_parser.parse(file, get_file_extension(file), local_dir, source_paths, force)
-            file = file_queue.get_nowait()
-    except queue.Empty:
+                selected_parser.configure(descriptor_options)
+                selected_parser.set_model_writer(writer)
+                used_parsers.append(selected_parser)
+                selected_parser.parse(file, get_file_extension(file), local_dir, source_paths, force,
+                                      contents.result if contents else None)
+                if database:
+                    batch.append(selected_parser.get_model_path(local_dir, file, source_paths))
+                    if len(batch) >= DATABASE_BATCH_SIZE:
+                        _add_to_database(database, batch, writer)
+                        batch = []
         logging.info("No files remaining for translation")
+    finally:
+        try:
+            if writer:
+                writer.close()
+        finally:
+            for selected_parser in used_parsers:
+                selected_parser.set_model_writer(None)
+            if database:
+                _add_to_database(database, batch, None)
+                database.close()
+
+
+def _add_to_database(database: ModelDatabase, model_files: list, writer: ModelWriter):
+    if writer:
+        # the models must be on disk before the database reads them
+        writer.flush()
+    database.add_model_files([f for f in model_files if path.isfile(f)])
 
 
 def get_files(src: path) -> list:
@@ -40,22 +116,198 @@ def get_files(src: path) -> list:
     return res
 
 
-def spawn_processes(pid_count: int, input_files: mp.Queue, output_dir: path, source_paths: list, force: bool) -> list:
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """Parses a K/N shard of a partition into N shards, K counting from 1"""
+    try:
+        k, n = (int(p) for p in shard.split("/"))
+    except ValueError:
+        raise ValueError("A shard is given as K/N, not {}".format(shard))
+    if not 1 <= k <= n:
+        raise ValueError("Shard {} is not one of 1 to {}".format(k, n))
+    return k, n
+
+
+def get_shard(file: str, source_paths: list, shard_count: int) -> int:
+    """The shard, counting from 1, a file is translated in when translation is split into shard_count shards. It only
+    depends on the path of the file relative to its source path, so every runner assigns the files of a checkout
+    the same way wherever it is checked out"""
+    file = path.abspath(str(file))
+    # the source path the model id is taken from, as in Descriptor._get_shortest_path
+    source_path: str = min(source_paths, key=lambda p: len(path.relpath(file, p)))
+    relative_path: str = path.relpath(file, source_path).replace(sep, "/")
+    return int.from_bytes(md5(relative_path.encode("utf-8")).digest()[:8], "big") % shard_count + 1
+
+
+def read_shard_manifest(model_dir: str) -> dict:
+    manifest_path: str = path.join(model_dir, SHARD_MANIFEST_NAME)
+    if not path.isfile(manifest_path):
+        return None
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+
+def write_shard_manifest(model_dir: str, shard_count: int, members: list, model_files: list):
+    """Records which shards of a partition a model dir holds, and the models they wrote"""
+    manifest: dict = {
+        "shards": shard_count,
+        "members": sorted(members),
+        "models": sorted(path.relpath(path.abspath(str(f)), model_dir).replace(sep, "/") for f in model_files)
+    }
+    with open(path.join(model_dir, SHARD_MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=4)
+
+
+def touch_model_manifest(model_dir: str):
+    """Records that models were written to a model dir, call graphs older than the manifest are checked again for the
+    global ids they could not resolve"""
+    Path(path.join(model_dir, MODEL_MANIFEST_NAME)).touch()
+
+
+def spawn_processes(pid_count: int, input_files: List[mp.Queue], output_dir: path, source_paths: list, force: bool,
+                    descriptor_options: dict = None, database_path: str = None,
+                    prefetch: int = PREFETCH_FILES) -> list:
+    """Starts a worker for each queue of input_files. A worker translates the files of its own queue first, and
+    then helps with those left in the queues after it"""
     processes: list = []
     for pid in range(pid_count):
-        process = mp.Process(target=parse, args=(input_files, output_dir, source_paths, force))
+        other_queues: list = input_files[pid + 1:] + input_files[:pid]
+        process = _MP_CONTEXT.Process(target=parse, args=(input_files[pid], output_dir, source_paths, force,
+                                                          descriptor_options, database_path, prefetch,
+                                                          other_queues))
         processes.append(process)
         process.start()
     return processes
 
 
+def _get_candidate_sources(global_id: str):
+    """The source files the module owning a global id could be, the longest matching module first, each with the
+    source dir it is in"""
+    id_parts: list = global_id.split(".")
+    language: str = id_parts[0]
+    if language not in config.get_languages():
+        return
+    source_dirs: list = config.get_language_source_dirs(language).get(name) or []
+    extensions: list = [e for e, langs in config.get_filetypes().items() if language in langs]
+    package_module: str = config.get_language_package_module(language)
+    for end in range(len(id_parts), 1, -1):
+        module_path: str = path.join(*id_parts[1:end])
+        for source_dir in source_dirs:
+            for extension in extensions:
+                candidates: list = ["{}.{}".format(path.join(source_dir, module_path), extension)]
+                if package_module:
+                    candidates.append(path.join(source_dir, module_path, "{}.{}".format(package_module, extension)))
+                for candidate in candidates:
+                    yield candidate, source_dir
+
+
+def locate_global_source(global_id: str) -> Tuple[str, str]:
+    """Finds the source file of the module owning a global id in the global source dirs of its language, the longest
+    matching module first, and returns it with the source dir it is in"""
+    for candidate, source_dir in _get_candidate_sources(global_id):
+        if path.isfile(candidate):
+            return candidate, source_dir
+    return None, None
+
+
+def _get_source_state(global_id: str, source_file: str) -> tuple:
+    """The mtimes of the dirs searched for the module of a global id and of the source file found there, adding a
+    module to one of the dirs or changing the source file changes it"""
+    paths: list = list(dict.fromkeys(path.dirname(c) for c, _ in _get_candidate_sources(global_id)))
+    state: list = []
+    for p in paths + ([source_file] if source_file else []):
+        try:
+            state.append(stat(p).st_mtime_ns)
+        except OSError:
+            state.append(None)
+    return tuple(state)
+
+
+def translate_global(global_id: str, options: dict = None) -> str:
+    """Returns the model file for a global id, translating the module owning it from the global source dirs into the
+    global model dir first if it has no model yet. Returns None when no module can be found for it"""
+    model_file: str = ModelOperations.get_model_file(global_id)
+    if model_file:
+        return model_file
+    if global_id in _MISSING_GLOBALS:
+        missing_source, missing_state = _MISSING_GLOBALS[global_id]
+        if _get_source_state(global_id, missing_source) == missing_state:
+            return None
+    source_file, source_dir = locate_global_source(global_id)
+    # taken before translating, a source changed meanwhile is translated again next time
+    source_state: tuple = _get_source_state(global_id, source_file)
+    if not source_file:
+        _MISSING_GLOBALS[global_id] = source_file, source_state
+        return None
+    logging.info("Translating {} on demand for {}".format(source_file, global_id))
+    selected_parser = descriptor.Descriptor.get_descriptor(lookup_parser(get_file_extension(source_file))[0])
+    selected_parser.configure(_get_descriptor_options(options or {}))
+    try:
+        # concurrent requests wait in parse for the first translation of the module, then skip it as up to date.
+        # Translation progress is kept off stdout, where queries write their results
+        with progress_to(sys.stderr):
+            selected_parser.parse(source_file, get_file_extension(source_file), MODEL_DIR, [source_dir], False)
+    except (OSError, ValueError, SyntaxError, ValidationError) as e:
+        logging.warning("Could not translate {} on demand: {}".format(source_file, e))
+    model_file = ModelOperations.get_model_file(global_id)
+    if not model_file:
+        _MISSING_GLOBALS[global_id] = source_file, source_state
+    else:
+        _MISSING_GLOBALS.pop(global_id, None)
+        touch_model_manifest(MODEL_DIR)
+    return model_file
+
+
+def _get_references(model_file: str) -> set:
+    pending: list = [ModelOperations.read_model_file(model_file)]
+    res: set = set()
+    while pending:
+        data = pending.pop()
+        if type(data) is dict:
+            if data.get("model_type") == "reference" and type(data.get("ref")) is str:
+                res.add(data.get("ref"))
+            pending += [v for v in data.values() if type(v) in (dict, list)]
+        elif type(data) is list:
+            pending += [v for v in data if type(v) in (dict, list)]
+    return res
+
+
+def translate_dependencies(model_files: list, options: dict = None) -> None:
+    """Translates every global module the models reference, directly or through other global modules"""
+    visited: set = {path.abspath(str(f)) for f in model_files}
+    pending: list = list(visited)
+    resolved: set = set()
+    while pending:
+        references: set = set()
+        for model_file in pending:
+            references |= _get_references(model_file)
+        pending = []
+        for global_id in sorted(references - resolved):
+            resolved.add(global_id)
+            model_file: str = translate_global(global_id, options)
+            if model_file and path.abspath(model_file) not in visited:
+                visited.add(path.abspath(model_file))
+                pending.append(path.abspath(model_file))
+
+
+def _get_descriptor_options(options: dict) -> dict:
+    return {
+        "cache_dir": (options.get("cache_dir") or CACHE_DIR) if options.get("cache") else None,
+        "chunk_jobs": options.get("chunk_jobs") or 1,
+        "chunk_lines": options.get("chunk_lines"),
+        "selector_timeout": options.get("selector_timeout")
+    }
+
+
 def translate(input_files: list, options: dict = None) -> int:
     if not options:
         logging.info("No options supplied")
         options = {}
 
+    shard: Tuple[int, int] = options.get("shard")
     local_dir_name: str = options.get("output_dir")
     local_dir: path = path.join(getcwd(), ".model")
+    if shard:
+        local_dir = path.join(getcwd(), SHARD_DIR_FORMAT.format(*shard))
     if local_dir_name:
         logging.info("Using supplied output directory")
         local_dir = path.abspath(local_dir_name)
@@ -75,41 +327,120 @@ def translate(input_files: list, options: dict = None) -> int:
     logging.info("force mode is {}".format(force))
     lazy: bool = options.get("lazy") is True or False
     logging.info("lazy mode is {}".format(lazy))
+    descriptor_options: dict = _get_descriptor_options(options)
+    logging.info("descriptor options are {}".format(descriptor_options))
 
     # TODO create file list to iterate through
-    mp.set_start_method('spawn')
     file_list: list = input_files
 
-    if not lazy:
-        print("Performing non-lazy translation of source dirs")
-        extensions: list = []
-        for f in file_list:
-            if get_file_extension(f) not in extensions:
-                extensions.append(get_file_extension(f))
-        langs: list = []
-        for e in extensions:
-            if config.get_languages_by_extension(e)[0] not in langs:
-                langs.append(config.get_languages_by_extension(e)[0])
-        source_dirs: list = []
-        for l in langs:
-            for d in config.get_language_source_dirs(l).get(name):
-                if d not in source_dirs:
-                    source_dirs.append(d)
-        fq: mp.Queue = mp.Queue()
-        for file in source_dirs:
-            contents: list = get_files(file)
-            for f in contents:
-                fq.put(f)
-        for process in spawn_processes(number_of_processes, fq, MODEL_DIR, source_dirs, force):
-            process.join()
-        print("Done source translation")
-
-    file_queue: mp.Queue = mp.Queue()
+    # the files are dealt out to a queue per worker, a worker reads ahead in its own queue only, so it does not take
+    # the last files of a run from idle workers
+    file_queues: List[mp.Queue] = [_MP_CONTEXT.Queue() for _ in range(number_of_processes)]
+    queued: int = 0
     for file in file_list:
         contents: list = get_files(file)
         for f in contents:
-            file_queue.put(f)
+            if shard and get_shard(f, source_paths, shard[1]) != shard[0]:
+                continue
+            file_queues[queued % number_of_processes].put(f)
+            queued += 1
 
-    for process in spawn_processes(number_of_processes, file_queue, local_dir, source_paths, force):
+    database_path: str = path.join(local_dir, MODEL_DATABASE_NAME) if options.get("database") else None
+    if database_path:
+        # the schema is created before the workers race to create it
+        ModelDatabase(database_path).close()
+    prefetch: int = options.get("prefetch")
+    for process in spawn_processes(number_of_processes, file_queues, local_dir, source_paths, force,
+                                   descriptor_options, database_path,
+                                   PREFETCH_FILES if prefetch is None else prefetch):
         process.join()
+    touch_model_manifest(local_dir)
+
+    if not lazy:
+        # global sources referenced by the translated files are translated now rather than when a query needs them
+        print("Performing non-lazy translation of referenced global sources")
+        translate_dependencies(ModelOperations.get_model_files(local_dir), options)
+        print("Done source translation")
+
+    if descriptor_options.get("cache_dir"):
+        # the cache is brought down to its size once a run is done, not on every entry written
+        prune_cache(descriptor_options.get("cache_dir"), options.get("cache_max_bytes") or CACHE_MAX_BYTES)
+
+    if options.get("store", True):
+        ModelStore.write(path.join(local_dir, MODEL_STORE_NAME), ModelOperations.get_model_files(local_dir))
+    if database_path:
+        # models left from earlier runs are added too, and those whose files are gone are dropped
+        ModelDatabase.write(database_path, ModelOperations.get_model_files(local_dir))
+    pack_path: str = path.join(local_dir, MODEL_PACK_NAME)
+    if options.get("pack") or path.isfile(pack_path):
+        # a pack that is there already is kept up to date with the models
+        ModelPack.write(pack_path, ModelOperations.get_model_files(local_dir))
+    if shard:
+        write_shard_manifest(local_dir, shard[1], [shard[0]], ModelOperations.get_model_files(local_dir))
     return 0
+
+
+def merge(shard_dirs: list, options: dict = None) -> int:
+    """Combines the model dirs written by the shards of a translation into one model dir, with its model store and,
+    when a shard has one or it is asked for, its model database. Returns 1 when shards are missing"""
+    options = options or {}
+    local_dir: str = path.abspath(options.get("output_dir") or path.join(getcwd(), ".model"))
+    Path(local_dir).mkdir(parents=True, exist_ok=True)
+    shard_count: int = None
+    members: set = set()
+    merged: dict = {}
+    databases: list = []
+    for shard_dir in [path.abspath(d) for d in shard_dirs]:
+        manifest: dict = read_shard_manifest(shard_dir)
+        if manifest is None:
+            raise ValueError("{} was not translated with --shard".format(shard_dir))
+        if shard_count is not None and manifest["shards"] != shard_count:
+            raise ValueError("{} is from a translation in {} shards, not {}".format(shard_dir, manifest["shards"],
+                                                                                   shard_count))
+        shard_count = manifest["shards"]
+        if members & set(manifest["members"]):
+            raise ValueError("Shards {} are merged twice".format(sorted(members & set(manifest["members"]))))
+        members |= set(manifest["members"])
+        if path.isfile(path.join(shard_dir, MODEL_DATABASE_NAME)) and shard_dir != local_dir:
+            databases.append(path.join(shard_dir, MODEL_DATABASE_NAME))
+        for model_file in manifest["models"]:
+            if model_file in merged:
+                # a module reached through two source paths, every shard keeps the same copy
+                logging.warning("{} is in {} and {}, keeping the first".format(model_file, merged[model_file],
+                                                                             shard_dir))
+                continue
+            merged[model_file] = shard_dir
+            if shard_dir != local_dir:
+                _copy_model(path.join(shard_dir, model_file), path.join(local_dir, model_file))
+    missing: list = sorted(set(range(1, shard_count + 1)) - members) if shard_count else []
+    if missing:
+        logging.warning("Shards {} of {} are missing from the merge".format(missing, shard_count))
+    write_shard_manifest(local_dir, shard_count, list(members), [path.join(local_dir, f) for f in merged])
+    # the merged models keep the mtimes of the shards, the manifest is what tells they were added
+    touch_model_manifest(local_dir)
+
+    model_files: list = ModelOperations.get_model_files(local_dir)
+    if options.get("store", True):
+        # the store is immutable, it is written again rather than merged
+        ModelStore.write(path.join(local_dir, MODEL_STORE_NAME), model_files)
+    if databases or options.get("database"):
+        database_path: str = path.join(local_dir, MODEL_DATABASE_NAME)
+        database: ModelDatabase = ModelDatabase(database_path)
+        try:
+            for shard_database in databases:
+                database.merge(shard_database)
+        finally:
+            database.close()
+        # models of shards without a database are read, the merged ones are up to date
+        ModelDatabase.write(database_path, model_files)
+    if options.get("pack") or path.isfile(path.join(local_dir, MODEL_PACK_NAME)):
+        ModelPack.write(path.join(local_dir, MODEL_PACK_NAME), model_files)
+    return 1 if missing else 0
+
+
+def _copy_model(source_file: str, dest_file: str):
+    # copies keep their mtime, so the model filter and the model database still match them
+    Path(path.dirname(dest_file)).mkdir(parents=True, exist_ok=True)
+    shutil.copy2(source_file, dest_file)
+    if path.isfile(ModelFilter.get_filter_path(source_file)):
+        shutil.copy2(ModelFilter.get_filter_path(source_file), ModelFilter.get_filter_path(dest_file))
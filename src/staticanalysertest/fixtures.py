@@ -0,0 +1,62 @@
+from os import path, getcwd, chdir
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from staticanalyser.translator.descriptor import Descriptor
+
+SAMPLE_FILE_LOCATION = path.join(path.dirname(__file__), "translator", "sample.py")
+SOURCE_ROOT = path.dirname(path.dirname(__file__))
+SAMPLE_PREFIX = "python3.staticanalysertest.translator.sample"
+
+
+def sample_id(name: str) -> str:
+    """The global id of an entity of the sample file"""
+    return "{}.{}".format(SAMPLE_PREFIX, name)
+
+
+class TranslatedSample(object):
+    """Translates the sample file into the .model dir of a temporary working directory for the duration of a test"""
+    _tmp_dir: TemporaryDirectory = None
+    _old_cwd: str = None
+    _frontend: str = None
+
+    def __init__(self, frontend: str = None):
+        self._frontend = frontend
+
+    def __enter__(self):
+        self._tmp_dir = TemporaryDirectory()
+        self._old_cwd = getcwd()
+        chdir(self._tmp_dir.name)
+        descriptor: Descriptor = Descriptor.get_frontend(self._frontend)("python3") if self._frontend else \
+            Descriptor.get_descriptor("python3")
+        descriptor.parse(SAMPLE_FILE_LOCATION, "py", path.join(self._tmp_dir.name, ".model"), [SOURCE_ROOT], True)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        chdir(self._old_cwd)
+        self._tmp_dir.cleanup()
+
+    def model_files(self) -> list:
+        return [path.join(self._tmp_dir.name, ".model", "python3", "staticanalysertest", "translator",
+                          "sample.py.json")]
+
+
+def translate_sources(sources: dict) -> list:
+    """Writes sources, a dict of file names to texts, into the working directory and translates them into its .model
+    dir, returning their model files in the same order"""
+    descriptor: Descriptor = Descriptor.get_descriptor("python3")
+    model_files: list = []
+    for name, text in sources.items():
+        with open(name, "w") as f:
+            f.write(text)
+        descriptor.parse(path.abspath(name), "py", path.abspath(".model"), [getcwd()], True)
+        model_files.append(descriptor.get_model_path(path.abspath(".model"), path.abspath(name), [getcwd()]))
+    return model_files
+
+
+class SampleTestCase(TestCase):
+    """Runs each test in the working directory of a TranslatedSample, which is self.sample"""
+    sample: TranslatedSample = None
+
+    def setUp(self):
+        self.sample = TranslatedSample().__enter__()
+        self.addCleanup(self.sample.__exit__, None, None, None)
@@ -0,0 +1,45 @@
+from staticanalyser.hunter import hunt, iter_hunt
+from staticanalyser.navigator.navigate import TRUNCATED
+from staticanalysertest.fixtures import SampleTestCase, sample_id
+
+
+class TestHunter(SampleTestCase):
+    def test_iter_hunt_matches_hunt(self):
+        tree = hunt(10, ["python3.builtins.print"], ["python3.json.loads"], [], self.sample.model_files())
+        findings = list(iter_hunt(10, ["python3.builtins.print"], ["python3.json.loads"], [],
+                                  self.sample.model_files()))
+        self.assertEqual([
+            [sample_id("my_method_3"), "python3.builtins.print"],
+            [sample_id("my_method_3"), sample_id("my_method_4"),
+             sample_id("my_method"), "python3.builtins.print"]
+        ], [p for _, p, _ in findings])
+        self.assertEqual("python3.json.loads", tree[0][0])
+        self.assertTrue(all(sink == "python3.builtins.print" for _, _, sink in findings))
+
+    def test_iter_hunt_stops_at_clean_functions(self):
+        findings = list(iter_hunt(10, ["python3.builtins.print"], ["python3.json.loads"],
+                                  [sample_id("my_method_4")], self.sample.model_files()))
+        self.assertEqual([[sample_id("my_method_3"), "python3.builtins.print"]],
+                         [p for _, p, _ in findings])
+
+    def test_parallel_hunt_matches_serial_hunt(self):
+        dangers = ["python3.json.loads", "python3.builtins.print"]
+        serial = hunt(10, ["python3.builtins.print"], list(dangers), [], self.sample.model_files())
+        parallel = hunt(10, ["python3.builtins.print"], list(dangers), [], self.sample.model_files(),
+                        options={"jobs": 2})
+        streamed = list(iter_hunt(10, ["python3.builtins.print"], list(dangers), [], self.sample.model_files(),
+                                  options={"jobs": 2}))
+        self.assertEqual(serial, parallel)
+        self.assertEqual(dangers, [danger for danger, _ in parallel])
+        self.assertEqual(["python3.json.loads", "python3.json.loads"], [danger for danger, _, _ in streamed])
+
+    def test_hunt_keeps_truncated_branches(self):
+        tree = hunt(10, ["python3.builtins.print"], ["python3.json.loads"], [], self.sample.model_files(),
+                    options={"max_nodes": 3})
+        findings = list(iter_hunt(10, ["python3.builtins.print"], ["python3.json.loads"], [],
+                                  self.sample.model_files(), options={"max_nodes": 3}))
+        self.assertEqual([("python3.json.loads", [(sample_id("my_method_3"), [
+            ("python3.builtins.print", []),
+            (sample_id("my_method_4"), [(TRUNCATED, [])])
+        ])])], tree)
+        self.assertEqual(["python3.builtins.print", TRUNCATED], [sink for _, _, sink in findings])
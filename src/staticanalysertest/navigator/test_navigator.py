@@ -0,0 +1,192 @@
+import time
+from os import path, remove
+from unittest.mock import patch
+from staticanalyser.navigator.navigate import Navigator, ModelCache, navigate, iter_navigate, TRUNCATED
+from staticanalyser.shared.bloom import ModelFilter
+from staticanalyser.shared.model import ModelOperations, ReferenceModel
+from staticanalyser.shared.store import ModelStore
+from staticanalysertest.fixtures import SampleTestCase, sample_id, translate_sources, SAMPLE_FILE_LOCATION
+
+# caller.caller calls helper.helper, which is in another model
+DEPENDENT_SOURCES = {
+    "helper.py": "def helper(data):\n    print(data)\n",
+    "caller.py": "from helper import helper\n\n\ndef caller(value):\n    helper(value)\n"
+}
+
+# entry.entry calls library.parse, the only function calling json.loads
+LIBRARY_SOURCES = {
+    "library.py": "from json import loads\n\n\ndef parse(data):\n    parsed = loads(data)\n    print(parsed)\n",
+    "entry.py": "from library import parse\n\n\ndef entry(value):\n    parse(value)\n"
+}
+
+
+def _leaf_paths(tree: list, prefix: list) -> list:
+    res: list = []
+    for global_id, children in tree:
+        if children:
+            res += _leaf_paths(children, prefix + [global_id])
+        else:
+            res.append(prefix + [global_id])
+    return res
+
+
+class TestNavigator(SampleTestCase):
+    def test_iter_navigate_yields_every_leaf_of_navigate(self):
+        tree = navigate("python3.json.loads", 10, self.sample.model_files())
+        findings = list(iter_navigate("python3.json.loads", 10, self.sample.model_files()))
+        self.assertEqual(_leaf_paths(tree, []), [p for _, p, _ in findings])
+        for source, trail, sink in findings:
+            self.assertEqual("python3.json.loads", source)
+            self.assertEqual(trail[-1], sink)
+
+    def test_iter_navigate_locates_the_calls_of_each_path(self):
+        for source, trail, sink, locations in iter_navigate("python3.json.loads", 10, self.sample.model_files(),
+                                                            locations=True):
+            self.assertEqual(len(trail), len(locations))
+            for location in locations:
+                self.assertEqual(path.realpath(SAMPLE_FILE_LOCATION), path.realpath(location["file"]))
+                self.assertLessEqual(location["start_line"], location["end_line"])
+
+    def test_find_usages_follows_def_use_chains(self):
+        n = Navigator()
+        n.load_file(self.sample.model_files()[0], False)
+        source = n.find_references_to_global_id("python3.json.loads")[0]
+        self.assertIn(("assign", "empty"), source.get_def_use()["python3.json.loads"])
+        usages = n.find_usages(source, "python3.json.loads")
+        self.assertEqual([("python3.builtins.print", "empty"), (sample_id("my_method_4"), "hurrah")],
+                         sorted((f if type(f) is str else f.get_global_identifier(), v) for f, v in usages))
+
+    def test_loaded_strings_are_interned(self):
+        n = Navigator()
+        n.load_file(self.sample.model_files()[0], False)
+        plain = Navigator({"intern": False})
+        plain.load_file(self.sample.model_files()[0], False)
+        refs = [e.get_ref() for e in ModelOperations.walk(n.get_loaded_models()) if type(e) is ReferenceModel]
+        prints = [r for r in refs if r == "python3.builtins.print"]
+        self.assertGreater(len(prints), 1)
+        for r in prints:
+            self.assertIs(prints[0], r)
+        self.assertEqual(n.get_symbol_table().get_symbol("python3.json.loads"),
+                         n.get_symbol_table().get_symbol("python3.json." + "loads"))
+        self.assertEqual([], n.find_references_to_global_id("python3.never.referenced"))
+        for global_id in ["python3.json.loads", "python3.builtins.print"]:
+            self.assertEqual([f.get_global_identifier() for f in plain.find_references_to_global_id(global_id)],
+                             [f.get_global_identifier() for f in n.find_references_to_global_id(global_id)])
+
+    def test_load_file_does_not_read_a_loaded_model_again(self):
+        n = Navigator()
+        n.load_file(self.sample.model_files()[0], False)
+        entity = n.lookup_entity(sample_id("my_method_4"))[1]
+        hits = n.get_load_stats()["hits"]
+        n.load_file(self.sample.model_files()[0], False)
+        self.assertIs(entity, n.lookup_entity(sample_id("my_method_4"))[1])
+        self.assertEqual(hits + 2, n.get_load_stats()["hits"])
+
+    def test_lookup_entity_caches_hits_and_misses(self):
+        n = Navigator()
+        self.assertEqual((False, None), n.lookup_entity(sample_id("my_method_4"), True))
+        n.load_file(self.sample.model_files()[0], False)
+        found, entity = n.lookup_entity(sample_id("MyClass.method_b"))
+        self.assertTrue(found)
+        self.assertIs(entity, n.lookup_entity(sample_id("MyClass.method_b"))[1])
+        self.assertEqual(sample_id("my_method_4"),
+                         n.lookup_entity(sample_id("my_method_4"))[1].get_global_identifier())
+
+    def test_dependency_loading_is_counted_and_bounded(self):
+        n = Navigator()
+        n.load_entity(sample_id("my_method_4"), True)
+        stats = n.get_load_stats()
+        self.assertEqual(1, stats["loaded"])
+        self.assertGreater(stats["unresolved"], 0)
+        n.load_entity(sample_id("my_method_3"), True)
+        self.assertEqual(stats["unresolved"], n.get_load_stats()["unresolved"])
+        bounded = Navigator({"load_depth": 0})
+        bounded.load_entity(sample_id("my_method_4"), True)
+        self.assertEqual((1, 0, 1, 0), (bounded.get_load_stats()["loaded"], bounded.get_load_stats()["unresolved"],
+                                        bounded.get_load_stats()["skipped_depth"],
+                                        bounded.get_load_stats()["skipped_budget"]))
+        translate_sources(DEPENDENT_SOURCES)
+        bounded = Navigator({"load_budget": 0})
+        bounded.load_entity("python3.caller.caller", True)
+        self.assertEqual((1, 0, 1), (bounded.get_load_stats()["loaded"], bounded.get_load_stats()["skipped_depth"],
+                                     bounded.get_load_stats()["skipped_budget"]))
+
+    def test_local_models_that_cannot_reference_the_id_are_never_opened(self):
+        library_file, entry_file = translate_sources(LIBRARY_SOURCES)
+        ModelStore.write(path.join(".model", "models.store"), [library_file, entry_file])
+        expected = [("python3.library.parse", [("python3.builtins.print", [])])]
+        # only library references json.loads, the filters and the store both rule entry out
+        for options in [None, {"store": path.join(".model", "models.store")}]:
+            with patch.object(ModelOperations, "read_model_file", wraps=ModelOperations.read_model_file) as read:
+                self.assertEqual(expected, navigate("python3.json.loads", 6, [library_file, entry_file], options))
+            read_files = [path.abspath(str(c.args[0])) for c in read.call_args_list]
+            self.assertIn(path.abspath(library_file), read_files)
+            self.assertNotIn(path.abspath(entry_file), read_files)
+
+    def test_max_models_evicts_and_reloads(self):
+        expected = navigate("python3.json.loads", 10, self.sample.model_files())
+        translate_sources(DEPENDENT_SOURCES)
+        n = Navigator({"max_models": 1})
+        n.load_file(self.sample.model_files()[0], False)
+        n.load_entity("python3.helper.helper")
+        stats = n.get_load_stats()
+        self.assertEqual(["python3.helper"], list(n.get_loaded_models()))
+        self.assertEqual(1, stats["evictions"])
+        found, entity = n.lookup_entity(sample_id("my_method_4"))
+        self.assertTrue(found)
+        self.assertEqual(1, n.get_load_stats()["reloads"])
+        self.assertEqual(stats["misses"] + 1, n.get_load_stats()["misses"])
+        self.assertIs(entity, n.lookup_entity(sample_id("my_method_4"))[1])
+        self.assertGreater(n.get_load_stats()["hits"], stats["hits"])
+        self.assertEqual(expected, navigate("python3.json.loads", 10, self.sample.model_files(), {"max_models": 1}))
+
+    def test_unloaded_models_are_not_loaded_again_to_search_for_ids_they_do_not_reference(self):
+        translate_sources(DEPENDENT_SOURCES)
+        # without its filter only the references kept when the sample is unloaded rule it out
+        remove(ModelFilter.get_filter_path(self.sample.model_files()[0]))
+        n = Navigator({"max_models": 1, "intern": False})
+        n.load_file(self.sample.model_files()[0], False)
+        n.load_entity("python3.caller.caller")
+        self.assertEqual(["python3.caller"], list(n.get_loaded_models()))
+        self.assertEqual(["python3.caller.caller"],
+                         [f.get_global_identifier() for f in n.find_references_to_global_id("python3.helper.helper")])
+        self.assertEqual((0, 1), (n.get_load_stats()["reloads"], n.get_load_stats()["filtered"]))
+        self.assertEqual([sample_id("my_method_3")],
+                         [f.get_global_identifier() for f in n.find_references_to_global_id("python3.json.loads")])
+        self.assertEqual(1, n.get_load_stats()["reloads"])
+
+    def test_max_nodes_and_deadline_truncate_breadth_first(self):
+        paths = [p for _, p, _ in iter_navigate("python3.json.loads", 10, self.sample.model_files())]
+        self.assertEqual(sorted(paths, key=len), paths)
+        options = {"max_nodes": 3}
+        self.assertEqual([(sample_id("my_method_3"), [
+            ("python3.builtins.print", []),
+            (sample_id("my_method_4"), [(TRUNCATED, [])])
+        ])], navigate("python3.json.loads", 10, self.sample.model_files(), options))
+        self.assertEqual([
+            [sample_id("my_method_3"), "python3.builtins.print"],
+            [sample_id("my_method_3"), sample_id("my_method_4"), TRUNCATED]
+        ], [p for _, p, _ in iter_navigate("python3.json.loads", 10, self.sample.model_files(), options)])
+        self.assertEqual([(TRUNCATED, [])], navigate("python3.json.loads", 10, self.sample.model_files(),
+                                                     {"deadline": 0}))
+
+    def test_deadline_passing_mid_search_truncates_the_paths_left(self):
+        paths = [p for _, p, _ in iter_navigate("python3.json.loads", 10, self.sample.model_files())]
+        stop_at = time.time() + 1
+        findings = iter_navigate("python3.json.loads", 10, self.sample.model_files(), {"stop_at": stop_at})
+        self.assertEqual(paths[0], next(findings)[1])
+        time.sleep(max(0.0, stop_at - time.time()))
+        self.assertEqual([paths[1][:2] + [TRUNCATED]], [p for _, p, _ in findings])
+
+    def test_searches_sharing_a_model_cache_read_each_model_once(self):
+        model_files = self.sample.model_files() + translate_sources(LIBRARY_SOURCES)
+        sinks = ["python3.json.loads", "python3.builtins.print"]
+        expected = [navigate(global_id, 6, model_files) for global_id in sinks]
+        models = ModelCache()
+        with patch.object(ModelOperations, "read_model_file", wraps=ModelOperations.read_model_file) as read:
+            found = [navigate(global_id, 6, model_files, None, models) for global_id in sinks]
+        self.assertEqual(expected, found)
+        read_files = [c.args[0] for c in read.call_args_list]
+        self.assertEqual(len(set(read_files)), len(read_files))
+        # entry references neither id, so it is never read
+        self.assertEqual(set(model_files[:2]), set(read_files) & set(model_files))
@@ -0,0 +1,31 @@
+from os import utime, stat
+from staticanalyser.navigator.navigate import Navigator, navigate
+from staticanalyser.shared.bloom import BloomFilter, ModelFilter
+from staticanalysertest.fixtures import SampleTestCase, SAMPLE_PREFIX, sample_id
+
+
+class TestBloomFilter(SampleTestCase):
+    def test_no_false_negatives(self):
+        items = {"python3.module_{}.func".format(i) for i in range(500)}
+        bloom = BloomFilter.for_items(items)
+        for item in items:
+            self.assertIn(item, bloom)
+        false_positives = sum("python3.other_{}.func".format(i) in bloom for i in range(2000))
+        self.assertLess(false_positives, 100)
+
+    def test_model_filter_is_written_and_checked(self):
+        model_file = self.sample.model_files()[0]
+        bloom = ModelFilter.read(model_file)
+        self.assertIsNotNone(bloom)
+        for global_id in ["python3.json.loads", SAMPLE_PREFIX, sample_id("MyClass.method_a")]:
+            self.assertIn(global_id, bloom)
+        self.assertFalse(ModelFilter.might_contain(model_file, "python3.not_referenced.anywhere"))
+        n = Navigator()
+        self.assertEqual([], n.filter_model_files("python3.not_referenced.anywhere", [model_file]))
+        self.assertEqual(1, n.get_load_stats()["filtered"])
+        self.assertEqual(1, len(navigate("python3.json.loads", 2, [model_file])))
+        # a filter older than its model is not trusted
+        model_stat = stat(str(model_file))
+        utime(str(model_file), ns=(model_stat.st_atime_ns, model_stat.st_mtime_ns + 1))
+        self.assertIsNone(ModelFilter.read(model_file))
+        self.assertTrue(ModelFilter.might_contain(model_file, "python3.not_referenced.anywhere"))
@@ -0,0 +1,89 @@
+import sqlite3
+from os import path, remove, utime
+from staticanalyser.navigator.navigate import Navigator, navigate
+from staticanalyser.shared.database import ModelDatabase
+from staticanalyser.shared.store import ModelStore
+from staticanalysertest.fixtures import SampleTestCase, SAMPLE_PREFIX, sample_id
+
+DATABASE_PATH = path.join(".model", "models.sqlite")
+
+
+def _journal_mode() -> str:
+    connection = sqlite3.connect(DATABASE_PATH)
+    try:
+        return connection.execute("PRAGMA journal_mode").fetchone()[0]
+    finally:
+        connection.close()
+
+
+class TestModelDatabase(SampleTestCase):
+    def test_database_answers_the_store_queries(self):
+        ModelStore.write(path.join(".model", "models.store"), self.sample.model_files())
+        store = ModelStore(path.join(".model", "models.store"))
+        ModelDatabase.write(DATABASE_PATH, self.sample.model_files())
+        database = ModelDatabase(DATABASE_PATH)
+        for global_id in [sample_id("MyClass.method_a"), SAMPLE_PREFIX, "python3.unknown.module"]:
+            self.assertEqual(store.get_model(global_id), database.get_model(global_id))
+        for global_id in ["python3.json.loads", "python3.builtins.print", sample_id("my_method")]:
+            self.assertEqual(sorted(store.get_referencing_entities(global_id)),
+                             sorted(database.get_referencing_entities(global_id)))
+            self.assertEqual(sorted(store.get_referencing_functions(global_id)),
+                             sorted(database.get_referencing_functions(global_id)))
+            self.assertEqual(store.get_referencing_model_files(global_id),
+                             database.get_referencing_model_files(global_id))
+        self.assertEqual(store.get_references(sample_id("my_method_4")),
+                         database.get_references(sample_id("my_method_4")))
+        self.assertEqual(store.get_module_functions(SAMPLE_PREFIX), database.get_module_functions(SAMPLE_PREFIX))
+        store.close()
+        database.close()
+
+    def test_entities_and_parameters_are_looked_up(self):
+        ModelDatabase.write(DATABASE_PATH, self.sample.model_files())
+        database = ModelDatabase(DATABASE_PATH)
+        entity: dict = database.get_entity(sample_id("MyClass.method_b"))
+        self.assertEqual(("function", SAMPLE_PREFIX, sample_id("MyClass")),
+                         (entity["kind"], entity["model_id"], entity["parent"]))
+        self.assertIsNone(database.get_entity(sample_id("missing")))
+        self.assertEqual([("test", "", "4"), ("yes", "str", "\"yes!\"")],
+                         database.get_parameters(sample_id("my_method_2")))
+        self.assertIn(sample_id("my_decorator.inner"), database.get_module_functions(SAMPLE_PREFIX))
+        database.close()
+
+    def test_models_are_added_again_only_when_they_change(self):
+        database = ModelDatabase(DATABASE_PATH)
+        self.assertEqual(1, database.add_model_files(self.sample.model_files()))
+        self.assertEqual(0, database.add_model_files(self.sample.model_files()))
+        utime(self.sample.model_files()[0], ns=(0, 0))
+        self.assertEqual(1, database.add_model_files(self.sample.model_files()))
+        self.assertEqual([sample_id("my_method_3")],
+                         database.get_referencing_entities("python3.json.loads"))
+        remove(self.sample.model_files()[0])
+        self.assertEqual(1, database.prune())
+        self.assertFalse(database.has_model(SAMPLE_PREFIX))
+        self.assertEqual([], database.get_referencing_entities("python3.json.loads"))
+        database.close()
+
+    def test_navigator_queries_the_database(self):
+        expected = navigate("python3.builtins.print", 6, self.sample.model_files())
+        loaded: Navigator = Navigator()
+        loaded.load_file(self.sample.model_files()[0], False)
+        callers = loaded.find_callers("python3.builtins.print")
+        ModelDatabase.write(DATABASE_PATH, self.sample.model_files())
+        options: dict = {"database": DATABASE_PATH}
+        self.assertEqual(expected, navigate("python3.builtins.print", 6, self.sample.model_files(), options))
+        n: Navigator = Navigator(options)
+        self.assertEqual(callers, n.find_callers("python3.builtins.print"))
+        self.assertEqual(n.find_module_functions(SAMPLE_PREFIX),
+                         Navigator().find_module_functions(SAMPLE_PREFIX))
+
+    def test_opening_a_database_does_not_write_to_it(self):
+        ModelDatabase.write(DATABASE_PATH, self.sample.model_files())
+        connection = sqlite3.connect(DATABASE_PATH)
+        connection.execute("PRAGMA journal_mode=DELETE")
+        connection.close()
+        database = ModelDatabase(DATABASE_PATH)
+        self.assertEqual([sample_id("my_method_3")], database.get_referencing_functions("python3.json.loads"))
+        self.assertEqual("delete", _journal_mode())
+        database.add_model_files(self.sample.model_files())
+        self.assertEqual("wal", _journal_mode())
+        database.close()
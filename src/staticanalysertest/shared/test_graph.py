@@ -0,0 +1,58 @@
+import io
+import time
+from os import path, utime
+from pathlib import Path
+from staticanalyser.hunter import hunt
+from staticanalyser.shared.graph import CallGraph
+from staticanalyser.shared.platform_constants import MODEL_MANIFEST_NAME
+from staticanalysertest.fixtures import SampleTestCase, sample_id
+
+GRAPH_PATH = path.join(".model", "callgraph.graph")
+
+
+class TestCallGraph(SampleTestCase):
+    def test_graph_answers_call_and_reachability_queries(self):
+        CallGraph.write(GRAPH_PATH, self.sample.model_files(), 2)
+        graph = CallGraph(GRAPH_PATH)
+        self.assertEqual([sample_id("my_method_3")], graph.get_callers("python3.json.loads"))
+        self.assertIn(sample_id("my_method"),
+                      graph.get_callees(sample_id("my_method_4")))
+        callers = graph.get_callers("python3.json.loads")
+        # the precomputed table answers a depth of 2, other depths walk the graph
+        self.assertFalse(graph.reachable(callers, [sample_id("my_method")], 1))
+        self.assertTrue(graph.reachable(callers, [sample_id("my_method")], 2))
+        self.assertTrue(graph.reachable(callers, ["python3.builtins.print"], 3))
+        self.assertFalse(graph.reachable(callers, ["python3.unknown.sink"], 0))
+        self.assertTrue(graph.is_current(self.sample.model_files()))
+        edges = io.StringIO()
+        graph.export_edges(edges)
+        self.assertEqual(sorted(graph.iter_edges()), sorted(tuple(l.split("\t")) for l in
+                                                           edges.getvalue().splitlines()))
+        graph.close()
+        utime(self.sample.model_files()[0], ns=(0, 0))
+        graph = CallGraph(GRAPH_PATH)
+        self.assertFalse(graph.is_current(self.sample.model_files()))
+        graph.close()
+
+    def test_hunt_with_graph_matches_hunt_without(self):
+        dangers = ["python3.json.loads", "python3.builtins.print", "python3.os.getenv"]
+        CallGraph.write(GRAPH_PATH, self.sample.model_files())
+        expected = hunt(10, ["python3.builtins.print"], list(dangers), [], self.sample.model_files())
+        pruned = hunt(10, ["python3.builtins.print"], list(dangers), [], self.sample.model_files(),
+                      options={"graph": GRAPH_PATH})
+        self.assertEqual(expected, pruned)
+
+    def test_unresolved_ids_are_only_resolved_again_after_a_watched_path_changes(self):
+        manifest = path.join(".model", MODEL_MANIFEST_NAME)
+        Path(manifest).touch()
+        utime(manifest, (time.time() - 10, time.time() - 10))
+        CallGraph.write(GRAPH_PATH, self.sample.model_files())
+        graph = CallGraph(GRAPH_PATH)
+        # every id the graph could not resolve now resolves
+        self.assertFalse(graph.is_current(self.sample.model_files(), lambda global_id: True))
+        self.assertTrue(graph.is_current(self.sample.model_files(), lambda global_id: True, [manifest]))
+        self.assertFalse(graph.is_current(self.sample.model_files(), lambda global_id: True,
+                                          [manifest, path.join(".model", "missing")]))
+        utime(manifest, (time.time() + 10, time.time() + 10))
+        self.assertFalse(graph.is_current(self.sample.model_files(), lambda global_id: True, [manifest]))
+        graph.close()
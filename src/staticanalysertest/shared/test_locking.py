@@ -0,0 +1,45 @@
+import threading
+import time
+from os import path, listdir
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from staticanalyser.shared import locking
+from staticanalyser.shared.locking import ModelLock
+
+
+class TestModelLock(TestCase):
+    def test_released_locks_leave_nothing_behind(self):
+        with TemporaryDirectory() as tmp:
+            model_path: str = path.join(tmp, "python3", "sample.py.json")
+            with ModelLock(model_path):
+                self.assertIn("sample.py.json.lock", listdir(path.dirname(model_path)))
+            handed_off = ModelLock(model_path)
+            with handed_off:
+                handed_off.hand_off()
+            releaser = threading.Thread(target=handed_off.release)
+            releaser.start()
+            releaser.join()
+            self.assertEqual([], listdir(path.dirname(model_path)))
+        self.assertEqual({}, locking._THREAD_LOCKS)
+
+    def test_writers_of_one_model_take_turns(self):
+        held: list = []
+        overlaps: list = []
+
+        def write(model_path: str):
+            for _ in range(20):
+                with ModelLock(model_path):
+                    held.append(1)
+                    overlaps.append(len(held))
+                    time.sleep(0.001)
+                    held.pop()
+
+        with TemporaryDirectory() as tmp:
+            writers: list = [threading.Thread(target=write, args=(path.join(tmp, "m.py.json"),)) for _ in range(4)]
+            for w in writers:
+                w.start()
+            for w in writers:
+                w.join()
+            self.assertEqual([], listdir(tmp))
+        self.assertEqual({1}, set(overlaps))
+        self.assertEqual({}, locking._THREAD_LOCKS)
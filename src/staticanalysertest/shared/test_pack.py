@@ -0,0 +1,47 @@
+from os import path, remove
+from staticanalyser.navigator.navigate import navigate
+from staticanalyser.shared.model import ModelOperations
+from staticanalyser.shared.pack import ModelPack
+from staticanalyser.shared.store import ModelStore
+from staticanalysertest.fixtures import SampleTestCase, SAMPLE_PREFIX, sample_id, translate_sources
+
+PACK_PATH = path.join(".model", "models.pack")
+
+
+class TestModelPack(SampleTestCase):
+    def test_pack_answers_like_the_tree(self):
+        model_file = self.sample.model_files()[0]
+        ModelPack.write(PACK_PATH, self.sample.model_files())
+        ModelStore.write(path.join(".model", "models.store"), self.sample.model_files())
+        pack = ModelPack(PACK_PATH)
+        store = ModelStore(path.join(".model", "models.store"))
+        self.assertEqual([model_file], pack.get_model_files())
+        self.assertTrue(pack.has_model_file(model_file))
+        self.assertFalse(pack.has_model_file(path.join(path.dirname(model_file), "other.py.json")))
+        self.assertEqual(ModelOperations.read_model_file(model_file), pack.read_model_file(model_file))
+        for global_id in [sample_id("MyClass.method_a"), SAMPLE_PREFIX, "python3.unknown.module"]:
+            self.assertEqual(store.get_model(global_id), pack.get_model(global_id))
+        self.assertIn("python3.json.loads", pack.get_filter(model_file))
+        store.close()
+        pack.close()
+
+    def test_navigate_reads_the_pack_without_the_tree(self):
+        expected = navigate("python3.json.loads", 3, self.sample.model_files())
+        ModelPack.write(PACK_PATH, self.sample.model_files())
+        remove(str(self.sample.model_files()[0]))
+        self.assertEqual(expected, navigate("python3.json.loads", 3, ModelPack(PACK_PATH).get_model_files(),
+                                            {"pack": PACK_PATH}))
+
+    def test_models_retranslated_after_packing_are_read_from_the_tree(self):
+        model_file = translate_sources({"later.py": "def later(data):\n    print(data)\n"})[0]
+        ModelPack.write(PACK_PATH, self.sample.model_files() + [model_file])
+        translate_sources({"later.py": "from json import loads\n\n\ndef later(data):\n    parsed = loads(data)\n"
+                                       "    print(parsed)\n"})
+        pack = ModelPack(PACK_PATH)
+        self.assertTrue(pack.is_current(self.sample.model_files()[0]))
+        self.assertFalse(pack.is_current(model_file))
+        pack.close()
+        expected = navigate("python3.json.loads", 6, self.sample.model_files() + [model_file])
+        self.assertIn("python3.later.later", [global_id for global_id, _ in expected])
+        self.assertEqual(expected, navigate("python3.json.loads", 6, self.sample.model_files() + [model_file],
+                                            {"pack": PACK_PATH}))
@@ -0,0 +1,62 @@
+import json
+import pickle
+import re
+from hashlib import md5
+from os import path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from staticanalyser.shared.source import TextSpan, SourceMap, read_source
+from staticanalyser.translator.descriptor import Descriptor, Selector
+from staticanalysertest.fixtures import SAMPLE_FILE_LOCATION, TranslatedSample
+
+
+class TestSource(TestCase):
+    def test_span_behaves_like_the_text_it_covers(self):
+        span = TextSpan("def a():\n    pass\n", 9, 17)
+        self.assertEqual("    pass", str(span))
+        self.assertEqual("    pass", span)
+        self.assertEqual(8, len(span))
+        self.assertFalse(TextSpan("abc", 1, 1))
+        self.assertEqual("    pass", pickle.loads(pickle.dumps(span)))
+        self.assertIs(str, type(pickle.loads(pickle.dumps(span))))
+
+    def test_read_source_matches_text_mode_read(self):
+        with TemporaryDirectory() as tmp:
+            source_file = path.join(tmp, "crlf.py")
+            for data in [b"def a():\r\n    return '\xc3\xa9'\r\n", b"def a():\n    pass\r", b""]:
+                with open(source_file, "wb") as f:
+                    f.write(data)
+                with open(source_file, "r", encoding="utf-8") as f:
+                    expected = f.read()
+                self.assertEqual((expected, md5(expected.encode("utf-8")).hexdigest()), read_source(source_file))
+
+    def test_selecting_a_span_matches_selecting_a_copy(self):
+        d = Descriptor.get_descriptor("python3")
+        with open(SAMPLE_FILE_LOCATION, "r") as f:
+            text = d.preprocess(f.read())
+        classes = Selector.get_selector_by_name("python3.class").select(text, "python3.sample")
+        body = classes[0]._body
+        self.assertIs(TextSpan, type(body))
+        function_selector = Selector.get_selector_by_name("python3.function")
+        self.assertEqual([str(f) for f in function_selector.select(str(body), "python3.sample.MyClass")],
+                         [str(f) for f in function_selector.select(body, "python3.sample.MyClass")])
+
+    def test_source_map_follows_edits_across_passes(self):
+        original = "a = f(1,\n      2)  # call\n\nb = 3\n"
+        source_map = SourceMap(original)
+        text = source_map.sub("#.*", "", original)
+        text = source_map.sub(",\\s*\\n\\s*", ", ", text)
+        text = source_map.sub("\\n\\s*\\n", "\\n", text)
+        self.assertEqual(re.sub("\\n\\s*\\n", "\\n", re.sub(",\\s*\\n\\s*", ", ", re.sub("#.*", "", original))), text)
+        self.assertEqual({"start_line": 4, "start_column": 1, "end_line": 4, "end_column": 5},
+                         source_map.get_location(text.index("b"), text.index("3") + 1))
+        self.assertEqual(2, source_map.get_location(text.index("2"), text.index("2") + 1)["start_line"])
+
+    def test_translated_entities_record_their_location(self):
+        with TranslatedSample() as sample:
+            with open(sample.model_files()[0], "r") as f:
+                functions = {f.get("name"): f for f in json.load(f).get("functions")}
+        self.assertEqual({"start_line": 42, "start_column": 1, "end_line": 54, "end_column": 26},
+                         functions["my_method_3"]["location"])
+        statement = functions["my_method_3"]["body_parsed"][0]
+        self.assertEqual((43, 5), (statement["location"]["start_line"], statement["location"]["start_column"]))
@@ -0,0 +1,57 @@
+import gc
+import pickle
+import time
+import warnings
+from os import path, utime
+from staticanalyser.navigator.navigate import navigate
+from staticanalyser.shared.store import ModelStore
+from staticanalysertest.fixtures import SampleTestCase, SAMPLE_PREFIX, sample_id, translate_sources
+
+
+class TestModelStore(SampleTestCase):
+    def test_store_answers_model_and_reference_queries(self):
+        ModelStore.write(path.join(".model", "models.store"), self.sample.model_files())
+        store = ModelStore(path.join(".model", "models.store"))
+        self.assertEqual((SAMPLE_PREFIX, self.sample.model_files()[0]),
+                         store.get_model(sample_id("MyClass.method_a")))
+        self.assertEqual((None, None), store.get_model("python3.unknown.module"))
+        self.assertEqual([sample_id("my_method_3")],
+                         store.get_referencing_entities("python3.json.loads"))
+        self.assertEqual([sample_id("my_method_2"), sample_id("my_method")],
+                         store.get_references(sample_id("my_method_4")))
+        reopened = pickle.loads(pickle.dumps(store))
+        self.assertEqual(self.sample.model_files(), reopened.get_referencing_model_files("python3.builtins.print"))
+        reopened.close()
+        store.close()
+
+    def test_models_written_after_the_store_are_searched(self):
+        store_path = path.join(".model", "models.store")
+        model_file = translate_sources({"later.py": "def later(data):\n    print(data)\n"})[0]
+        ModelStore.write(store_path, self.sample.model_files() + [model_file])
+        translate_sources({"later.py": "from json import loads\n\n\ndef later(data):\n    parsed = loads(data)\n"
+                                       "    print(parsed)\n"})
+        utime(model_file, (time.time() + 10, time.time() + 10))
+        store = ModelStore(store_path)
+        self.assertTrue(store.is_current(self.sample.model_files()[0]))
+        self.assertFalse(store.is_current(model_file))
+        store.close()
+        expected = navigate("python3.json.loads", 6, self.sample.model_files() + [model_file])
+        self.assertIn("python3.later.later", [global_id for global_id, _ in expected])
+        self.assertEqual(expected, navigate("python3.json.loads", 6, self.sample.model_files() + [model_file],
+                                            {"store": store_path}))
+
+    def test_files_that_are_not_stores_are_closed_again(self):
+        store_path = path.join(".model", "models.store")
+        open(store_path, "wb").close()
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always", ResourceWarning)
+            with self.assertRaises(ValueError):
+                ModelStore(store_path)
+            gc.collect()
+        # a file left open warns when it is collected
+        self.assertEqual([], [w for w in caught if issubclass(w.category, ResourceWarning)])
+        ModelStore.write(store_path, self.sample.model_files())
+        store = ModelStore(store_path)
+        self.assertIn(sample_id("my_decorator.inner"), store.get_module_functions(SAMPLE_PREFIX))
+        self.assertEqual([], store.get_module_functions("python3.unknown.module"))
+        store.close()
@@ -0,0 +1,92 @@
+import json
+from os import path, makedirs
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from staticanalyser.hunter import hunt
+from staticanalyser.navigator.navigate import Navigator
+from staticanalyser.shared.model import ModelOperations
+from staticanalyser.translator.ast_frontend import AstDescriptor
+from staticanalyser.translator.descriptor import Descriptor
+from staticanalysertest.fixtures import TranslatedSample
+
+
+def _collect(data, key: str) -> set:
+    if type(data) is list:
+        return set().union(*[_collect(d, key) for d in data])
+    if type(data) is dict:
+        return ({data[key]} if type(data.get(key)) is str else set()).union(*[_collect(v, key) for v in data.values()])
+    return set()
+
+
+def _translate(source_dir: str, file_name: str, text: str) -> dict:
+    source_file: str = path.join(source_dir, file_name)
+    makedirs(path.dirname(source_file), exist_ok=True)
+    with open(source_file, "w") as f:
+        f.write(text)
+    AstDescriptor("python3").parse(source_file, "py", path.join(source_dir, ".model"), [source_dir], True)
+    return ModelOperations.read_model_file(path.join(source_dir, ".model", "python3", file_name + ".json"))
+
+
+class TestAstFrontend(TestCase):
+    def test_frontends_are_named_in_the_language_info(self):
+        self.assertIs(AstDescriptor, Descriptor.get_frontend("ast"))
+        self.assertIs(Descriptor, Descriptor.get_frontend("regex"))
+        with self.assertRaises(ValueError):
+            Descriptor.get_frontend("unknown")
+
+    def test_sample_is_modelled_like_the_regexes_model_it(self):
+        with TranslatedSample() as sample:
+            regex_model: dict = ModelOperations.read_model_file(sample.model_files()[0])
+            regex_hunt: list = hunt(10, ["python3.builtins.print"], ["python3.json.loads"], [], sample.model_files())
+        with TranslatedSample("ast") as sample:
+            ast_model: dict = ModelOperations.read_model_file(sample.model_files()[0])
+            ast_hunt: list = hunt(10, ["python3.builtins.print"], ["python3.json.loads"], [], sample.model_files())
+        self.assertEqual(_collect(regex_model, "global_id"), _collect(ast_model, "global_id"))
+        self.assertEqual(sorted(regex_model["dependencies"], key=lambda d: d["source"]),
+                         sorted(ast_model["dependencies"], key=lambda d: d["source"]))
+        resolved: set = {r for r in _collect(regex_model, "ref") if r.startswith("python3.")}
+        self.assertEqual(resolved, {r for r in _collect(ast_model, "ref") if r.startswith("python3.")})
+        self.assertEqual(regex_hunt, ast_hunt)
+
+    def test_imports_through_modules_and_aliases_are_qualified(self):
+        with TemporaryDirectory() as tmp:
+            model: dict = _translate(tmp, path.join("pkg", "mod.py"), "\n".join([
+                "import os.path as osp",
+                "from .util import helper as h",
+                "",
+                "",
+                "def run(value):",
+                "    with open(value) as f:",
+                "        h(osp.join(f.read(), name=value))",
+                ""
+            ]))
+        self.assertEqual(["os.path", "pkg.util"], [d["source"] for d in model["dependencies"]])
+        self.assertEqual(["python3.builtins.open", "f.read", "python3.os.path.join", "python3.pkg.util.helper"],
+                         [s["rhs"]["ref"] for s in model["functions"][0]["body_parsed"]])
+        self.assertEqual("name", model["functions"][0]["body_parsed"][2]["rhs"]["parameters"][1]["name"])
+
+    def test_sources_that_do_not_parse_are_selected_with_the_regexes(self):
+        with TemporaryDirectory() as tmp:
+            model: dict = _translate(tmp, "legacy.py", "def legacy_print(value):\n    print value\n")
+        self.assertEqual(["legacy_print"], [f["name"] for f in model["functions"]])
+
+    def test_keyword_arguments_flow_into_the_parameters_they_name(self):
+        with TemporaryDirectory() as tmp:
+            _translate(tmp, "kw.py", "\n".join([
+                "def helper(first, second):",
+                "    print(second)",
+                "",
+                "",
+                "def caller(value, other):",
+                "    helper(second=value, first=other)",
+                "    helper(other, value)",
+                ""
+            ]))
+            n = Navigator()
+            n.load_file(path.join(tmp, ".model", "python3", "kw.py.json"), False)
+            caller = n.lookup_entity("python3.kw.caller")[1]
+            # by position value would be the first parameter of the keyword call
+            self.assertEqual([("python3.kw.helper", "second"), ("python3.kw.helper", "second")],
+                             [(f.get_global_identifier(), p) for f, p in n.find_usages(caller, "value")])
+            self.assertEqual([("python3.kw.helper", "first"), ("python3.kw.helper", "first")],
+                             [(f.get_global_identifier(), p) for f, p in n.find_usages(caller, "other")])
@@ -0,0 +1,68 @@
+import json
+import time
+from os import path, chmod, utime
+from pathlib import Path
+from shutil import copyfile
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from staticanalyser.translator.cache import prune_cache
+from staticanalyser.translator.descriptor import Descriptor
+from staticanalysertest.fixtures import SAMPLE_FILE_LOCATION
+
+
+def _translate(descriptor: Descriptor, source_file: str, source_root: str, output_dir: str) -> dict:
+    descriptor.parse(source_file, "py", output_dir, [source_root], True)
+    with open(descriptor._get_json_path(output_dir, source_file, [source_root]), "r") as f:
+        res: dict = json.load(f)
+    res.pop("date_generated")
+    return res
+
+
+class TestSelectionCache(TestCase):
+    def test_cached_selection_matches_fresh_selection(self):
+        descriptor = Descriptor.get_descriptor("python3")
+        with TemporaryDirectory() as tmp:
+            source_root = path.join(tmp, "src")
+            vendored = path.join(source_root, "vendor", "sample.py")
+            copyfile(SAMPLE_FILE_LOCATION, path.join(tmp, "sample.py"))
+            Path(path.dirname(vendored)).mkdir(parents=True)
+            copyfile(SAMPLE_FILE_LOCATION, vendored)
+            try:
+                descriptor.use_cache(None)
+                expected = _translate(descriptor, vendored, source_root, path.join(tmp, "plain"))
+                descriptor.use_cache(path.join(tmp, "cache"))
+                _translate(descriptor, path.join(tmp, "sample.py"), tmp, path.join(tmp, "first"))
+                misses = descriptor.get_cache().get_stats()["misses"]
+                cached = _translate(descriptor, vendored, source_root, path.join(tmp, "cached"))
+                stats = descriptor.get_cache().get_stats()
+            finally:
+                descriptor.use_cache(None)
+        self.assertEqual(expected, cached)
+        self.assertEqual(misses, stats["misses"])
+        self.assertGreater(stats["hits"], 0)
+
+    def test_caches_other_users_can_write_to_are_not_used(self):
+        descriptor = Descriptor.get_descriptor("python3")
+        with TemporaryDirectory() as tmp:
+            cache_dir = path.join(tmp, "cache")
+            Path(cache_dir, "python3").mkdir(parents=True)
+            chmod(path.join(cache_dir, "python3"), 0o777)
+            try:
+                descriptor.use_cache(cache_dir)
+                _translate(descriptor, SAMPLE_FILE_LOCATION, path.dirname(SAMPLE_FILE_LOCATION), path.join(tmp, "m"))
+                stats = descriptor.get_cache().get_stats()
+            finally:
+                descriptor.use_cache(None)
+            self.assertEqual(0, stats["hits"])
+            self.assertEqual([], list(Path(cache_dir).glob("**/*.pickle")))
+
+    def test_prune_removes_the_least_recently_used_entries(self):
+        with TemporaryDirectory() as tmp:
+            entries = [Path(tmp, "python3", "ab", "{}.pickle".format(i)) for i in range(4)]
+            for i, entry in enumerate(entries):
+                entry.parent.mkdir(parents=True, exist_ok=True)
+                entry.write_bytes(b"0" * 10)
+                utime(str(entry), (time.time() - 100 + i, time.time() - 100 + i))
+            self.assertEqual(2, prune_cache(tmp, 25))
+            self.assertEqual([False, False, True, True], [entry.exists() for entry in entries])
+            self.assertEqual(0, prune_cache(tmp, 25))
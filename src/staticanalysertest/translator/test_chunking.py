@@ -0,0 +1,28 @@
+from unittest import TestCase
+from staticanalyser.translator.descriptor import Descriptor
+from staticanalysertest.fixtures import SAMPLE_FILE_LOCATION
+
+
+class TestChunkedSelection(TestCase):
+    def setUp(self):
+        self.descriptor = Descriptor.get_descriptor("python3")
+        with open(SAMPLE_FILE_LOCATION, "r") as f:
+            self.text = self.descriptor.preprocess(f.read())
+
+    def tearDown(self):
+        self.descriptor.configure()
+
+    def test_split_top_level_keeps_all_text(self):
+        chunks = self.descriptor.split_top_level(self.text, 4)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(self.text, "".join(chunks))
+        for chunk in chunks[1:]:
+            self.assertRegex(chunk, "^(def|class) ")
+
+    def test_chunked_selection_matches_serial_selection(self):
+        serial = self.descriptor.select(self.text, "python3.sample")
+        self.descriptor.configure({"chunk_jobs": 2, "chunk_lines": 1})
+        chunked = self.descriptor.select_chunked(self.text, "python3.sample")
+        self.assertEqual(list(serial.keys()), list(chunked.keys()))
+        for k in serial.keys():
+            self.assertEqual([str(e) for e in serial[k]], [str(e) for e in chunked[k]])
@@ -0,0 +1,71 @@
+import json
+import multiprocessing as mp
+import queue
+import shutil
+from contextlib import redirect_stdout
+from io import StringIO
+from os import path
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from staticanalyser.shared.model import ModelOperations
+from staticanalyser.translator.descriptor import Descriptor
+from staticanalyser.translator.translate import parse
+from staticanalysertest.fixtures import SAMPLE_FILE_LOCATION
+
+MODULE_COUNT = 6
+PROCESS_COUNT = 4
+
+
+def _translate_all(task: tuple) -> dict:
+    source_dir, model_dir, files = task
+    with redirect_stdout(StringIO()):
+        for f in files:
+            Descriptor.get_descriptor("python3").parse(f, "py", model_dir, [source_dir], False)
+    return _dates_generated(model_dir)
+
+
+def _translate_all_prefetched(task: tuple) -> dict:
+    source_dir, model_dir, files = task
+    file_queue = queue.Queue()
+    for f in files:
+        file_queue.put(f)
+    with redirect_stdout(StringIO()):
+        parse(file_queue, model_dir, [source_dir], False, {"cache_dir": None}, None, 2)
+    return _dates_generated(model_dir)
+
+
+def _dates_generated(model_dir: str) -> dict:
+    return {path.basename(str(f)): ModelOperations.read_model_file(f)["date_generated"] for f in
+            ModelOperations.get_model_files(model_dir)}
+
+
+class TestConcurrentTranslation(TestCase):
+    def test_processes_translating_the_same_sources_publish_each_model_once(self):
+        self._translate_concurrently(_translate_all)
+
+    def test_prefetching_processes_publish_each_model_once(self):
+        self._translate_concurrently(_translate_all_prefetched)
+
+    def _translate_concurrently(self, translate_all):
+        with TemporaryDirectory() as tmp:
+            source_dir = path.join(tmp, "src")
+            model_dir = path.join(tmp, "models")
+            Path(source_dir).mkdir()
+            files = [path.join(source_dir, "module_{}.py".format(i)) for i in range(MODULE_COUNT)]
+            for f in files:
+                shutil.copy(SAMPLE_FILE_LOCATION, f)
+            # every process works through all the modules, starting at a different one
+            tasks = [(source_dir, model_dir, files[i:] + files[:i]) for i in range(PROCESS_COUNT)]
+            with mp.get_context("spawn").Pool(PROCESS_COUNT) as pool:
+                pending = pool.map_async(translate_all, tasks)
+                while not pending.ready():
+                    for model_file in ModelOperations.get_model_files(model_dir):
+                        # readers need no retries when models are renamed into place
+                        with open(str(model_file), "r") as fp:
+                            self.assertIn("model_id", json.load(fp))
+                results = pending.get()
+            self.assertEqual(MODULE_COUNT, len(results[0]))
+            for result in results[1:]:
+                self.assertEqual(results[0], result)
+            self.assertEqual([], list(Path(model_dir).glob("**/*.tmp")))
@@ -0,0 +1,68 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os import path, name, makedirs, utime
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+from staticanalyser.navigator.navigate import Navigator
+from staticanalyser.shared import config
+from staticanalyser.translator.translate import translate_global, locate_global_source
+
+PACKAGE = "sa_on_demand_pkg"
+
+
+class TestOnDemandTranslation(TestCase):
+    def setUp(self):
+        self._sources = TemporaryDirectory()
+        makedirs(path.join(self._sources.name, PACKAGE))
+        with open(path.join(self._sources.name, PACKAGE, "__init__.py"), "w") as f:
+            f.write("def loads(s):\n    print(s)\n    return s\n")
+        with open(path.join(self._sources.name, PACKAGE, "util.py"), "w") as f:
+            f.write("def helper(x):\n    return x\n")
+        self._source_dirs = config.get_source_dirs().get("python3")
+        config.get_source_dirs()["python3"] = {name: [self._sources.name]}
+        # global models are translated into a model dir of the test rather than the one of the user
+        self._model_dir = TemporaryDirectory()
+        self._patches = [patch("staticanalyser.shared.model.MODEL_DIR", self._model_dir.name),
+                         patch("staticanalyser.translator.translate.MODEL_DIR", self._model_dir.name)]
+        for p in self._patches:
+            p.start()
+
+    def tearDown(self):
+        for p in self._patches:
+            p.stop()
+        config.get_source_dirs()["python3"] = self._source_dirs
+        self._model_dir.cleanup()
+        self._sources.cleanup()
+
+    def test_modules_and_packages_are_located(self):
+        self.assertEqual(path.join(self._sources.name, PACKAGE, "util.py"),
+                         locate_global_source("python3.{}.util.helper".format(PACKAGE))[0])
+        self.assertEqual(path.join(self._sources.name, PACKAGE, "__init__.py"),
+                         locate_global_source("python3.{}.loads".format(PACKAGE))[0])
+        self.assertEqual((None, None), locate_global_source("python3.{}.missing.thing".format(PACKAGE + "_x")))
+
+    def test_concurrent_requests_share_one_translation(self):
+        with ThreadPoolExecutor(4) as pool:
+            model_files = list(pool.map(translate_global, ["python3.{}.loads".format(PACKAGE)] * 4))
+        self.assertEqual(1, len(set(model_files)))
+        self.assertTrue(path.isfile(model_files[0]))
+        self.assertTrue(model_files[0].startswith(self._model_dir.name))
+
+    def test_navigator_loads_missing_global_models_with_a_translator(self):
+        self.assertEqual((False, None), Navigator().lookup_entity("python3.{}.util.helper".format(PACKAGE)))
+        found, entity = Navigator({"translator": translate_global}).lookup_entity("python3.{}.loads".format(PACKAGE))
+        self.assertTrue(found)
+        self.assertEqual("python3.{}.loads".format(PACKAGE), entity.get_global_identifier())
+
+    def test_modules_added_after_a_failed_lookup_are_translated(self):
+        global_id: str = "python3.{}_later.run".format(PACKAGE)
+        self.assertIsNone(translate_global(global_id))
+        with patch("staticanalyser.translator.translate.locate_global_source") as locate:
+            self.assertIsNone(translate_global(global_id))
+        locate.assert_not_called()
+        with open(path.join(self._sources.name, PACKAGE + "_later.py"), "w") as f:
+            f.write("def run(x):\n    return x\n")
+        utime(self._sources.name, (time.time() + 10, time.time() + 10))
+        model_file: str = translate_global(global_id)
+        self.assertTrue(model_file and path.isfile(model_file))
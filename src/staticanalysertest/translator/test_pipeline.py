@@ -0,0 +1,58 @@
+import queue
+import shutil
+from os import path
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from staticanalyser.shared.bloom import ModelFilter
+from staticanalyser.shared.database import ModelDatabase
+from staticanalyser.shared.model import ModelOperations
+from staticanalyser.translator.pipeline import ModelWriter
+from staticanalyser.translator.translate import parse, _iter_files
+from staticanalysertest.fixtures import SAMPLE_FILE_LOCATION
+
+MODULE_COUNT = 5
+
+
+class TestOverlappedTranslation(TestCase):
+    def test_prefetching_workers_write_the_same_models(self):
+        with TemporaryDirectory() as tmp:
+            source_dir = path.join(tmp, "src")
+            Path(source_dir).mkdir()
+            for i in range(MODULE_COUNT):
+                shutil.copy(SAMPLE_FILE_LOCATION, path.join(source_dir, "module_{}.py".format(i)))
+            models = {}
+            for prefetch in [0, 2]:
+                model_dir = path.join(tmp, "models_{}".format(prefetch))
+                database_path = path.join(tmp, "models_{}.sqlite".format(prefetch))
+                ModelDatabase(database_path).close()
+                files = queue.Queue()
+                for i in range(MODULE_COUNT):
+                    files.put(path.join(source_dir, "module_{}.py".format(i)))
+                parse(files, model_dir, [tmp], True, {"cache_dir": None}, database_path, prefetch)
+                model_files = ModelOperations.get_model_files(model_dir)
+                self.assertEqual(MODULE_COUNT, len(model_files))
+                for model_file in model_files:
+                    self.assertIsNotNone(ModelFilter.read(model_file))
+                database = ModelDatabase(database_path)
+                self.assertEqual(MODULE_COUNT, len(database.get_referencing_model_ids("python3.json.loads")))
+                database.close()
+                models[prefetch] = [dict(ModelOperations.read_model_file(f), date_generated=None)
+                                    for f in sorted(str(f) for f in model_files)]
+            self.assertEqual(models[0], models[2])
+
+    def test_writer_errors_reach_the_translating_thread(self):
+        with TemporaryDirectory() as tmp:
+            writer = ModelWriter(1)
+            writer.write(path.join(tmp, "missing", "model.py.json"), "{}", {})
+            self.assertRaises(OSError, writer.flush)
+            self.assertRaises(OSError, writer.close)
+
+    def test_only_the_files_of_a_worker_are_read_ahead(self):
+        own, other = queue.Queue(), queue.Queue()
+        own.put(SAMPLE_FILE_LOCATION)
+        other.put(SAMPLE_FILE_LOCATION)
+        files = list(_iter_files(own, 2, [other]))
+        self.assertEqual([SAMPLE_FILE_LOCATION] * 2, [f for f, _ in files])
+        self.assertIsNotNone(files[0][1])
+        self.assertIsNone(files[1][1])
@@ -0,0 +1,78 @@
+import threading
+from unittest import TestCase
+from staticanalyser.translator.descriptor import RegexGuard, Descriptor, Selector
+from staticanalyser.regexbuilder.lint import lint_pattern
+from staticanalyser.regexbuilder.literals import required_literals, may_match
+
+
+class TestRegexGuard(TestCase):
+    def tearDown(self):
+        RegexGuard.configure(None)
+        RegexGuard.take_incidents()
+
+    def test_findall_matches_re_findall(self):
+        RegexGuard.configure(5)
+        text = "a = 1\nb = 22\n"
+        self.assertEqual([("a", "1"), ("b", "22")], RegexGuard.findall(r"^(\w+) = (\d+)$", text, "assignment"))
+        self.assertEqual(["a", "b"], RegexGuard.findall(r"^(\w+) =", text, "name"))
+        self.assertEqual([], RegexGuard.take_incidents())
+
+    def test_pathological_selector_is_stopped(self):
+        RegexGuard.configure(0.2)
+        RegexGuard.set_source_file("slow.py")
+        text = "ab\n" + "a" * 40 + "!"
+        res = RegexGuard.findall(r"(a+)+b", text, "python3.slow")
+        self.assertEqual(["a"], res)
+        incidents = RegexGuard.take_incidents()
+        self.assertEqual(1, len(incidents))
+        self.assertEqual("python3.slow", incidents[0]["selector"])
+        self.assertEqual("slow.py", incidents[0]["file"])
+        self.assertEqual(2, incidents[0]["offset"])
+        self.assertTrue(incidents[0]["skipped"])
+
+    def test_lint_flags_nested_quantifiers(self):
+        self.assertIn("nested quantifier", [kind for kind, _ in lint_pattern(r"(a+)+b")])
+        self.assertIn("backreference in repeat", [kind for kind, _ in lint_pattern(r"(\s*)(\1x)+")])
+        self.assertEqual([], lint_pattern(r"[a-zA-Z_][a-zA-Z0-9_]*\("))
+
+    def test_required_literals(self):
+        self.assertEqual([{"for "}, {":"}], required_literals(r"^(\s*)for (.*)(:)"))
+        self.assertEqual([{"abc", "de"}, {"g"}], required_literals(r"(?:abc|de)f?g+"))
+        self.assertEqual([], required_literals(r"(?i)class"))
+        self.assertEqual([], required_literals(r"(a|\w+)x?"))
+        clauses = required_literals(r"(?:abc|de)\(")
+        self.assertTrue(may_match(clauses, "x = de(1)"))
+        self.assertFalse(may_match(clauses, "x = de"))
+        self.assertFalse(may_match(clauses, "abc(", 1))
+
+    def test_selectors_skip_texts_without_their_literals(self):
+        d = Descriptor.get_descriptor("python3")
+        d.configure()
+        Selector.take_prefilter_stats()
+        text = "def func(a):\n    return a\n"
+        self.assertEqual(1, len(d.select(text, "python3.m").get("functions")))
+        stats = d.get_prefilter_stats()
+        self.assertEqual(1.0, stats["python3.class"]["skip_rate"])
+        self.assertEqual(stats["python3.while_loop"]["runs"], stats["python3.while_loop"]["skipped"])
+        self.assertLess(stats["python3.function"]["skipped"], stats["python3.function"]["runs"])
+
+    def test_incidents_are_kept_per_thread_and_unarmed_budgets_are_reported(self):
+        RegexGuard.configure(0.001)
+        RegexGuard.set_source_file("main.py")
+        RegexGuard._warned_unarmed = False
+        res: list = []
+
+        def select():
+            RegexGuard.set_source_file("thread.py")
+            RegexGuard.findall(r"(a+)+b", "a" * 22 + "!", "python3.slow")
+            res.append(RegexGuard.take_incidents())
+
+        with self.assertLogs(level="WARNING") as logs:
+            for _ in range(2):
+                worker = threading.Thread(target=select)
+                worker.start()
+                worker.join()
+        self.assertEqual(1, len([line for line in logs.output if "can only stop selectors" in line]))
+        self.assertEqual([["thread.py"], ["thread.py"]], [[i["file"] for i in incidents] for incidents in res])
+        self.assertFalse(res[0][0]["skipped"])
+        self.assertEqual([], RegexGuard.take_incidents())
@@ -0,0 +1,61 @@
+import json
+import shutil
+from os import path
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from staticanalyser.shared.database import ModelDatabase
+from staticanalyser.shared.model import ModelOperations
+from staticanalyser.translator.translate import translate, merge, get_shard, parse_shard, read_shard_manifest, \
+    _MP_CONTEXT
+from staticanalysertest.fixtures import SAMPLE_FILE_LOCATION
+
+MODULE_COUNT = 6
+SHARD_COUNT = 3
+
+
+class TestShardedTranslation(TestCase):
+    def test_shards_partition_the_files_by_relative_path(self):
+        self.assertEqual((2, 3), parse_shard("2/3"))
+        self.assertRaises(ValueError, parse_shard, "4/3")
+        self.assertRaises(ValueError, parse_shard, "all")
+        for i in range(20):
+            relative = path.join("pkg", "module_{}.py".format(i))
+            self.assertEqual(get_shard(path.join("/a", relative), ["/a"], SHARD_COUNT),
+                             get_shard(path.join("/b/checkout", relative), ["/b/checkout"], SHARD_COUNT))
+
+    def test_shards_translated_in_processes_merge_into_one_model_dir(self):
+        with TemporaryDirectory() as tmp:
+            source_dir = path.join(tmp, "src")
+            Path(source_dir).mkdir()
+            for i in range(MODULE_COUNT):
+                shutil.copy(SAMPLE_FILE_LOCATION, path.join(source_dir, "module_{}.py".format(i)))
+            shard_dirs = [path.join(tmp, "shard_{}".format(k)) for k in range(1, SHARD_COUNT + 1)]
+            processes = [_MP_CONTEXT.Process(target=translate, args=([source_dir], {
+                "source_paths": [tmp], "output_dir": shard_dirs[k - 1], "shard": (k, SHARD_COUNT), "lazy": True,
+                "cache": False, "database": True
+            })) for k in range(1, SHARD_COUNT + 1)]
+            for p in processes:
+                p.start()
+            for p in processes:
+                p.join()
+
+            models = [m for d in shard_dirs for m in read_shard_manifest(d)["models"]]
+            self.assertEqual(MODULE_COUNT, len(models))
+            self.assertEqual(MODULE_COUNT, len(set(models)))
+            merged_dir = path.join(tmp, ".model")
+            self.assertRaises(ValueError, merge, shard_dirs[:1] * 2, {"output_dir": merged_dir})
+            # merged shards can be merged with the rest
+            self.assertEqual(1, merge(shard_dirs[1:], {"output_dir": path.join(tmp, "partial")}))
+            self.assertEqual(0, merge([path.join(tmp, "partial"), shard_dirs[0]], {"output_dir": merged_dir}))
+
+            model_files = ModelOperations.get_model_files(merged_dir)
+            self.assertEqual(MODULE_COUNT, len(model_files))
+            self.assertTrue(path.isfile(path.join(merged_dir, "models.store")))
+            with open(path.join(merged_dir, "shard.json"), "r") as f:
+                self.assertEqual(list(range(1, SHARD_COUNT + 1)), json.load(f)["members"])
+            database = ModelDatabase(path.join(merged_dir, "models.sqlite"))
+            for i in range(MODULE_COUNT):
+                self.assertTrue(database.has_model("python3.src.module_{}".format(i)))
+            self.assertEqual(MODULE_COUNT, len(database.get_referencing_model_ids("python3.json.loads")))
+            database.close()
@@ -1,5 +1,7 @@
 from unittest import TestCase
-from os import path
+from os import path, getcwd, chdir
+from tempfile import TemporaryDirectory
+from staticanalyser.shared.platform_constants import MODEL_MANIFEST_NAME
 from staticanalyser.translator.translate import translate
 
 SAMPLE_FILE_LOCATION = path.join(path.dirname(__file__), "sample.py")
@@ -7,4 +9,12 @@ SAMPLE_FILE_LOCATION = path.join(path.dirname(__file__), "sample.py")
 
 class TestTranslator(TestCase):
     def test_translate_without_exceptions(self):
-        translate([SAMPLE_FILE_LOCATION])
+        # the models are written into the .model dir of a temporary working directory
+        with TemporaryDirectory() as tmp:
+            old_cwd: str = getcwd()
+            chdir(tmp)
+            try:
+                translate([SAMPLE_FILE_LOCATION])
+                self.assertTrue(path.isfile(path.join(".model", MODEL_MANIFEST_NAME)))
+            finally:
+                chdir(old_cwd)